@@ -0,0 +1,176 @@
+"""Admission control for expensive routes: concurrency limits, bounded queues, fast 429s.
+
+Each AdmissionController lets at most ``max_concurrent`` requests run and
+parks up to ``max_queue`` more in FIFO order. Anything beyond that, or a
+request that waits longer than ``queue_timeout_s``, is rejected at once
+with Overloaded instead of piling up threads, memory and decoded audio.
+A finishing request hands its slot straight to the oldest waiter, so a
+late arrival cannot overtake the queue. Waiters are threads (Flask) or
+asyncio tasks (asgi.py), and one controller can serve both.
+
+Queue depth is exported as voice_queue_depth{queue="admission_<name>"},
+time spent queued as voice_admission_wait_seconds, and rejections as
+voice_admission_rejected_total.
+"""
+
+import asyncio
+import functools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from flask import jsonify
+
+from metrics import ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS, register_queue
+
+QUEUE_TIMEOUT_S = 30.0
+# Smoothing of the mean slot hold time used for Retry-After
+HOLD_TIME_ALPHA = 0.2
+MAX_RETRY_AFTER_S = 60
+
+
+class Overloaded(Exception):
+    """The route is at its concurrency limit and its queue is full (or the wait timed out)."""
+
+    def __init__(self, route, reason, retry_after):
+        super().__init__(f'{route} is overloaded ({reason}); retry in {retry_after} s')
+        self.route = route
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout_s=QUEUE_TIMEOUT_S):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout_s = queue_timeout_s
+        self.active = 0
+        self._waiters = deque()  # wake-up callables, oldest first
+        self._lock = threading.Lock()
+        self._hold_s = 1.0
+        register_queue(f'admission_{name}', lambda: len(self._waiters))
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def retry_after(self):
+        """Seconds until a queued request would likely get a slot, for the Retry-After header."""
+        backlog = (len(self._waiters) + 1) / self.max_concurrent
+        return max(1, min(MAX_RETRY_AFTER_S, math.ceil(self._hold_s * backlog)))
+
+    def _reject(self, reason):
+        ADMISSION_REJECTED.inc(self.name, reason)
+        return Overloaded(self.name, reason, self.retry_after())
+
+    def _enter(self, wake):
+        """Take a free slot (True) or queue wake (False); raises Overloaded when the queue is full."""
+        with self._lock:
+            if self.active < self.max_concurrent and not self._waiters:
+                self.active += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject('queue_full')
+            self._waiters.append(wake)
+            return False
+
+    def _abandon(self, wake):
+        """Leave the queue; False if the slot was already handed to this waiter."""
+        with self._lock:
+            try:
+                self._waiters.remove(wake)
+                return True
+            except ValueError:
+                return False
+
+    def _release(self, held_s):
+        with self._lock:
+            self._hold_s += HOLD_TIME_ALPHA * (held_s - self._hold_s)
+            wake = self._waiters.popleft() if self._waiters else None
+            if wake is None:
+                self.active -= 1
+        # The slot passes to the waiter without active ever dropping
+        if wake is not None:
+            wake()
+
+    @contextmanager
+    def slot(self):
+        """Hold one slot for the with-block (blocking threads)."""
+        queued_at = time.perf_counter()
+        event = threading.Event()
+        if not self._enter(event.set):
+            if not event.wait(self.queue_timeout_s) and self._abandon(event.set):
+                raise self._reject('timeout')
+        started = time.perf_counter()
+        ADMISSION_WAIT_SECONDS.observe(started - queued_at, self.name)
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """Hold one slot for the async with-block; queued tasks hold no thread."""
+        queued_at = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        wake = functools.partial(loop.call_soon_threadsafe, _resolve, future)
+        if not self._enter(wake):
+            try:
+                await asyncio.wait_for(future, self.queue_timeout_s)
+            except asyncio.TimeoutError:
+                if self._abandon(wake):
+                    raise self._reject('timeout')
+            except asyncio.CancelledError:
+                # Client went away: give back a slot that may have just been handed over
+                if not self._abandon(wake):
+                    self._release(0.0)
+                raise
+        started = time.perf_counter()
+        ADMISSION_WAIT_SECONDS.observe(started - queued_at, self.name)
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - started)
+
+
+def overloaded_response(error):
+    """429 JSON response with Retry-After (Flask)."""
+    response = jsonify({'error': 'Server is busy; please retry shortly', 'retry_after': error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def init_admission(app, limits, queue_timeout_s=QUEUE_TIMEOUT_S):
+    """Wrap the views in limits ({endpoint: (max_concurrent, max_queue)}) with admission control.
+
+    Returns {endpoint: AdmissionController}.
+    """
+    controllers = {}
+    for endpoint, (max_concurrent, max_queue) in limits.items():
+        view = app.view_functions.get(endpoint)
+        if view is None:
+            continue
+        controller = AdmissionController(endpoint, max_concurrent, max_queue, queue_timeout_s)
+
+        @functools.wraps(view)
+        def admitted_view(*args, _view=view, _controller=controller, **kwargs):
+            try:
+                with _controller.slot():
+                    return _view(*args, **kwargs)
+            except Overloaded as e:
+                return overloaded_response(e)
+
+        app.view_functions[endpoint] = admitted_view
+        controllers[endpoint] = controller
+        print(f"[ADMISSION] {endpoint}: {controller.max_concurrent} concurrent, {controller.max_queue} queued")
+    return controllers
@@ -1,25 +1,42 @@
 import os
-import json
-import tempfile
 from datetime import datetime
 import hashlib
+import time
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, Response, stream_with_context, g
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
-import librosa
-import numpy as np
-import joblib
-import qrcode
 import speech_recognition as sr
-from pydub import AudioSegment
-from PIL import Image, ImageDraw, ImageFont
 
-from user_actions import log_action
+from user_actions import find_archived_log, load_timeline, log_action, read_archived_logs, read_logs
+from audio_io import SUPPORTED_EXTENSIONS, AudioDecodeError, decode_audio, probe_duration, to_pcm16
+from vad import trim_silence, voice_activity
+from features import compute_features
+from detection import FEATURE_SECONDS, MAX_AUDIO_SECONDS, detect_voice
+from fingerprint import FingerprintIndex, fingerprint
 
 # Import the Blockchain class
 from blockchain import Blockchain
-from tts_service import synthesize_to_wav
+from model_registry import ModelRegistry
+from shadow import ShadowEvaluator
+from certificates import (
+    certificate_cache_key,
+    certificate_jpeg,
+    generate_certificate_image,
+    generate_certificate_qr,
+    stream_certificate_pdf,
+    stream_certificate_zip,
+)
+from tts_service import synthesize_cached, DEFAULT_RATE, DEFAULT_VOLUME
+from profiling import init_profiling
+from maintenance import run_maintenance, start_maintenance
+from admission import init_admission
+from metrics import IN_FLIGHT, REQUEST_SECONDS, register_queue, render_prometheus, stage
 
 # —— Flask App Configuration —————————————————————————
 app = Flask(__name__)
@@ -29,64 +46,125 @@ app.secret_key = 'a_hardcoded_very_secret_key_1234567890'
 
 # Upload settings
 UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'wav'}
+ALLOWED_EXTENSIONS = SUPPORTED_EXTENSIONS  # wav, mp3, ogg, opus, flac, m4a
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Transcript recorded when voice activity detection finds no speech
+NO_SPEECH_TRANSCRIPT = "No speech detected"
+# Split multi-party recordings into speaker turns and score each ('off' to disable)
+SPEAKER_SEGMENTATION = os.environ.get('SPEAKER_SEGMENTATION', 'on').lower() != 'off'
+# Reuse verdicts for re-uploads of known audio via acoustic fingerprints ('off' to disable)
+FINGERPRINT_DEDUPE = os.environ.get('FINGERPRINT_DEDUPE', 'on').lower() != 'off'
+# Score 2 s sliding windows for the fake-probability heatmap on /logs ('off' to disable)
+FRAME_SCORING = os.environ.get('FRAME_SCORING', 'on').lower() != 'off'
+
 # —— Load Your Trained Models —————————————————————————— 
-MODEL_PATH = 'model/voice_detector.pkl'
-model = joblib.load(MODEL_PATH)
+# Point VOICE_MODEL_PATH at e.g. model/voice_detector_compact.pkl (compress_voice_detector.py)
+MODEL_PATH = os.environ.get('VOICE_MODEL_PATH', 'model/voice_detector.pkl')
+# Registries hot-reload an artifact when a new file is renamed into place
+voice_registry = ModelRegistry('voice_detector', MODEL_PATH)
 
-# Text-based scam / behavior classifier trained on BETTER30
+# Text-based scam / behavior classifier trained on BETTER30 (loaded on first use)
 SCAM_MODEL_PATH = 'models/better30_scam_text_model.pkl'
-scam_text_model = None
+scam_registry = ModelRegistry('better30_scam_text', SCAM_MODEL_PATH, lazy=True)
+
+# Shadow mode: score every upload with a candidate model in the background.
+# Off unless SHADOW_MODEL_PATH names the candidate artifact.
+SHADOW_MODEL_PATH = os.environ.get('SHADOW_MODEL_PATH', 'off')
+shadow = None
+if SHADOW_MODEL_PATH.lower() != 'off' and os.path.exists(SHADOW_MODEL_PATH):
+    shadow = ShadowEvaluator(SHADOW_MODEL_PATH)
+    register_queue('shadow', lambda: shadow.pending)
+
+# Model ID shown on certificates for detections logged before versions were recorded
+LEGACY_MODEL_ID = 'voice_detector_v1'
+
+# Bulk certificate export settings
+EXPORT_MAX_CERTIFICATES = 2000
+EXPORT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# Renders submitted ahead of the one being streamed; bounds memory and wasted work
+EXPORT_RENDER_AHEAD = 2 * EXPORT_WORKERS
+
+# Per-request profiling (profiling.py): 'off' installs nothing, 'header' profiles
+# requests sending X-Profile: <PROFILING_TOKEN>, 'always' profiles every request
+app.config['PROFILING_MODE'] = os.environ.get('PROFILING_MODE', 'off')
+app.config['PROFILING_TOKEN'] = os.environ.get('PROFILING_TOKEN')
+
+# Background retention of certificates, orphaned uploads and old log records
+# (maintenance.py) every MAINTENANCE_INTERVAL_S seconds; 0 disables it
+MAINTENANCE_INTERVAL_S = int(os.environ.get('MAINTENANCE_INTERVAL_S', '3600'))
+
+# Uploads larger than MAX_UPLOAD_MB are refused with 413 while the body is read, and
+# files whose header reports more than MAX_UPLOAD_SECONDS before decoding (WAV, FLAC,
+# OGG, OPUS and MP3; M4A headers are not probed, decoding stops at MAX_AUDIO_SECONDS)
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', '100'))
+MAX_UPLOAD_SECONDS = int(os.environ.get('MAX_UPLOAD_SECONDS', '1800'))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+MAX_TTS_CHARS = 2000
+
+# Admission control (admission.py): per route, requests running at once and requests
+# queued behind them; beyond that the route answers 429 with Retry-After right away
+ADMISSION_LIMITS = {
+    'handle_upload': (int(os.environ.get('UPLOAD_MAX_CONCURRENT', os.cpu_count() or 1)),
+                      int(os.environ.get('UPLOAD_MAX_QUEUE', 4 * (os.cpu_count() or 1)))),
+    'tts_generate': (int(os.environ.get('TTS_MAX_CONCURRENT', '1')),
+                     int(os.environ.get('TTS_MAX_QUEUE', '16'))),
+}
+ADMISSION_QUEUE_TIMEOUT_S = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_S', '30'))
 
 # —— Initialize Blockchain ———————————————————————————
 blockchain = Blockchain()  # Create a new blockchain instance
 
+# Fingerprint index of analyzed uploads (data/fingerprints.db)
+fingerprint_index = FingerprintIndex() if FINGERPRINT_DEDUPE else None
+
+start_maintenance(MAINTENANCE_INTERVAL_S)
+
 # —— Helper Functions ——————————————————————————————
 def allowed_file(filename):
-    """Only allow .wav uploads."""
+    """Allow WAV and the compressed formats audio_io can decode."""
     return (
         '.' in filename and
         filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
     )
 
+def check_upload_header(stream, filename):
+    """Error message if the upload's header is malformed or reports more than MAX_UPLOAD_SECONDS, else None.
+
+    Only the header is read (audio_io.probe_duration); nothing is decoded.
+    """
+    try:
+        duration = probe_duration(stream, filename)
+    except AudioDecodeError as e:
+        return f'Could not decode audio: {e}'
+    if duration is not None and duration > MAX_UPLOAD_SECONDS:
+        return (f'Audio is {duration / 60:.1f} minutes long; '
+                f'uploads are limited to {MAX_UPLOAD_SECONDS / 60:.0f} minutes')
+    return None
+
+def load_audio(file_path, duration=FEATURE_SECONDS):
+    """Decode an audio file (any ALLOWED_EXTENSIONS) to 22.05 kHz mono samples."""
+    return decode_audio(file_path, duration=duration)
+
 def extract_features(file_path):
     """
-    Load a WAV, compute 12 MFCCs + 3 spectral features.
+    Load an audio file, trim silence, compute 12 MFCCs + 3 spectral features.
     Returns shape (1,15) to match the trained model.
     """
-    y, sr = librosa.load(file_path, sr=22050, duration=10)
-    
-    # Extract MFCCs (12 features)
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-    mfcc_mean = np.mean(mfcc.T, axis=0)[:12]
-    
-    # Extract spectral features (3 features)
-    spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
-    spectral_rolloff = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr))
-    zero_crossing_rate = np.mean(librosa.feature.zero_crossing_rate(y))
-    
-    # Combine all features (12 + 3 = 15)
-    features = np.concatenate([
-        mfcc_mean,
-        [spectral_centroid / 1000],  # Normalize
-        [spectral_rolloff / 1000],
-        [zero_crossing_rate]
-    ])
-    
-    return features.reshape(1, -1)
-
-def send_to_blockchain(filename: str, is_real: bool, timestamp: datetime):
+    y, sr = load_audio(file_path, duration=MAX_AUDIO_SECONDS)
+    speech, _ = trim_silence(y, sr)
+    return compute_features((speech if speech.size else y)[:FEATURE_SECONDS * sr], sr)
+
+def send_to_blockchain(filename: str, is_real: bool, timestamp: datetime, model_version: str = ''):
     """
     Add a new block to the blockchain with the prediction.
+    The previous hash is read inside the append transaction, so concurrent
+    requests and workers never fork the chain.
     """
     predicted_label = 'REAL' if is_real else 'FAKE'
     confidence = 1 if is_real else 0
-    last_block = blockchain.get_last_block()
-    prev_hash = last_block['hash'] if last_block else 'GENESIS'
-    blockchain.create_new_block(predicted_label, confidence, prev_hash)
+    blockchain.create_new_block(predicted_label, confidence, model_version=model_version)
     print(f"[BLOCKCHAIN] Stored in blockchain: {predicted_label} with confidence: {confidence}")
 
 def generate_file_hash(file_path):
@@ -96,139 +174,166 @@ def generate_file_hash(file_path):
             hasher.update(chunk)
     return hasher.hexdigest()
 
-def generate_certificate_qr(certificate_data, filename, timestamp_value):
-    cert_dir = os.path.join('static', 'certs')
-    os.makedirs(cert_dir, exist_ok=True)
-    safe_name = os.path.splitext(secure_filename(filename))[0]
-    safe_timestamp = str(timestamp_value).replace(":", "").replace(" ", "").replace("-", "")
-    qr_filename = f"cert_{safe_name}_{safe_timestamp}.png"
-    qr_path = os.path.join(cert_dir, qr_filename)
-    if not os.path.exists(qr_path):
-        qr_payload = json.dumps(certificate_data, separators=(",", ":"))
-        qr = qrcode.QRCode(
-            version=2,
-            error_correction=qrcode.constants.ERROR_CORRECT_M,
-            box_size=6,
-            border=2
-        )
-        qr.add_data(qr_payload)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
-        img.save(qr_path)
-    return qr_path
-
-def generate_certificate_image(certificate_data, filename, timestamp_value):
-    cert_dir = os.path.join('static', 'certs')
-    os.makedirs(cert_dir, exist_ok=True)
-    safe_name = os.path.splitext(secure_filename(filename))[0]
-    safe_timestamp = str(timestamp_value).replace(":", "").replace(" ", "").replace("-", "")
-    cert_filename = f"certimg_{safe_name}_{safe_timestamp}.jpg"
-    cert_path = os.path.join(cert_dir, cert_filename)
+def build_certificate_data(log):
+    """Certificate payload for one detection log entry."""
+    return {
+        'filename': log.get('filename', 'Unknown'),
+        'result': 'REAL' if str(log.get('prediction', '')).lower() == 'real' else 'FAKE',
+        'model_id': log.get('model_version') or LEGACY_MODEL_ID,
+        'timestamp': log.get('timestamp'),
+        'file_hash': log.get('file_hash')
+    }
 
-    qr_path = generate_certificate_qr(certificate_data, filename, timestamp_value)
-    qr_img = Image.open(qr_path).convert("RGB")
+def select_logs_for_export(logs, start=None, end=None, prediction=None, timestamps=None):
+    """Filter log entries by date range (inclusive), prediction and timestamp IDs."""
+    if end and len(end) == 10:
+        # Date-only upper bound covers the whole day
+        end = end + ' 23:59:59'
+    prediction = (prediction or '').strip().lower()
+    wanted = set(timestamps or [])
+    selected = []
+    for log in logs:
+        ts = log.get('timestamp') or ''
+        if wanted and ts not in wanted:
+            continue
+        if start and ts < start:
+            continue
+        if end and ts > end:
+            continue
+        if prediction and str(log.get('prediction', '')).lower() != prediction:
+            continue
+        selected.append(log)
+    return selected
+
+def query_logs(start=None, end=None, archived=False):
+    """Live log entries, plus archived ones if requested, within [start, end]."""
+    logs = read_logs()
+    if archived:
+        logs = read_archived_logs(start, end) + logs
+    if start or end:
+        logs = select_logs_for_export(logs, start=start, end=end)
+    return logs
+
+def find_log(timestamp_value):
+    """Detection log entry with this timestamp, live or archived, or None."""
+    for log in read_logs():
+        if log.get('timestamp') == timestamp_value:
+            return log
+    return find_archived_log(timestamp_value)
+
+def _render_certificate_for_export(certificate_data):
+    # Runs in an export worker process; the font/template caches live per worker
+    return certificate_jpeg(certificate_data)
 
-    width, height = 1200, 675
-    img = Image.new('RGB', (width, height), color='white')
-    draw = ImageDraw.Draw(img)
+_export_pool = None
 
+def get_export_pool():
+    global _export_pool
+    if _export_pool is None:
+        _export_pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS)
+    return _export_pool
+
+def render_certificates_for_export(certificates):
+    """Yield certificate JPEG bytes in order, keeping at most EXPORT_RENDER_AHEAD renders queued.
+
+    Closing the generator (the client went away) cancels the renders that
+    have not started yet.
+    """
+    pool = get_export_pool()
+    remaining = iter(certificates)
+    pending = deque(pool.submit(_render_certificate_for_export, data)
+                    for data in islice(remaining, EXPORT_RENDER_AHEAD))
     try:
-        font_title = ImageFont.truetype("DejaVuSans-Bold.ttf", 42)
-        font_body = ImageFont.truetype("DejaVuSans.ttf", 22)
-        font_small = ImageFont.truetype("DejaVuSans.ttf", 16)
-    except Exception:
-        font_title = ImageFont.load_default()
-        font_body = ImageFont.load_default()
-        font_small = ImageFont.load_default()
-
-    draw.text((40, 30), "Voice Integrity Certificate", font=font_title, fill=(20, 20, 20))
-    draw.line([(40, 90), (width - 40, 90)], fill=(200, 200, 200), width=2)
-
-    left_x = 50
-    y = 120
-    line_h = 36
-
-    def draw_kv(key, value):
-        nonlocal y
-        draw.text((left_x, y), f"{key}:", font=font_body, fill=(40, 40, 40))
-        draw.text((left_x + 260, y), str(value), font=font_body, fill=(0, 0, 0))
-        y += line_h
-
-    draw_kv("File", certificate_data.get("filename"))
-    draw_kv("Result", certificate_data.get("result"))
-    draw_kv("Model ID", certificate_data.get("model_id"))
-    draw_kv("Timestamp", certificate_data.get("timestamp"))
-
-    qr_size = 300
-    qr_img = qr_img.resize((qr_size, qr_size), Image.LANCZOS)
-    qr_x = width - qr_size - 80
-    qr_y = 150
-    img.paste(qr_img, (qr_x, qr_y))
-    draw.text((qr_x, qr_y + qr_size + 10), "Scan for authenticity", font=font_small, fill=(40, 40, 40))
-
-    img.save(cert_path, "JPEG", quality=90)
-    return cert_path
+        while pending:
+            jpeg = pending.popleft().result()
+            for data in islice(remaining, 1):
+                pending.append(pool.submit(_render_certificate_for_export, data))
+            yield jpeg
+    finally:
+        for future in pending:
+            future.cancel()
+
+# —— Request instrumentation ———————————————————————————
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.in_flight_endpoint = request.endpoint or 'unknown'
+    IN_FLIGHT.inc(g.in_flight_endpoint)
+
+@app.teardown_request
+def finish_request_timer(exc):
+    endpoint = g.pop('in_flight_endpoint', None)
+    if endpoint is not None:
+        IN_FLIGHT.dec(endpoint)
+
+@app.after_request
+def record_request_time(response):
+    start = g.get('request_start')
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or 'unknown', str(response.status_code))
+    return response
 
 # —— Routes ————————————————————————————————————————
 
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({'error': f'Upload exceeds {MAX_UPLOAD_MB} MB'}), 413
+
 @app.route('/')
 def index():
     """Render upload form and any flash messages."""
     return render_template('index.html')
 
-def transcribe_audio(audio_path):
-    """Convert speech to text using Google's speech recognition."""
-    r = sr.Recognizer()
-    
-    # Convert to WAV if needed (pydub can handle other formats)
-    if not audio_path.lower().endswith('.wav'):
-        sound = AudioSegment.from_file(audio_path)
-        wav_path = audio_path + '.wav'
-        sound.export(wav_path, format='wav')
-        audio_path = wav_path
-    
+# 'google' calls Google's API; 'fake' uses a local stand-in with configurable latency (load tests)
+TRANSCRIBE_BACKEND = os.environ.get('TRANSCRIBE_BACKEND', 'google').lower()
+
+def make_recognizer():
+    if TRANSCRIBE_BACKEND == 'fake':
+        from fake_recognizer import FakeRecognizer
+        return FakeRecognizer()
+    return sr.Recognizer()
+
+def transcribe_audio(audio_path=None, samples=None):
+    """Convert speech to text using Google's speech recognition.
+
+    samples is an already decoded (y, sr) pair; passing it avoids decoding
+    the file a second time.
+    """
+    r = make_recognizer()
     try:
-        with sr.AudioFile(audio_path) as source:
-            audio_data = r.record(source)
-            text = r.recognize_google(audio_data)
-            return text
+        if samples is None:
+            samples = load_audio(audio_path, duration=MAX_AUDIO_SECONDS)
+        y, sr_rate = samples
+        audio_data = sr.AudioData(to_pcm16(y), sr_rate, 2)
+        text = r.recognize_google(audio_data)
+        return text
     except sr.UnknownValueError:
         return "Could not understand audio"
     except sr.RequestError as e:
         return f"Could not request results; {e}"
     except Exception as e:
         return f"Error during transcription: {str(e)}"
-    finally:
-        # Clean up temporary WAV file if it was created
-        if 'wav_path' in locals() and os.path.exists(wav_path):
-            os.remove(wav_path)
 
 
-def analyze_scam_behavior(transcription: str):
+def analyze_scam_behavior(transcription: str, scam_version=None):
     """Analyze transcript text for scam / behavior using the BETTER30 text model.
 
+    scam_version is the registry snapshot to use; by default the current one.
     Returns a tuple (scam_label, scam_comment). If analysis is unavailable,
     returns (None, None) without raising.
     """
-    global scam_text_model
-
     if not transcription or not isinstance(transcription, str):
         return None, None
 
-    # Lazy-load the text classification model
-    if scam_text_model is None:
-        if not os.path.exists(SCAM_MODEL_PATH):
-            print(f"[SCAM_MODEL] Model file not found at {SCAM_MODEL_PATH}; skipping scam analysis.")
-            return None, None
-        try:
-            scam_text_model = joblib.load(SCAM_MODEL_PATH)
-            print("[SCAM_MODEL] Loaded scam behavior model.")
-        except Exception as e:
-            print(f"[SCAM_MODEL] Error loading scam model: {e}")
-            return None, None
+    # The registry loads the text classification model on first use
+    if scam_version is None:
+        scam_version = scam_registry.current()
+    if scam_version is None:
+        print(f"[SCAM_MODEL] Model unavailable at {SCAM_MODEL_PATH} ({scam_registry.last_error}); skipping scam analysis.")
+        return None, None
 
     try:
-        raw_label = scam_text_model.predict([transcription])[0]
+        raw_label = scam_version.model.predict([transcription])[0]
         raw_label_str = str(raw_label).strip().lower()
     except Exception as e:
         print(f"[SCAM_MODEL] Error during scam prediction: {e}")
@@ -277,68 +382,70 @@ def analyze_scam_behavior(transcription: str):
 
 @app.route('/tts_generate', methods=['POST'])
 def tts_generate():
-    """Generate speech audio from text using pyttsx3 and return a WAV file."""
+    """Generate speech audio from text using pyttsx3 and return a (cached) WAV file."""
     data = request.get_json(silent=True) or {}
     text = (data.get('text') or '').strip()
     if not text:
         return jsonify({'error': 'Text is required'}), 400
+    if len(text) > MAX_TTS_CHARS:
+        return jsonify({'error': f'Text is limited to {MAX_TTS_CHARS} characters'}), 400
+
+    try:
+        rate = int(data.get('rate', DEFAULT_RATE))
+        volume = float(data.get('volume', DEFAULT_VOLUME))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'rate and volume must be numeric'}), 400
+    voice = data.get('voice') or None
 
     try:
-        filename, filepath = synthesize_to_wav(text, UPLOAD_FOLDER)
+        filename, filepath, cache_hit = synthesize_cached(text, rate=rate, volume=volume, voice=voice)
     except Exception as e:
         return jsonify({'error': f'Failed to synthesize audio: {str(e)}'}), 500
 
-    return send_file(filepath, mimetype='audio/wav', as_attachment=False, download_name=filename)
-
-
-@app.route('/upload', methods=['POST'])
-def handle_upload():
-    """Handle file upload, prediction, and transcription."""
-    # 1. Validate file present
-    if 'file' not in request.files:
-        flash('No file part in request', 'danger')
-        return redirect(url_for('index'))
-    file = request.files['file']
-    if file.filename == '':
-        flash('No file selected', 'danger')
-        return redirect(url_for('index'))
-
-    # 2. Validate extension
-    if not allowed_file(file.filename):
-        flash('Invalid file type; please upload a .wav file', 'danger')
-        return redirect(url_for('index'))
+    response = send_file(filepath, mimetype='audio/wav', as_attachment=False,
+                         download_name=filename, conditional=True)
+    response.headers['X-TTS-Cache'] = 'HIT' if cache_hit else 'MISS'
+    return response
 
-    # 3. Save file
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
-    file_hash = generate_file_hash(filepath)
-
-    # 4. Extract features & predict
-    source = (request.form.get('source') or '').strip().lower()
-    features = extract_features(filepath)
-    pred = model.predict(features)[0]  # 0 = Real, 1 = Fake
-    is_real = (pred == 0)
-    label = 'Real' if is_real else 'Fake'
-
-    # If source is TTS, always treat as Fake regardless of model output
-    if source == 'tts':
-        is_real = False
-        label = 'Fake'
-    
-    # 5. Transcribe the audio
-    transcription = transcribe_audio(filepath)
 
-    # 6. Analyze transcript for scam / behavior using text model
-    scam_label, scam_comment = analyze_scam_behavior(transcription)
+def run_detection(filename, y, sr_rate, voice_version, scam_version, activity=None):
+    """Full analysis of decoded audio: verdict, timeline, speakers, transcript, scam label.
 
-    # 7. Log locally with transcription and scam analysis
-    log_action(filename, label, transcription, scam_label=scam_label, scam_comment=scam_comment, file_hash=file_hash)
+    activity may pass vad.voice_activity(y, sr_rate) when it was already computed.
+    """
+    result = detect_voice(y, sr_rate, voice_version.model, FRAME_SCORING, SPEAKER_SEGMENTATION, activity)
+    speech = result.pop('speech')
+    has_speech = speech.size > 0
+
+    # Compare against the candidate model off the request path
+    if shadow is not None:
+        shadow.submit(result['features'], result['pred'], voice_version.version_id, result['predict_ms'],
+                      filename=filename)
+
+    # Transcribe the speech (the recognizer is skipped entirely when there is none)
+    scam_label, scam_comment = None, None
+    if has_speech:
+        with stage('transcribe'):
+            transcription = transcribe_audio(samples=(speech, sr_rate))
+
+        # Analyze transcript for scam / behavior using text model
+        with stage('scam'):
+            scam_label, scam_comment = analyze_scam_behavior(transcription, scam_version)
+    else:
+        transcription = NO_SPEECH_TRANSCRIPT
+
+    return {
+        'label': result['label'],
+        'transcription': transcription,
+        'scam_label': scam_label,
+        'scam_comment': scam_comment,
+        'speakers': result['speakers'],
+        'timeline': result['timeline'],
+    }
 
-    # 8. Store the prediction in blockchain
-    send_to_blockchain(filename, is_real, datetime.now())
 
-    # 9. Prepare response with detection, transcription, and scam analysis
+def upload_messages(label, transcription, scam_label=None, scam_comment=None, match=None, speakers=None):
+    """Flash message lines summarizing one analyzed upload."""
     messages = [
         f'🎤 Voice detected as: {label}',
         f'📝 Transcription: {transcription}'
@@ -347,15 +454,18 @@ def handle_upload():
         messages.append(f'⚠️ Scam analysis: {scam_label}')
     if scam_comment:
         messages.append(f'🧠 Behavior insight: {scam_comment}')
+    if match is not None:
+        messages.append(f"♻️ Matched previously analyzed audio ({match['filename']}); verdict reused")
+    if speakers and len(speakers['speakers']) > 1:
+        for speaker in speakers['speakers']:
+            ranges = ', '.join(f'{start:.1f}-{end:.1f}s' for start, end in speaker['ranges'])
+            messages.append(f"👥 Speaker {speaker['speaker']}: {speaker['verdict']} ({ranges})")
+    return messages
 
-    flash(messages, 'success' if is_real else 'danger')
-
-    # 10. Remove file from the server after processing
-    os.remove(filepath)
-
-    return redirect(url_for('index'))
 
-def upload_file():
+@app.route('/upload', methods=['POST'])
+def handle_upload():
+    """Handle file upload, prediction, and transcription."""
     # 1. Validate file present
     if 'file' not in request.files:
         flash('No file part in request', 'danger')
@@ -367,34 +477,89 @@ def upload_file():
 
     # 2. Validate extension
     if not allowed_file(file.filename):
-        flash('Invalid file type; please upload a .wav file', 'danger')
+        flash('Invalid file type; please upload a WAV, MP3, OGG, OPUS, FLAC or M4A file', 'danger')
         return redirect(url_for('index'))
 
-    # 3. Save file
+    # 3. Check the duration from the header, then save the file
+    rejection = check_upload_header(file.stream, file.filename)
+    if rejection:
+        flash(rejection, 'danger')
+        return redirect(url_for('index'))
     filename = secure_filename(file.filename)
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
-
-    # 4. Extract features & predict
-    features = extract_features(filepath)
-    pred = model.predict(features)[0]  # 0 = Real, 1 = Fake
-    is_real = (pred == 0)
-    label = 'Real' if is_real else 'Fake'
-    
-    # 5. Transcribe the audio
-    transcription = transcribe_audio(filepath)
-    
-    # 6. Log locally with transcription
-    log_action(filename, label, transcription, file_hash=file_hash)
+    with stage('save'):
+        file.save(filepath)
+    with stage('hash'):
+        file_hash = generate_file_hash(filepath)
+
+    # 4. Pin one model version for the whole request
+    source = (request.form.get('source') or '').strip().lower()
+    voice_version = voice_registry.current()
+    scam_version = scam_registry.current()
+
+    # Byte-identical re-uploads reuse the earlier verdict without decoding
+    match = None
+    if fingerprint_index is not None:
+        with stage('dedupe'):
+            match = fingerprint_index.find_exact(file_hash, voice_version.version_id)
+
+    if match is None:
+        try:
+            with stage('decode'):
+                y, sr_rate = load_audio(filepath, duration=MAX_AUDIO_SECONDS)
+        except (AudioDecodeError, RuntimeError) as e:
+            os.remove(filepath)
+            flash(f'Could not decode audio: {e}', 'danger')
+            return redirect(url_for('index'))
+
+        # Re-encoded or trimmed copies of known audio match on fingerprints of their speech
+        activity = None
+        if fingerprint_index is not None:
+            with stage('vad'):
+                activity = voice_activity(y, sr_rate)
+            with stage('fingerprint'):
+                fp_hashes, fp_offsets = fingerprint(y, sr_rate, activity[0])
+                match = fingerprint_index.match(fp_hashes, fp_offsets, voice_version.version_id)
+
+    # 5. Reuse a matched verdict, or run the full detection pipeline
+    speakers = timeline = None
+    if match is not None:
+        label = match['prediction']
+        transcription = match['transcription']
+        scam_label, scam_comment = match['scam_label'], match['scam_comment']
+        scam_model_version = match['scam_model_version']
+        print(f"[DEDUPE] {filename} matches track {match['track_id']} ({match['filename']}); reusing its verdict")
+    else:
+        result = run_detection(filename, y, sr_rate, voice_version, scam_version, activity)
+        label = result['label']
+        transcription = result['transcription']
+        scam_label, scam_comment = result['scam_label'], result['scam_comment']
+        scam_model_version = scam_version.version_id if scam_version and scam_label else None
+        speakers, timeline = result['speakers'], result['timeline']
+        if fingerprint_index is not None:
+            with stage('fingerprint_index'):
+                fingerprint_index.add(fp_hashes, fp_offsets, file_hash, filename, label, transcription,
+                                      scam_label, scam_comment, voice_version.version_id, scam_model_version)
+    is_real = (label == 'Real')
+
+    # If source is TTS, always treat as Fake regardless of model output
+    if source == 'tts':
+        is_real = False
+        label = 'Fake'
+
+    # 6. Log locally with transcription and scam analysis
+    with stage('log'):
+        log_action(filename, label, transcription, scam_label=scam_label, scam_comment=scam_comment, file_hash=file_hash,
+                   model_version=voice_version.version_id,
+                   scam_model_version=scam_model_version, speakers=speakers, timeline=timeline)
 
     # 7. Store the prediction in blockchain
-    send_to_blockchain(filename, is_real, datetime.now())
+    with stage('blockchain'):
+        send_to_blockchain(filename, is_real, datetime.now(), model_version=voice_version.version_id)
 
-    # 8. Prepare response with both detection and transcription
-    flash([
-        f'🎤 Voice detected as: {label}',
-        f'📝 Transcription: {transcription}'
-    ], 'success' if is_real else 'danger')
+    # 8. Prepare response with detection, transcription, and scam analysis
+    messages = upload_messages(label, transcription, scam_label, scam_comment, match, speakers)
+    flash(messages, 'success' if is_real else 'danger')
 
     # 9. Remove file from the server after processing
     os.remove(filepath)
@@ -405,19 +570,72 @@ def upload_file():
 def logs():
     """
     Read the JSON log and render it as a table.
+
+    ?archived=1 also includes records rolled into the compressed archives;
+    start/end (YYYY-MM-DD[ HH:MM:SS]) limit both to a date range.
     """
-    log_file = 'data/sample_alerts.json'
-    if os.path.exists(log_file):
-        with open(log_file, 'r') as f:
-            logs = json.load(f)
-    else:
-        logs = []
-    return render_template('logs.html', logs=logs)
+    start = (request.args.get('start') or '').strip() or None
+    end = (request.args.get('end') or '').strip() or None
+    archived = request.args.get('archived') == '1'
+    logs = query_logs(start, end, archived)
+    return render_template('logs.html', logs=logs, archived=archived, start=start, end=end)
+
+@app.route('/timeline/<timeline_id>')
+def timeline_data(timeline_id):
+    """Full fake-probability timeline of one detection, fetched by the /logs heatmap."""
+    timeline = load_timeline(timeline_id)
+    if timeline is None:
+        return jsonify({'error': 'Timeline not found'}), 404
+    response = jsonify(timeline)
+    # Timelines never change once written
+    response.cache_control.private = True
+    response.cache_control.max_age = 86400
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for this worker: stage/request latency, cache hit rates, queue depths."""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/models')
+def model_versions():
+    """Report the model versions currently served by this worker."""
+    report = {}
+    for registry in (voice_registry, scam_registry):
+        version = registry.current()
+        report[registry.name] = version.to_dict() if version else {'path': registry.path, 'error': registry.last_error}
+    return jsonify(report)
+
+@app.route('/shadow')
+def shadow_stats():
+    """Agreement and latency of the shadow candidate versus the served model."""
+    if shadow is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(shadow.stats(), enabled=True))
+
+@app.route('/models/reload', methods=['POST'])
+def reload_models():
+    """Check the model artifacts now instead of waiting for the next periodic check."""
+    swapped = {}
+    for registry in (voice_registry, scam_registry):
+        try:
+            swapped[registry.name] = registry.reload()
+        except Exception as e:
+            swapped[registry.name] = f'error: {e}'
+    return jsonify(swapped)
+
+@app.route('/maintenance/run', methods=['POST'])
+def maintenance_run():
+    """Run a retention pass now instead of waiting for the background interval."""
+    report = run_maintenance()
+    if report is None:
+        return jsonify({'error': 'A maintenance pass is already running'}), 409
+    return jsonify(report)
 
 @app.route('/blockchain')
 def view_blockchain():
     """Render the blockchain data from the database."""
-    blockchain_data = blockchain.chain
+    blockchain_data = [block.to_dict() for block in blockchain.chain]
     return render_template('blockchain.html', blockchain=blockchain_data)
 
 @app.route('/certificate')
@@ -426,27 +644,14 @@ def view_certificate():
     if not timestamp_value:
         flash('Certificate generation failed: missing timestamp', 'danger')
         return redirect(url_for('logs'))
-    log_file = 'data/sample_alerts.json'
-    if not os.path.exists(log_file):
-        flash('Certificate generation failed: no detection history available', 'danger')
-        return redirect(url_for('logs'))
-    with open(log_file, 'r') as f:
-        try:
-            logs = json.load(f)
-        except json.JSONDecodeError:
-            logs = []
-    selected_log = None
-    for log in logs:
-        if log.get('timestamp') == timestamp_value:
-            selected_log = log
-            break
+    selected_log = find_log(timestamp_value)
     if not selected_log:
         flash('Certificate generation failed: record not found', 'danger')
         return redirect(url_for('logs'))
     filename = selected_log.get('filename', 'Unknown')
     prediction = selected_log.get('prediction', '')
     result = 'REAL' if str(prediction).lower() == 'real' else 'FAKE'
-    model_id = 'voice_detector_v1'
+    model_id = selected_log.get('model_version') or LEGACY_MODEL_ID
     file_hash = selected_log.get('file_hash')
     if not file_hash:
         file_hash = 'N/A'
@@ -468,37 +673,107 @@ def download_certificate():
     if not timestamp_value:
         flash('Certificate download failed: missing timestamp', 'danger')
         return redirect(url_for('logs'))
-    log_file = 'data/sample_alerts.json'
-    if not os.path.exists(log_file):
-        flash('Certificate download failed: no detection history available', 'danger')
-        return redirect(url_for('logs'))
-    with open(log_file, 'r') as f:
-        try:
-            logs = json.load(f)
-        except json.JSONDecodeError:
-            logs = []
-    selected_log = None
-    for log in logs:
-        if log.get('timestamp') == timestamp_value:
-            selected_log = log
-            break
+    selected_log = find_log(timestamp_value)
     if not selected_log:
         flash('Certificate download failed: record not found', 'danger')
         return redirect(url_for('logs'))
     filename = selected_log.get('filename', 'Unknown')
-    certificate_data = {
-        'filename': filename,
-        'result': 'REAL' if str(selected_log.get('prediction', '')).lower() == 'real' else 'FAKE',
-        'model_id': 'voice_detector_v1',
-        'timestamp': timestamp_value,
-        'file_hash': selected_log.get('file_hash')
-    }
+    certificate_data = build_certificate_data(selected_log)
+    etag = certificate_cache_key(certificate_data)
+    if request.if_none_match.contains(etag):
+        # Client already holds this exact certificate; skip rendering entirely
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
     cert_path = generate_certificate_image(certificate_data, filename, timestamp_value)
     if not os.path.exists(cert_path):
         flash('Certificate download failed: certificate not available', 'danger')
         return redirect(url_for('logs'))
-    return send_file(cert_path, mimetype='image/jpeg', as_attachment=True, download_name='Voice_Integrity_Certificate.jpg')
+    response = send_file(cert_path, mimetype='image/jpeg', as_attachment=True,
+                         download_name='Voice_Integrity_Certificate.jpg', etag=etag, conditional=True)
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response
+
+@app.route('/export_certificates', methods=['GET', 'POST'])
+def export_certificates():
+    """Stream many certificates at once as a ZIP of JPEGs or a multi-page PDF.
+
+    Filters (query string or form): start, end (YYYY-MM-DD[ HH:MM:SS]),
+    prediction (Real/Fake), ts (repeatable or comma-separated timestamps),
+    format (zip or pdf), archived=1 to include archived records.
+    """
+    params = request.values
+    timestamps = []
+    for value in params.getlist('ts'):
+        timestamps.extend(t.strip() for t in value.split(',') if t.strip())
+    export_format = (params.get('format') or 'zip').lower()
+    if export_format not in ('zip', 'pdf'):
+        return jsonify({'error': "format must be 'zip' or 'pdf'"}), 400
+
+    start = (params.get('start') or '').strip() or None
+    end = (params.get('end') or '').strip() or None
+    logs = read_logs()
+    if params.get('archived') == '1':
+        logs = read_archived_logs(start, end) + logs
+
+    selected = select_logs_for_export(
+        logs,
+        start=start,
+        end=end,
+        prediction=params.get('prediction'),
+        timestamps=timestamps,
+    )
+    if not selected:
+        return jsonify({'error': 'No detection records match the filter'}), 404
+    if len(selected) > EXPORT_MAX_CERTIFICATES:
+        return jsonify({'error': f'Too many certificates requested ({len(selected)}); '
+                                 f'narrow the filter to at most {EXPORT_MAX_CERTIFICATES}'}), 400
+
+    certificates = [build_certificate_data(log) for log in selected]
+    # Renders run a bounded distance ahead in the pool while earlier ones stream out
+    jpegs = render_certificates_for_export(certificates)
+
+    if export_format == 'pdf':
+        pages = stream_certificate_pdf(jpegs)
+        mimetype, extension = 'application/pdf', 'pdf'
+    else:
+        def entries():
+            used = set()
+            for data, jpeg in zip(certificates, jpegs):
+                stem = os.path.splitext(secure_filename(data['filename']) or 'audio')[0]
+                stamp = str(data['timestamp']).replace(':', '').replace(' ', '_').replace('-', '')
+                arcname = f"certificate_{stem}_{stamp}.jpg"
+                suffix = 1
+                while arcname in used:
+                    suffix += 1
+                    arcname = f"certificate_{stem}_{stamp}_{suffix}.jpg"
+                used.add(arcname)
+                yield arcname, jpeg
+        pages = stream_certificate_zip(entries())
+        mimetype, extension = 'application/zip', 'zip'
+
+    def body():
+        try:
+            yield from pages
+        finally:
+            # Runs when the response is closed early too; stops queued renders
+            jpegs.close()
+
+    export_name = f"voice_integrity_certificates_{datetime.now().strftime('%Y%m%d%H%M%S')}.{extension}"
+    return Response(
+        stream_with_context(body()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{export_name}"'},
+    )
+
+# Wrap the profiled routes last, once every view is registered
+init_profiling(app, app.config['PROFILING_MODE'], app.config['PROFILING_TOKEN'])
+# Outermost wrapper, so queued or rejected requests never start a profile capture
+admission = init_admission(app, ADMISSION_LIMITS, ADMISSION_QUEUE_TIMEOUT_S)
 
 # —— Run the App ————————————————————————————————
+# Flask's development server; production deployments run serve.py (uvicorn)
 if __name__ == '__main__':
-    app.run(debug=True)
+    # The debugger allows arbitrary code execution; only enable it on a trusted machine
+    app.run(debug=os.environ.get('APP_DEBUG', 'off').lower() == 'on')
@@ -0,0 +1,433 @@
+"""ASGI serving mode: native async /upload, /logs and /tts_generate.
+
+    python serve.py                      # production server (uvicorn)
+    uvicorn asgi:application --port 5000
+
+The three routes run on the event loop; every other route is the
+unchanged Flask view behind asgiref's WsgiToAsgi adapter. Of the work on
+an upload:
+
+- decoding, fingerprinting, VAD, features, predict and diarization run
+  in a spawn-started process pool (cpu_tasks.py);
+- SQLite, log writes and file I/O run in the thread pool;
+- transcription is an awaited HTTP request (httpx), so an upload waiting
+  on Google holds neither a thread nor a worker process.
+
+One process therefore keeps thousands of uploads in flight while they
+wait on the recognizer. Admission gates on the routes and on the process
+pool bound that backlog and answer 429 beyond it. Flash messages and the session cookie go through
+Flask's session interface, so the pages behave as in WSGI mode.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from flask import flash, redirect, render_template, session, url_for
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.utils import secure_filename
+
+import app as flask_module
+import cpu_tasks
+from admission import AdmissionController, Overloaded
+from app import (
+    ADMISSION_LIMITS,
+    ADMISSION_QUEUE_TIMEOUT_S,
+    FRAME_SCORING,
+    MAX_TTS_CHARS,
+    MAX_UPLOAD_MB,
+    MODEL_PATH,
+    NO_SPEECH_TRANSCRIPT,
+    SPEAKER_SEGMENTATION,
+    TRANSCRIBE_BACKEND,
+    allowed_file,
+    analyze_scam_behavior,
+    check_upload_header,
+    make_recognizer,
+    query_logs,
+    scam_registry,
+    send_to_blockchain,
+    upload_messages,
+    voice_registry,
+)
+from audio_io import AudioDecodeError
+from metrics import IN_FLIGHT, REQUEST_SECONDS, record_cache, record_stages, stage
+from tts_service import DEFAULT_RATE, DEFAULT_VOLUME, TTS_CACHE_DIR, tts_cache_key
+from user_actions import log_action
+
+flask_app = flask_module.app
+
+# Worker processes for the CPU stages (each loads the voice model once)
+CPU_WORKERS = int(os.environ.get('CPU_WORKERS', os.cpu_count() or 1))
+TRANSCRIBE_TIMEOUT_S = 60
+# Google Web Speech endpoint, called the way speech_recognition's recognize_google does
+GOOGLE_SPEECH_URL = 'http://www.google.com/speech-api/v2/recognize'
+# API key for GOOGLE_SPEECH_URL; required unless TRANSCRIBE_BACKEND=fake
+GOOGLE_SPEECH_KEY = os.environ.get('GOOGLE_SPEECH_KEY')
+GOOGLE_SPEECH_LANGUAGE = 'en-US'
+# Most uploads wait on transcription at once; keep their connections pooled
+HTTP_MAX_CONNECTIONS = 1000
+
+# Admission control: uploads mostly wait on I/O here, so the route admits far more
+# at once than in WSGI mode; the process pool is gated separately so its backlog
+# stays bounded and overflow gets a fast 429 instead of queueing unseen
+ASGI_UPLOAD_MAX_CONCURRENT = int(os.environ.get('ASGI_UPLOAD_MAX_CONCURRENT', '2000'))
+ASGI_UPLOAD_MAX_QUEUE = int(os.environ.get('ASGI_UPLOAD_MAX_QUEUE', '500'))
+CPU_MAX_QUEUE = int(os.environ.get('CPU_MAX_QUEUE', 8 * CPU_WORKERS))
+upload_admission = AdmissionController('asgi_upload', ASGI_UPLOAD_MAX_CONCURRENT, ASGI_UPLOAD_MAX_QUEUE,
+                                       ADMISSION_QUEUE_TIMEOUT_S)
+tts_admission = AdmissionController('asgi_tts', *ADMISSION_LIMITS['tts_generate'],
+                                    queue_timeout_s=ADMISSION_QUEUE_TIMEOUT_S)
+cpu_admission = AdmissionController('cpu_pool', CPU_WORKERS, CPU_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT_S)
+
+_cpu_pool = None
+_http = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _cpu_pool, _http
+    if TRANSCRIBE_BACKEND != 'fake' and not GOOGLE_SPEECH_KEY:
+        raise RuntimeError('GOOGLE_SPEECH_KEY is not set; set it to a Google Speech API key, '
+                           'or set TRANSCRIBE_BACKEND=fake to run without transcription')
+    _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    _http = httpx.AsyncClient(timeout=TRANSCRIBE_TIMEOUT_S,
+                              limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS))
+    try:
+        yield
+    finally:
+        await _http.aclose()
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_cpu(fn, *args):
+    """Run fn(*args) in the process pool and await its result; raises Overloaded when the pool is backed up."""
+    async with cpu_admission.async_slot():
+        return await asyncio.get_running_loop().run_in_executor(_cpu_pool, fn, *args)
+
+
+async def transcribe_async(flac_data, sample_rate):
+    """Awaitable counterpart of app.transcribe_audio, with the same error strings."""
+    try:
+        if TRANSCRIBE_BACKEND == 'fake':
+            return await make_recognizer().recognize_google_async(flac_data, sample_rate)
+        response = await _http.post(
+            GOOGLE_SPEECH_URL,
+            params={'client': 'chromium', 'lang': GOOGLE_SPEECH_LANGUAGE, 'key': GOOGLE_SPEECH_KEY},
+            content=flac_data,
+            headers={'Content-Type': f'audio/x-flac; rate={sample_rate}'},
+        )
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        return f"Could not request results; {e}"
+    except Exception as e:
+        return f"Error during transcription: {str(e)}"
+
+    # One JSON object per line; the first with a non-empty result holds the hypotheses
+    for line in response.text.split('\n'):
+        if not line.strip():
+            continue
+        try:
+            result = json.loads(line).get('result') or []
+        except json.JSONDecodeError as e:
+            return f"Error during transcription: {str(e)}"
+        if result and result[0].get('alternative'):
+            return result[0]['alternative'][0].get('transcript', '')
+    return "Could not understand audio"
+
+
+def flask_response(request, view):
+    """Call view() inside a Flask request context built from request; return it as a Starlette Response.
+
+    Templates, url_for and flash() work as in the WSGI routes, and the
+    session cookie flash() updates is written back.
+    """
+    headers = [(k, v) for k, v in request.headers.items() if k not in ('content-length', 'content-type')]
+    with flask_app.test_request_context(request.url.path, base_url=f'{request.url.scheme}://{request.url.netloc}',
+                                        query_string=request.url.query, method=request.method, headers=headers):
+        response = flask_app.make_response(view())
+        flask_app.session_interface.save_session(flask_app, session, response)
+    result = Response(response.get_data(), status_code=response.status_code)
+    result.raw_headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()]
+    return result
+
+
+def flash_redirect(request, message, category):
+    def view():
+        flash(message, category)
+        return redirect(url_for('index'))
+    return flask_response(request, view)
+
+
+def instrumented(endpoint):
+    """Record in-flight and latency metrics under the Flask endpoint name."""
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            start = time.perf_counter()
+            status = '500'
+            IN_FLIGHT.inc(endpoint)
+            try:
+                response = await handler(request)
+                status = str(response.status_code)
+                return response
+            finally:
+                IN_FLIGHT.dec(endpoint)
+                REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, status)
+        return wrapper
+    return decorate
+
+
+def overloaded_response(error):
+    return JSONResponse({'error': 'Server is busy; please retry shortly', 'retry_after': error.retry_after},
+                        status_code=429, headers={'Retry-After': str(error.retry_after)})
+
+
+def admitted(controller):
+    """Run the handler under controller's concurrency limit; 429 when it is full."""
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            try:
+                async with controller.async_slot():
+                    return await handler(request)
+            except Overloaded as e:
+                return overloaded_response(e)
+        return wrapper
+    return decorate
+
+
+def upload_too_large():
+    return JSONResponse({'error': f'Upload exceeds {MAX_UPLOAD_MB} MB'}, status_code=413)
+
+
+class BodyTooLarge(Exception):
+    """More request body bytes arrived than MAX_CONTENT_LENGTH allows."""
+
+
+def limit_body(request, max_bytes):
+    """request with its body stream cut off by BodyTooLarge once max_bytes have arrived.
+
+    Covers chunked requests and bodies longer than their Content-Length claims.
+    """
+    receive = request.receive
+    received = 0
+
+    async def counting_receive():
+        nonlocal received
+        message = await receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > max_bytes:
+                raise BodyTooLarge()
+        return message
+
+    return Request(request.scope, counting_receive)
+
+
+def _save_upload(upload, filepath):
+    """Copy an upload to disk, hashing it on the way; returns the SHA-256 hex digest."""
+    hasher = hashlib.sha256()
+    upload.file.seek(0)
+    with open(filepath, 'wb') as out:
+        for chunk in iter(lambda: upload.file.read(1 << 20), b''):
+            hasher.update(chunk)
+            out.write(chunk)
+    return hasher.hexdigest()
+
+
+@instrumented('handle_upload')
+@admitted(upload_admission)
+async def upload(request):
+    """Async /upload: same steps and responses as app.handle_upload."""
+    # Refuse oversized bodies before reading them, and stop reading any body (chunked
+    # ones too) once it passes the limit, as Flask's MAX_CONTENT_LENGTH does
+    max_bytes = flask_app.config['MAX_CONTENT_LENGTH']
+    if int(request.headers.get('content-length') or 0) > max_bytes:
+        return upload_too_large()
+    try:
+        form = await limit_body(request, max_bytes).form()
+    except BodyTooLarge:
+        return upload_too_large()
+    try:
+        # 1-2. Validate file present and extension
+        file = form.get('file')
+        if file is None or isinstance(file, str):
+            return flash_redirect(request, 'No file part in request', 'danger')
+        if not file.filename:
+            return flash_redirect(request, 'No file selected', 'danger')
+        if not allowed_file(file.filename):
+            return flash_redirect(request, 'Invalid file type; please upload a WAV, MP3, OGG, OPUS, FLAC or M4A file',
+                                  'danger')
+
+        # 3. Check the duration from the header, then save the file
+        rejection = await run_in_threadpool(check_upload_header, file.file, file.filename)
+        if rejection:
+            return flash_redirect(request, rejection, 'danger')
+        filename = secure_filename(file.filename)
+        filepath = os.path.join(flask_app.config['UPLOAD_FOLDER'], filename)
+        with stage('save'):
+            file_hash = await run_in_threadpool(_save_upload, file, filepath)
+        source = (form.get('source') or '').strip().lower()
+    finally:
+        await form.close()
+
+    # 4. Pin one model version for the whole request
+    voice_version = await run_in_threadpool(voice_registry.current)
+    scam_version = await run_in_threadpool(scam_registry.current)
+    model_version = voice_version.version_id
+    fingerprint_index = flask_module.fingerprint_index
+
+    # Byte-identical re-uploads reuse the earlier verdict without decoding
+    match = None
+    if fingerprint_index is not None:
+        with stage('dedupe'):
+            match = await run_in_threadpool(fingerprint_index.find_exact, file_hash, model_version)
+
+    if match is None:
+        try:
+            with stage('analyze'):
+                result = await run_cpu(cpu_tasks.analyze_upload, filepath, filename, MODEL_PATH, model_version,
+                                       fingerprint_index.db_path if fingerprint_index is not None else None,
+                                       FRAME_SCORING, SPEAKER_SEGMENTATION)
+        except (AudioDecodeError, RuntimeError) as e:
+            await run_in_threadpool(os.remove, filepath)
+            return flash_redirect(request, f'Could not decode audio: {e}', 'danger')
+        except Overloaded as e:
+            await run_in_threadpool(os.remove, filepath)
+            return overloaded_response(e)
+        # Stage timings measured in the worker go into this process's /metrics
+        record_stages(result.pop('stages'))
+        match = result['match']
+        model_version = result['model_version']
+
+    # 5. Reuse a matched verdict, or finish the detection with the awaited I/O stages
+    speakers = timeline = None
+    if match is not None:
+        label = match['prediction']
+        transcription = match['transcription']
+        scam_label, scam_comment = match['scam_label'], match['scam_comment']
+        scam_model_version = match['scam_model_version']
+        print(f"[DEDUPE] {filename} matches track {match['track_id']} ({match['filename']}); reusing its verdict")
+    else:
+        label = result['label']
+        speakers, timeline = result['speakers'], result['timeline']
+        shadow = flask_module.shadow
+        if shadow is not None:
+            shadow.submit(result['features'], result['pred'], model_version, result['predict_ms'], filename=filename)
+
+        scam_label, scam_comment = None, None
+        if result['flac'] is not None:
+            with stage('transcribe'):
+                transcription = await transcribe_async(result['flac'], result['sample_rate'])
+            with stage('scam'):
+                scam_label, scam_comment = await run_in_threadpool(analyze_scam_behavior, transcription, scam_version)
+        else:
+            transcription = NO_SPEECH_TRANSCRIPT
+        scam_model_version = scam_version.version_id if scam_version and scam_label else None
+
+        if result['fingerprint'] is not None:
+            hashes, offsets = result['fingerprint']
+            with stage('fingerprint_index'):
+                await run_in_threadpool(fingerprint_index.add, hashes, offsets, file_hash, filename, label,
+                                        transcription, scam_label, scam_comment, model_version, scam_model_version)
+    is_real = (label == 'Real')
+
+    # If source is TTS, always treat as Fake regardless of model output
+    if source == 'tts':
+        is_real = False
+        label = 'Fake'
+
+    # 6-7. Log locally and store the prediction in the blockchain
+    with stage('log'):
+        await run_in_threadpool(functools.partial(
+            log_action, filename, label, transcription, scam_label=scam_label, scam_comment=scam_comment,
+            file_hash=file_hash, model_version=model_version, scam_model_version=scam_model_version,
+            speakers=speakers, timeline=timeline))
+    with stage('blockchain'):
+        await run_in_threadpool(send_to_blockchain, filename, is_real, datetime.now(), model_version)
+
+    # 8. Prepare response with detection, transcription, and scam analysis
+    messages = upload_messages(label, transcription, scam_label, scam_comment, match, speakers)
+
+    # 9. Remove file from the server after processing
+    await run_in_threadpool(os.remove, filepath)
+
+    return flash_redirect(request, messages, 'success' if is_real else 'danger')
+
+
+@instrumented('logs')
+async def logs(request):
+    """Async /logs: the log files are read in the thread pool, the page rendered on the loop."""
+    start = (request.query_params.get('start') or '').strip() or None
+    end = (request.query_params.get('end') or '').strip() or None
+    archived = request.query_params.get('archived') == '1'
+    entries = await run_in_threadpool(query_logs, start, end, archived)
+    return flask_response(request, lambda: render_template('logs.html', logs=entries, archived=archived,
+                                                           start=start, end=end))
+
+
+@instrumented('tts_generate')
+@admitted(tts_admission)
+async def tts_generate(request):
+    """Async /tts_generate: cache hits are served directly, misses synthesized in the process pool."""
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        data = {}
+    text = (data.get('text') or '').strip()
+    if not text:
+        return JSONResponse({'error': 'Text is required'}, status_code=400)
+    if len(text) > MAX_TTS_CHARS:
+        return JSONResponse({'error': f'Text is limited to {MAX_TTS_CHARS} characters'}, status_code=400)
+
+    try:
+        rate = int(data.get('rate', DEFAULT_RATE))
+        volume = float(data.get('volume', DEFAULT_VOLUME))
+    except (TypeError, ValueError):
+        return JSONResponse({'error': 'rate and volume must be numeric'}, status_code=400)
+    voice = data.get('voice') or None
+
+    filename = f"{tts_cache_key(text, rate, volume, voice)}.wav"
+    filepath = os.path.join(TTS_CACHE_DIR, filename)
+    try:
+        os.utime(filepath)
+        cache_hit = True
+    except FileNotFoundError:
+        try:
+            filename, filepath, cache_hit, timings = await run_cpu(cpu_tasks.synthesize, text, rate, volume, voice)
+            record_stages(timings)
+        except Overloaded as e:
+            return overloaded_response(e)
+        except Exception as e:
+            return JSONResponse({'error': f'Failed to synthesize audio: {str(e)}'}, status_code=500)
+    record_cache('tts', cache_hit)
+
+    return FileResponse(filepath, media_type='audio/wav', filename=filename, content_disposition_type='inline',
+                        headers={'X-TTS-Cache': 'HIT' if cache_hit else 'MISS'})
+
+
+application = Starlette(
+    routes=[
+        Route('/upload', upload, methods=['POST']),
+        Route('/logs', logs, methods=['GET']),
+        Route('/tts_generate', tts_generate, methods=['POST']),
+        Mount('/', app=WsgiToAsgi(flask_app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,151 @@
+"""Decode uploaded audio straight into a numpy buffer.
+
+WAV, FLAC and OGG/Vorbis are read in-process with soundfile (libsndfile).
+MP3, OPUS and M4A, or anything soundfile refuses, are piped through an
+ffmpeg subprocess that writes mono float32 PCM at the target rate to
+stdout. No intermediate WAV is ever written to disk.
+"""
+
+import os
+import struct
+import subprocess
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+SUPPORTED_EXTENSIONS = {'wav', 'mp3', 'ogg', 'opus', 'flac', 'm4a'}
+SOUNDFILE_EXTENSIONS = {'wav', 'flac', 'ogg'}
+# Headers soundfile can report a duration for; MP3 and OGG/Opus need libsndfile >= 1.1
+PROBE_EXTENSIONS = {'flac', 'ogg', 'opus', 'mp3'}
+TARGET_SR = 22050
+FFMPEG_BIN = os.environ.get('FFMPEG_BIN', 'ffmpeg')
+FFMPEG_TIMEOUT = 60  # seconds
+
+
+class AudioDecodeError(ValueError):
+    """The file is not decodable audio (or the decoder is missing)."""
+
+
+def file_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def _decode_soundfile(path, duration, sr):
+    with sf.SoundFile(path) as f:
+        frames = -1 if duration is None else int(duration * f.samplerate)
+        data = f.read(frames, dtype='float32', always_2d=True)
+        native_sr = f.samplerate
+    # Downmix and resample the same way librosa.load does
+    y = data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+    if native_sr != sr:
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=sr)
+    return np.ascontiguousarray(y, dtype=np.float32)
+
+
+def _decode_ffmpeg(path, duration, sr):
+    cmd = [FFMPEG_BIN, '-nostdin', '-v', 'error', '-i', path]
+    if duration is not None:
+        cmd += ['-t', str(duration)]
+    cmd += ['-f', 'f32le', '-ac', '1', '-ar', str(sr), 'pipe:1']
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              timeout=FFMPEG_TIMEOUT, check=False)
+    except FileNotFoundError:
+        raise AudioDecodeError(f"ffmpeg not found (FFMPEG_BIN={FFMPEG_BIN}); it is required for "
+                               f".{file_extension(path)} uploads")
+    except subprocess.TimeoutExpired:
+        raise AudioDecodeError(f"ffmpeg timed out decoding {os.path.basename(path)}")
+    if proc.returncode != 0:
+        message = proc.stderr.decode(errors='replace').strip().splitlines()
+        raise AudioDecodeError(message[-1] if message else f"ffmpeg exited with {proc.returncode}")
+    return np.frombuffer(proc.stdout, dtype='<f4')
+
+
+def decode_audio(path, duration=None, sr=TARGET_SR):
+    """Mono float32 samples at ``sr`` (the first ``duration`` seconds if given)."""
+    ext = file_extension(path)
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise AudioDecodeError(f"Unsupported audio format: .{ext}")
+    if ext in SOUNDFILE_EXTENSIONS:
+        try:
+            y = _decode_soundfile(path, duration, sr)
+        except RuntimeError:
+            # libsndfile builds differ in codec support; let ffmpeg try
+            y = _decode_ffmpeg(path, duration, sr)
+    else:
+        y = _decode_ffmpeg(path, duration, sr)
+    if y.size == 0:
+        raise AudioDecodeError(f"No audio samples decoded from {os.path.basename(path)}")
+    return y, sr
+
+
+def wav_header_duration(fileobj):
+    """Duration in seconds from a RIFF/WAVE header, reading only chunk headers.
+
+    The file position is restored. Raises AudioDecodeError if the header is
+    not a valid PCM WAV header. A data size of 0 or 0xFFFFFFFF (written by
+    streaming recorders) falls back to the bytes actually present.
+    """
+    start = fileobj.tell()
+    try:
+        riff = fileobj.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise AudioDecodeError('Not a RIFF/WAVE file')
+        byte_rate = None
+        while True:
+            header = fileobj.read(8)
+            if len(header) < 8:
+                raise AudioDecodeError('WAV header has no data chunk')
+            chunk_id, size = header[:4], struct.unpack('<I', header[4:])[0]
+            if chunk_id == b'fmt ':
+                fmt = fileobj.read(size)
+                if len(fmt) < 16:
+                    raise AudioDecodeError('Truncated WAV fmt chunk')
+                _, channels, sample_rate, byte_rate = struct.unpack('<HHII', fmt[:12])
+                if not channels or not sample_rate:
+                    raise AudioDecodeError('WAV header has zero channels or sample rate')
+                if size % 2:
+                    fileobj.seek(1, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if not byte_rate:
+                    raise AudioDecodeError('WAV data chunk before fmt chunk')
+                data_start = fileobj.tell()
+                available = fileobj.seek(0, os.SEEK_END) - data_start
+                if size in (0, 0xFFFFFFFF) or size > available:
+                    size = available
+                return size / byte_rate
+            else:
+                # LIST, fact, bext, ...: skip (chunks are padded to even sizes)
+                fileobj.seek(size + (size % 2), os.SEEK_CUR)
+    finally:
+        fileobj.seek(start)
+
+
+def probe_duration(fileobj, filename):
+    """Duration in seconds read from the header of an upload, before any decoding.
+
+    WAV headers are parsed directly; FLAC, OGG, OPUS and MP3 go through
+    soundfile's header reader (MP3 and Opus need libsndfile >= 1.1).
+    Returns None for M4A, which has no cheap probe, and when soundfile
+    cannot read the header; such files are bounded only by the upload size
+    limit and by decoding stopping after its duration cap. Raises
+    AudioDecodeError for a malformed WAV header.
+    """
+    ext = file_extension(filename)
+    if ext == 'wav':
+        return wav_header_duration(fileobj)
+    if ext in PROBE_EXTENSIONS:
+        start = fileobj.tell()
+        try:
+            return sf.info(fileobj).duration
+        except RuntimeError:
+            return None
+        finally:
+            fileobj.seek(start)
+    return None
+
+
+def to_pcm16(y):
+    """Little-endian 16-bit PCM bytes, e.g. for speech_recognition.AudioData."""
+    return (np.clip(y, -1.0, 1.0) * 32767).astype('<i2').tobytes()
@@ -0,0 +1,236 @@
+"""Reproducible benchmarks for the detection pipeline.
+
+Generates synthetic WAVs locally, then times each stage on its own
+(extract_features, model.predict, analyze_scam_behavior, log_action,
+Blockchain.create_new_block, generate_certificate_image) and the whole
+/upload route through the Flask test client with transcription stubbed.
+Everything runs inside a scratch working directory so the real ledger,
+logs and certificate cache are never touched.
+
+    python3 benchmark_pipeline.py --output bench_results.json
+    python3 benchmark_pipeline.py --save-baseline        # record benchmarks/baseline.json
+    python3 benchmark_pipeline.py --compare              # exit 1 on regressions
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from datetime import datetime
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(REPO_DIR, 'benchmarks', 'baseline.json')
+DURATIONS = (1, 5, 10, 30)  # seconds
+SAMPLE_RATES = (8000, 16000, 22050, 44100)
+REGRESSION_THRESHOLD = 0.20  # fail when p50 is >20% slower than the baseline
+STUB_TRANSCRIPT = "this is the irs calling about an arrest warrant please pay with gift cards today"
+
+
+def synth_wav_bytes(duration, sample_rate, seed=0):
+    """Deterministic speech-like test signal: harmonic tones with syllable-rate AM and noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))
+    signal = 0.3 * voiced * envelope + 0.02 * rng.standard_normal(len(t))
+    pcm = np.clip(signal, -1, 1) * 32767
+
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.astype('<i2').tobytes())
+    return buf.getvalue()
+
+
+def measure(fn, iterations, warmup=2):
+    """Run fn repeatedly and summarise per-call latency (ms) and throughput."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    start_all = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    elapsed = time.perf_counter() - start_all
+    timings = np.array(timings)
+    return {
+        'iterations': iterations,
+        'mean_ms': float(timings.mean()),
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'p99_ms': float(np.percentile(timings, 99)),
+        'throughput_per_s': iterations / elapsed if elapsed else None,
+    }
+
+
+def prepare_workdir():
+    """Scratch directory with the models linked in and an empty ledger."""
+    workdir = tempfile.mkdtemp(prefix='voice_bench_')
+    for name in ('model', 'models'):
+        src = os.path.join(REPO_DIR, name)
+        if os.path.isdir(src):
+            os.symlink(src, os.path.join(workdir, name))
+    os.makedirs(os.path.join(workdir, 'audio'), exist_ok=True)
+    return workdir
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(iterations=20, quick=False):
+    workdir = prepare_workdir()
+    original_cwd = os.getcwd()
+    # Keep the scratch run self-contained and deterministic
+    os.environ['SHADOW_MODEL_PATH'] = 'off'
+    # Repeated uploads would otherwise be answered from the fingerprint index
+    os.environ['FINGERPRINT_DEDUPE'] = 'off'
+    # No background retention passes during timed runs
+    os.environ['MAINTENANCE_INTERVAL_S'] = '0'
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(workdir)
+    try:
+        import app as app_module
+        from blockchain import Blockchain
+        from certificates import render_certificate, generate_certificate_image
+        from user_actions import log_action
+
+        app_module.transcribe_audio = lambda path=None, samples=None: STUB_TRANSCRIPT
+        app_module.app.config['TESTING'] = True
+        voice_model = app_module.voice_registry.current().model
+
+        durations = DURATIONS[:2] if quick else DURATIONS
+        rates = SAMPLE_RATES[1:3] if quick else SAMPLE_RATES
+        wavs = {}
+        for duration in durations:
+            for rate in rates:
+                name = f'{duration}s_{rate}hz'
+                path = os.path.join(workdir, 'audio', f'{name}.wav')
+                data = synth_wav_bytes(duration, rate, seed=duration * rate)
+                with open(path, 'wb') as f:
+                    f.write(data)
+                wavs[name] = (path, data)
+
+        results = {}
+        for name, (path, _) in wavs.items():
+            results[f'extract_features[{name}]'] = measure(lambda p=path: app_module.extract_features(p), iterations)
+
+        features = app_module.extract_features(next(iter(wavs.values()))[0])
+        results['model.predict'] = measure(lambda: voice_model.predict(features), iterations * 5)
+        batch = np.repeat(features, 256, axis=0)
+        results['model.predict[batch=256]'] = measure(lambda: voice_model.predict(batch), iterations)
+
+        results['analyze_scam_behavior'] = measure(
+            lambda: app_module.analyze_scam_behavior(STUB_TRANSCRIPT), iterations * 5)
+
+        results['log_action'] = measure(
+            lambda: log_action('bench.wav', 'Real', STUB_TRANSCRIPT, file_hash='0' * 64), iterations * 5)
+
+        chain = Blockchain()
+        results['Blockchain.create_new_block'] = measure(lambda: chain.create_new_block('REAL', 1), iterations * 5)
+
+        cert = {'filename': 'bench.wav', 'result': 'REAL', 'model_id': 'bench',
+                'timestamp': '2025-01-01 00:00:00', 'file_hash': '0' * 64}
+        results['render_certificate'] = measure(lambda: render_certificate(cert), iterations)
+        results['generate_certificate_image[cached]'] = measure(lambda: generate_certificate_image(cert), iterations * 5)
+
+        client = app_module.app.test_client()
+        for name, (_, data) in wavs.items():
+            def upload(data=data, name=name):
+                response = client.post('/upload', data={'file': (io.BytesIO(data), f'{name}.wav')},
+                                       content_type='multipart/form-data')
+                if response.status_code >= 400:
+                    raise RuntimeError(f'/upload returned {response.status_code}')
+            results[f'end_to_end_upload[{name}]'] = measure(upload, max(3, iterations // 2), warmup=1)
+        return results
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Return a list of (name, baseline_p50, current_p50, ratio) for regressions."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get('p50_ms'):
+            continue
+        ratio = current['p50_ms'] / base['p50_ms']
+        if ratio > 1 + threshold:
+            regressions.append((name, base['p50_ms'], current['p50_ms'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the voice detection pipeline.')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--quick', action='store_true', help='Fewer audio variants, for CI smoke runs')
+    parser.add_argument('--output', default='bench_results.json', help='Where to write machine-readable results')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='Exit with status 1 if any p50 regresses')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.iterations, args.quick)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'iterations': args.iterations,
+        },
+        'results': results,
+    }
+
+    print(f"\n{'benchmark':<45} {'p50 ms':>10} {'p99 ms':>10} {'ops/s':>10}")
+    for name, r in results.items():
+        print(f"{name:<45} {r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['throughput_per_s'] or 0:>10.1f}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to: {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to: {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+            sys.exit(2)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions (p50 more than {args.threshold:.0%} slower than baseline):")
+            for name, base, current, ratio in regressions:
+                print(f"  {name}: {base:.3f} ms -> {current:.3f} ms ({ratio:.2f}x)")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == '__main__':
+    main()
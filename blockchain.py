@@ -1,75 +1,275 @@
 import hashlib
+import sys
 import time
 import sqlite3
+import struct
+
+DB_PATH = 'blockchain.db'
+# Seconds a writer waits for another thread or process to finish appending
+WRITE_TIMEOUT = 30
+
+# prev_hash of the first block
+GENESIS_HASH = bytes(32)
+
+# How a block's hash was computed. Ledgers written before the binary format
+# hashed a string concatenation of the fields: the first releases used the
+# in-memory chain length as index (one less than the stored row id) and the
+# integer confidence, later ones the stored index and a float confidence.
+# All new blocks hash the canonical binary serialization.
+HASH_SCHEME_LEGACY = 1
+HASH_SCHEME_BINARY = 2
+HASH_SCHEME_LEGACY_INDEXED = 3
+LEGACY_HASH_SCHEMES = (HASH_SCHEME_LEGACY, HASH_SCHEME_LEGACY_INDEXED)
+
+BLOCKS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS blocks (
+        block_index INTEGER PRIMARY KEY,
+        timestamp REAL NOT NULL,
+        predicted_label TEXT NOT NULL,
+        confidence REAL NOT NULL,
+        prev_hash BLOB NOT NULL,
+        hash BLOB NOT NULL,
+        model_version_id INTEGER REFERENCES model_versions (id),
+        hash_scheme INTEGER NOT NULL DEFAULT 2
+    )
+'''
+MODEL_VERSIONS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS model_versions (
+        id INTEGER PRIMARY KEY,
+        version TEXT UNIQUE NOT NULL
+    )
+'''
+SELECT_BLOCKS_SQL = '''
+    SELECT b.block_index, b.timestamp, b.predicted_label, b.confidence, b.prev_hash, b.hash,
+           m.version, b.hash_scheme
+    FROM blocks b LEFT JOIN model_versions m ON m.id = b.model_version_id
+'''
+
+# index, timestamp, confidence
+_HEADER = struct.Struct('>Qdd')
+_LENGTH = struct.Struct('>H')
+
+
+def _encode_text(value):
+    data = value.encode('utf-8')
+    return _LENGTH.pack(len(data)) + data
+
+
+def create_tables(conn):
+    conn.execute(MODEL_VERSIONS_TABLE_SQL)
+    conn.execute(BLOCKS_TABLE_SQL)
+
+
+class Block:
+    """One ledger entry; hashes are raw 32-byte SHA-256 digests."""
+
+    __slots__ = ('block_index', 'timestamp', 'predicted_label', 'confidence', 'prev_hash', 'hash',
+                 'model_version', 'hash_scheme')
+
+    def __init__(self, block_index, timestamp, predicted_label, confidence, prev_hash, hash=b'',
+                 model_version='', hash_scheme=HASH_SCHEME_BINARY):
+        self.block_index = block_index
+        self.timestamp = timestamp
+        # Labels and model versions repeat across thousands of blocks; share one copy
+        self.predicted_label = sys.intern(predicted_label)
+        self.confidence = confidence
+        self.prev_hash = prev_hash
+        self.hash = hash
+        self.model_version = sys.intern(model_version) if model_version else ''
+        self.hash_scheme = hash_scheme
+
+    def serialize(self):
+        """Canonical bytes that are hashed: fixed-width numbers, raw prev hash, length-prefixed text."""
+        return (_HEADER.pack(self.block_index, self.timestamp, self.confidence) + self.prev_hash +
+                _encode_text(self.predicted_label) + _encode_text(self.model_version))
+
+    def _legacy_string(self):
+        prev_hash = 'GENESIS' if self.prev_hash == GENESIS_HASH else self.prev_hash.hex()
+        if self.hash_scheme == HASH_SCHEME_LEGACY:
+            # SQLite hands back the original int 1/0 confidence as REAL
+            confidence = self.confidence
+            if float(confidence).is_integer():
+                confidence = int(confidence)
+            block_string = (str(self.block_index - 1) + str(self.timestamp) + self.predicted_label +
+                            str(confidence) + prev_hash)
+        else:
+            block_string = (str(self.block_index) + str(self.timestamp) + self.predicted_label +
+                            str(float(self.confidence)) + prev_hash)
+        # Blocks written before model versions were recorded hash without one
+        if self.model_version:
+            block_string += self.model_version
+        return block_string
+
+    def compute_hash(self):
+        if self.hash_scheme in LEGACY_HASH_SCHEMES:
+            return hashlib.sha256(self._legacy_string().encode('utf-8')).digest()
+        return hashlib.sha256(self.serialize()).digest()
+
+    def to_dict(self):
+        """JSON/template view with hex hashes."""
+        return {
+            'block_index': self.block_index,
+            'timestamp': self.timestamp,
+            'predicted_label': self.predicted_label,
+            'confidence': self.confidence,
+            'prev_hash': 'GENESIS' if self.prev_hash == GENESIS_HASH else self.prev_hash.hex(),
+            'hash': self.hash.hex(),
+            'model_version': self.model_version,
+        }
+
 
 class Blockchain:
-    def __init__(self):
-        self.chain = []
-        self.load_chain_from_db()  # Load existing chain from the database or create genesis block
+    """Append-only ledger stored in SQLite.
+
+    The database is the only copy of the chain. Every append runs in a
+    BEGIN IMMEDIATE transaction, which takes SQLite's write lock before
+    reading the current tip, so concurrent threads and worker processes
+    each link to the block written just before theirs and the block index
+    in the hash is the one stored in the row.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.migrate_db()
+
+    def _connect(self):
+        # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.db_path, timeout=WRITE_TIMEOUT, isolation_level=None)
+
+    def migrate_db(self):
+        """Enable WAL and bring older ledgers to the compact schema."""
+        conn = self._connect()
+        migrated = False
+        try:
+            # WAL lets /blockchain readers run while a block is being appended
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                columns = [col[1] for col in conn.execute('PRAGMA table_info(blocks)')]
+                if columns and 'hash_scheme' not in columns:
+                    self._migrate_text_hashes(conn, columns)
+                    migrated = True
+                create_tables(conn)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            if migrated:
+                # Give the space of the old hex-string table back to the filesystem
+                try:
+                    conn.execute('VACUUM')
+                except sqlite3.OperationalError as e:
+                    print(f"[BLOCKCHAIN] VACUUM after migration skipped: {e}")
+        finally:
+            conn.close()
+
+    def _migrate_text_hashes(self, conn, columns):
+        """Copy a hex-string ledger into the BLOB schema; old rows keep their legacy hashes.
+
+        Each row is tagged with the legacy scheme that reproduces its stored
+        hash. Rows matching neither keep HASH_SCHEME_LEGACY and fail
+        verification, as they did before the migration.
+        """
+        model_column = 'model_version' if 'model_version' in columns else "''"
+        rows = conn.execute(f'SELECT block_index, timestamp, predicted_label, confidence, prev_hash, hash, '
+                            f'{model_column} FROM blocks ORDER BY block_index ASC').fetchall()
+        conn.execute('ALTER TABLE blocks RENAME TO blocks_text')
+        create_tables(conn)
+        for index, timestamp, label, confidence, prev_hash, hash_hex, model_version in rows:
+            prev = GENESIS_HASH if prev_hash in (None, '', 'GENESIS') else bytes.fromhex(prev_hash)
+            stored_hash = bytes.fromhex(hash_hex)
+            block = Block(index, timestamp, label, confidence, prev, stored_hash, model_version or '')
+            for scheme in LEGACY_HASH_SCHEMES:
+                block.hash_scheme = scheme
+                if block.compute_hash() == stored_hash:
+                    break
+            else:
+                block.hash_scheme = HASH_SCHEME_LEGACY
+            conn.execute(
+                'INSERT INTO blocks (block_index, timestamp, predicted_label, confidence, prev_hash, hash, '
+                'model_version_id, hash_scheme) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (index, timestamp, label, confidence, prev, stored_hash,
+                 self._model_version_id(conn, model_version), block.hash_scheme))
+        conn.execute('DROP TABLE blocks_text')
+        print(f"[BLOCKCHAIN] Migrated {len(rows)} blocks to binary hashes")
+
+    @staticmethod
+    def _model_version_id(conn, model_version):
+        if not model_version:
+            return None
+        conn.execute('INSERT OR IGNORE INTO model_versions (version) VALUES (?)', (model_version,))
+        return conn.execute('SELECT id FROM model_versions WHERE version = ?', (model_version,)).fetchone()[0]
 
     def create_genesis_block(self):
-        """Create the first block in the blockchain (genesis block)"""
-        genesis_block = self.create_new_block('GENESIS', 0, 'GENESIS')
-        self.chain.append(genesis_block)
-        self.save_block_to_db(genesis_block)
+        """Create the first block in the blockchain (genesis block) if the chain is empty."""
+        if self.get_last_block() is None:
+            return self.create_new_block('GENESIS', 0)
+        return None
 
-    def create_new_block(self, predicted_label, confidence, prev_hash=''):
+    def create_new_block(self, predicted_label, confidence, model_version=''):
         """
         Function to create a new block and append it to the blockchain.
-        The block stores the prediction label and confidence score.
+        The block stores the prediction label, confidence score and the
+        version of the model that produced the prediction. The previous
+        hash and block index are read inside the write transaction.
         """
-        block = {
-            'block_index': len(self.chain),
-            'timestamp': time.time(),
-            'predicted_label': predicted_label,
-            'confidence': confidence,
-            'prev_hash': prev_hash,
-            'hash': ''
-        }
-
-        block['hash'] = self.calculate_hash(block)
-        self.chain.append(block)
-        self.save_block_to_db(block)
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                tip = conn.execute('SELECT block_index, hash FROM blocks '
+                                   'ORDER BY block_index DESC LIMIT 1').fetchone()
+                block = Block(
+                    block_index=tip[0] + 1 if tip else 1,
+                    timestamp=time.time(),
+                    predicted_label=predicted_label,
+                    confidence=float(confidence),
+                    prev_hash=tip[1] if tip else GENESIS_HASH,
+                    model_version=model_version,
+                )
+                block.hash = self.calculate_hash(block)
+                conn.execute(
+                    'INSERT INTO blocks (block_index, timestamp, predicted_label, confidence, prev_hash, hash, '
+                    'model_version_id, hash_scheme) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (block.block_index, block.timestamp, block.predicted_label, block.confidence,
+                     block.prev_hash, block.hash, self._model_version_id(conn, block.model_version),
+                     block.hash_scheme))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
         return block
 
     def calculate_hash(self, block):
         """
-        Function to calculate the hash of a block. We use the SHA-256 algorithm.
+        Function to calculate the hash of a block. We use the SHA-256 algorithm
+        over the block's canonical binary serialization.
         """
-        block_string = str(block['block_index']) + str(block['timestamp']) + block['predicted_label'] + str(block['confidence']) + block['prev_hash']
-        return hashlib.sha256(block_string.encode('utf-8')).hexdigest()
+        return block.compute_hash()
 
     def get_last_block(self):
         """
         Function to get the last block in the chain.
         """
-        return self.chain[-1] if len(self.chain) > 0 else None
+        conn = self._connect()
+        try:
+            row = conn.execute(SELECT_BLOCKS_SQL + ' ORDER BY b.block_index DESC LIMIT 1').fetchone()
+        finally:
+            conn.close()
+        return Block(*row) if row else None
 
     def load_chain_from_db(self):
-        """Load the blockchain from the database."""
-        conn = sqlite3.connect('blockchain.db')
-        c = conn.cursor()
-        c.execute('SELECT * FROM blocks ORDER BY block_index ASC')  # Updated column name
-        rows = c.fetchall()
-        for row in rows:
-            block = {
-                'block_index': row[0],
-                'timestamp': row[1],
-                'predicted_label': row[2],
-                'confidence': row[3],
-                'prev_hash': row[4],
-                'hash': row[5]
-            }
-            self.chain.append(block)
-        conn.close()
-
-    def save_block_to_db(self, block):
-        """Save the block to the database."""
-        conn = sqlite3.connect('blockchain.db')
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO blocks (timestamp, predicted_label, confidence, prev_hash, hash)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (block['timestamp'], block['predicted_label'], block['confidence'], block['prev_hash'], block['hash']))
-        conn.commit()
-        conn.close()
+        """Load the whole blockchain from the database."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(SELECT_BLOCKS_SQL + ' ORDER BY b.block_index ASC').fetchall()
+        finally:
+            conn.close()
+        return [Block(*row) for row in rows]
+
+    @property
+    def chain(self):
+        """All blocks, read from the database so every worker sees the same chain."""
+        return self.load_chain_from_db()
@@ -0,0 +1,318 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+from functools import lru_cache
+
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+from werkzeug.utils import secure_filename
+
+from metrics import record_cache, stage
+
+CERT_DIR = os.path.join('static', 'certs')
+# Rendered JPEGs keyed by a hash of their content; bounded by file count.
+CERT_CACHE_DIR = os.path.join(CERT_DIR, 'cache')
+CERT_CACHE_MAX_FILES = 500
+# Renders a process adds before it trims the cache back to CERT_CACHE_MAX_FILES,
+# so the directory scan runs once per batch instead of after every miss
+CERT_CACHE_EVICT_EVERY = 50
+
+# Bump when the layout changes so previously cached renders are not reused.
+RENDER_VERSION = '2'
+
+WIDTH, HEIGHT = 1200, 675
+QR_SIZE = 300
+QR_X, QR_Y = WIDTH - QR_SIZE - 80, 150
+LEFT_X, TOP_Y, LINE_H = 50, 120, 36
+FIELDS = [
+    ('File', 'filename'),
+    ('Result', 'result'),
+    ('Model ID', 'model_id'),
+    ('Timestamp', 'timestamp'),
+]
+
+
+@lru_cache(maxsize=None)
+def load_font(name, size):
+    """Load a TrueType font once per process, falling back to PIL's default."""
+    try:
+        return ImageFont.truetype(name, size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=1)
+def certificate_template():
+    """Pre-render everything that is the same on every certificate."""
+    img = Image.new('RGB', (WIDTH, HEIGHT), color='white')
+    draw = ImageDraw.Draw(img)
+    draw.text((40, 30), "Voice Integrity Certificate", font=load_font("DejaVuSans-Bold.ttf", 42), fill=(20, 20, 20))
+    draw.line([(40, 90), (WIDTH - 40, 90)], fill=(200, 200, 200), width=2)
+
+    font_body = load_font("DejaVuSans.ttf", 22)
+    y = TOP_Y
+    for key, _ in FIELDS:
+        draw.text((LEFT_X, y), f"{key}:", font=font_body, fill=(40, 40, 40))
+        y += LINE_H
+
+    draw.text((QR_X, QR_Y + QR_SIZE + 10), "Scan for authenticity",
+              font=load_font("DejaVuSans.ttf", 16), fill=(40, 40, 40))
+    return img
+
+
+def _safe_stem(filename, timestamp_value):
+    safe_name = os.path.splitext(secure_filename(filename))[0]
+    safe_timestamp = str(timestamp_value).replace(":", "").replace(" ", "").replace("-", "")
+    return f"{safe_name}_{safe_timestamp}"
+
+
+def _qr_code(certificate_data):
+    qr_payload = json.dumps(certificate_data, separators=(",", ":"))
+    qr = qrcode.QRCode(
+        version=2,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=6,
+        border=2
+    )
+    qr.add_data(qr_payload)
+    qr.make(fit=True)
+    return qr
+
+
+def make_qr_image(certificate_data, size=QR_SIZE):
+    """Render the QR code directly at (at most) size x size, without resampling.
+
+    The module size is picked so the code fills the square as closely as
+    possible; any remainder is white padding around a centred code.
+    """
+    qr = _qr_code(certificate_data)
+    qr.box_size = max(1, size // (qr.modules_count + 2 * qr.border))
+    code = qr.make_image(fill_color="black", back_color="white").convert("RGB")
+    if code.size == (size, size):
+        return code
+    if code.size[0] > size:
+        return code.resize((size, size), Image.NEAREST)
+    canvas = Image.new('RGB', (size, size), color='white')
+    offset = (size - code.size[0]) // 2
+    canvas.paste(code, (offset, offset))
+    return canvas
+
+
+def generate_certificate_qr(certificate_data, filename, timestamp_value):
+    """Write the certificate QR code PNG under static/certs (used by the HTML view)."""
+    os.makedirs(CERT_DIR, exist_ok=True)
+    qr_path = os.path.join(CERT_DIR, f"cert_{_safe_stem(filename, timestamp_value)}.png")
+    try:
+        # Mark as recently used for maintenance's LRU eviction
+        os.utime(qr_path)
+    except FileNotFoundError:
+        img = _qr_code(certificate_data).make_image(fill_color="black", back_color="white").convert("RGB")
+        img.save(qr_path)
+    return qr_path
+
+
+def certificate_cache_key(certificate_data):
+    """Content hash of a certificate; also used as its HTTP ETag."""
+    payload = json.dumps(certificate_data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{RENDER_VERSION}:{payload}".encode('utf-8')).hexdigest()
+
+
+def render_certificate(certificate_data):
+    """Render a certificate and return the JPEG bytes."""
+    img = certificate_template().copy()
+    draw = ImageDraw.Draw(img)
+    font_body = load_font("DejaVuSans.ttf", 22)
+
+    y = TOP_Y
+    for _, field in FIELDS:
+        draw.text((LEFT_X + 260, y), str(certificate_data.get(field)), font=font_body, fill=(0, 0, 0))
+        y += LINE_H
+
+    img.paste(make_qr_image(certificate_data), (QR_X, QR_Y))
+
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+_cache_lock = threading.Lock()
+_renders_since_evict = 0
+
+
+def evict_certificate_cache(cache_dir=CERT_CACHE_DIR, max_files=CERT_CACHE_MAX_FILES):
+    """Remove the least recently used renders beyond max_files. Returns the count removed."""
+    if not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.jpg'):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            continue
+    excess = len(entries) - max_files
+    removed = 0
+    for _, path in sorted(entries)[:max(excess, 0)]:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _render_to_cache(certificate_data, cert_path):
+    """Render a certificate, store it under cert_path and return the JPEG bytes."""
+    with stage('certificate_render'):
+        data = render_certificate(certificate_data)
+    tmp_path = f"{cert_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, cert_path)
+
+    global _renders_since_evict
+    with _cache_lock:
+        _renders_since_evict += 1
+        if _renders_since_evict >= CERT_CACHE_EVICT_EVERY:
+            _renders_since_evict = 0
+            evict_certificate_cache()
+    return data
+
+
+def generate_certificate_image(certificate_data, filename=None, timestamp_value=None):
+    """Return the path of the rendered certificate JPEG, rendering it on a cache miss.
+
+    filename and timestamp_value are accepted for backward compatibility; the
+    cache is keyed only by the certificate contents.
+    """
+    os.makedirs(CERT_CACHE_DIR, exist_ok=True)
+    key = certificate_cache_key(certificate_data)
+    cert_path = os.path.join(CERT_CACHE_DIR, f"{key}.jpg")
+    try:
+        # Mark as recently used; a file evicted meanwhile is simply a miss
+        os.utime(cert_path)
+        record_cache('certificate', True)
+        return cert_path
+    except FileNotFoundError:
+        pass
+
+    record_cache('certificate', False)
+    _render_to_cache(certificate_data, cert_path)
+    return cert_path
+
+
+def certificate_jpeg(certificate_data):
+    """JPEG bytes of a certificate, read from the render cache or rendered into it.
+
+    Bulk exports stream these bytes instead of cache paths, so eviction can
+    never remove a file between rendering it and writing it out.
+    """
+    os.makedirs(CERT_CACHE_DIR, exist_ok=True)
+    cert_path = os.path.join(CERT_CACHE_DIR, f"{certificate_cache_key(certificate_data)}.jpg")
+    try:
+        with open(cert_path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        record_cache('certificate', False)
+        return _render_to_cache(certificate_data, cert_path)
+    try:
+        os.utime(cert_path)
+    except FileNotFoundError:
+        pass
+    record_cache('certificate', True)
+    return data
+
+
+class _StreamBuffer:
+    """Write-only file object that hands out whatever was written since the last drain.
+
+    zipfile falls back to data descriptors when the target cannot seek, so
+    an archive can be produced entry by entry without holding it in memory.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_certificate_zip(entries):
+    """Yield a ZIP archive chunk by chunk from (arcname, jpeg_bytes) pairs."""
+    buf = _StreamBuffer()
+    # JPEGs are already compressed, so store them as-is
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for arcname, jpeg in entries:
+            with archive.open(arcname, 'w') as dst:
+                dst.write(jpeg)
+            chunk = buf.drain()
+            if chunk:
+                yield chunk
+    yield buf.drain()
+
+
+def stream_certificate_pdf(jpegs, page_width=720, page_height=405):
+    """Yield a multi-page PDF, one certificate JPEG (bytes) per page, chunk by chunk.
+
+    The JPEG bytes are embedded as-is (DCTDecode), so pages are never
+    decoded or re-encoded. Object 2 (the page tree) is written last, once
+    the number of pages is known.
+    """
+    offsets = {}
+    position = 0
+    page_ids = []
+
+    def emit(obj_id, body):
+        nonlocal position
+        offsets[obj_id] = position
+        data = f"{obj_id} 0 obj\n".encode('ascii') + body + b"\nendobj\n"
+        position += len(data)
+        return data
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header)
+    yield header
+    yield emit(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    next_id = 3
+    for jpeg in jpegs:
+        with Image.open(io.BytesIO(jpeg)) as probe:
+            img_w, img_h = probe.size
+        image_id, content_id, page_id = next_id, next_id + 1, next_id + 2
+        next_id += 3
+
+        yield emit(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {img_w} /Height {img_h} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>\nstream\n"
+        ).encode('ascii') + jpeg + b"\nendstream")
+        content = f"q {page_width} 0 0 {page_height} 0 0 cm /Im0 Do Q".encode('ascii')
+        yield emit(content_id, f"<< /Length {len(content)} >>\nstream\n".encode('ascii') + content + b"\nendstream")
+        yield emit(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width} {page_height}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode('ascii'))
+        page_ids.append(page_id)
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    yield emit(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode('ascii'))
+
+    size = next_id
+    xref = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+    for obj_id in range(1, size):
+        xref.append(f"{offsets.get(obj_id, 0):010d} 00000 n \n")
+    xref.append(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{position}\n%%EOF\n")
+    yield "".join(xref).encode('ascii')
@@ -0,0 +1,152 @@
+import argparse
+import copy
+import os
+import pickle
+import time
+from typing import List, Optional
+
+import joblib
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+from model_registry import save_model
+from train_voice_detector import DATA_DIR, MODEL_DIR, load_dataset
+
+
+SOURCE_MODEL_PATH = os.path.join(MODEL_DIR, "voice_detector.pkl")
+COMPACT_MODEL_PATH = os.path.join(MODEL_DIR, "voice_detector_compact.pkl")
+
+P99_BUDGET_MS = 5.0  # per single-row predict, as called from app.py
+MAX_ACCURACY_DROP = 0.01  # allowed drop vs. the original on the held-out split
+
+TREE_COUNTS = (10, 25, 50, 100)
+DEPTHS = (6, 10, 14)
+AUGMENT_COPIES = 4  # jittered copies of the training rows labelled by the teacher
+
+
+def predict_latency_ms(model, X: np.ndarray, n_calls: int = 300) -> dict:
+    """p50/p99 latency of single-row predict calls, the way the app scores uploads."""
+    rows = X[np.arange(n_calls) % len(X)]
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        model.predict(row.reshape(1, -1))
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return {"p50_ms": float(np.percentile(timings, 50)), "p99_ms": float(np.percentile(timings, 99))}
+
+
+def model_size_kb(model) -> float:
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1024.0
+
+
+def subset_forest(forest: RandomForestClassifier, n_trees: int) -> RandomForestClassifier:
+    """Keep the first n_trees fitted trees of a forest; no retraining."""
+    small = copy.copy(forest)
+    small.estimators_ = forest.estimators_[:n_trees]
+    small.n_estimators = len(small.estimators_)
+    small.n_jobs = 1  # thread fan-out costs more than it saves on one row
+    return small
+
+
+def distillation_set(teacher, X: np.ndarray, copies: int = AUGMENT_COPIES, random_state: int = 42):
+    """Training rows plus jittered copies, all labelled by the teacher's predictions."""
+    rng = np.random.default_rng(random_state)
+    scale = X.std(axis=0, keepdims=True) * 0.05
+    X_aug = [X] + [X + rng.normal(size=X.shape) * scale for _ in range(copies)]
+    X_aug = np.vstack(X_aug)
+    return X_aug, teacher.predict(X_aug)
+
+
+def build_candidates(teacher, X_train: np.ndarray) -> List[tuple]:
+    """(name, fitted model) pairs: pruned subsets and distilled students."""
+    candidates = []
+    n_teacher = len(getattr(teacher, "estimators_", []))
+    for n_trees in TREE_COUNTS:
+        if 0 < n_trees < n_teacher:
+            candidates.append((f"subset(trees={n_trees})", subset_forest(teacher, n_trees)))
+
+    X_distill, y_distill = distillation_set(teacher, X_train)
+    for n_trees in TREE_COUNTS:
+        for depth in DEPTHS:
+            student = RandomForestClassifier(
+                n_estimators=n_trees,
+                max_depth=depth,
+                random_state=42,
+                n_jobs=1,
+            )
+            student.fit(X_distill, y_distill)
+            candidates.append((f"distilled_rf(trees={n_trees}, depth={depth})", student))
+
+    for depth in (3, 6):
+        gbm = HistGradientBoostingClassifier(max_depth=depth, max_iter=100, random_state=42)
+        gbm.fit(X_distill, y_distill)
+        candidates.append((f"distilled_gbm(depth={depth})", gbm))
+    return candidates
+
+
+def evaluate(name, model, teacher_pred, X_test, y_test) -> dict:
+    result = {
+        "name": name,
+        "model": model,
+        "test_accuracy": accuracy_score(y_test, model.predict(X_test)),
+        "agreement": float(np.mean(model.predict(X_test) == teacher_pred)),
+        "size_kb": model_size_kb(model),
+    }
+    result.update(predict_latency_ms(model, X_test))
+    return result
+
+
+def compress(source_path: str = SOURCE_MODEL_PATH, output_path: str = COMPACT_MODEL_PATH,
+             p99_budget_ms: float = P99_BUDGET_MS, max_drop: float = MAX_ACCURACY_DROP) -> Optional[dict]:
+    """Pick the smallest candidate that meets the latency budget and accuracy tolerance."""
+    teacher = joblib.load(source_path)
+    print(f"Loaded original model from: {source_path}")
+
+    X, y = load_dataset(DATA_DIR)
+    stratify = y if len(np.unique(y)) > 1 else None
+    # Same held-out test split as train_voice_detector.train_and_evaluate
+    # (so a forest trained by that script has not seen these rows)
+    X_train, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=stratify)
+
+    teacher_pred = teacher.predict(X_test)
+    baseline = evaluate("original", teacher, teacher_pred, X_test, y_test)
+    results = [evaluate(name, model, teacher_pred, X_test, y_test)
+               for name, model in build_candidates(teacher, X_train)]
+
+    print(f"\n{'candidate':<38} {'test acc':>9} {'delta':>8} {'agree':>7} {'p50 ms':>8} {'p99 ms':>8} {'size KB':>9}")
+    for r in [baseline] + results:
+        delta = r["test_accuracy"] - baseline["test_accuracy"]
+        print(f"{r['name']:<38} {r['test_accuracy']:>9.4f} {delta:>+8.4f} {r['agreement']:>7.3f} "
+              f"{r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['size_kb']:>9.1f}")
+
+    eligible = [
+        r for r in results
+        if r["p99_ms"] <= p99_budget_ms and baseline["test_accuracy"] - r["test_accuracy"] <= max_drop
+    ]
+    if not eligible:
+        print(f"\nNo candidate meets p99 <= {p99_budget_ms} ms with accuracy drop <= {max_drop:.3f}; nothing saved.")
+        return None
+
+    best = min(eligible, key=lambda r: (r["size_kb"], r["p99_ms"]))
+    delta = best["test_accuracy"] - baseline["test_accuracy"]
+    print(f"\nSelected: {best['name']} (test accuracy delta {delta:+.4f}, "
+          f"p99 {best['p99_ms']:.3f} ms, {best['size_kb']:.1f} KB vs {baseline['size_kb']:.1f} KB)")
+
+    save_model(best["model"], output_path, compress=3,
+               metrics={"accuracy": float(best["test_accuracy"]), "p99_ms": best["p99_ms"]},
+               compressed_from=source_path, candidate=best["name"])
+    print(f"Saved compact model to: {output_path}")
+    print(f"Serve it with: VOICE_MODEL_PATH={output_path} python3 app.py")
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune or distill the voice RandomForest to a latency budget.")
+    parser.add_argument("--source", default=SOURCE_MODEL_PATH)
+    parser.add_argument("--output", default=COMPACT_MODEL_PATH)
+    parser.add_argument("--p99-ms", type=float, default=P99_BUDGET_MS, help="Per-row p99 predict budget in ms")
+    parser.add_argument("--max-drop", type=float, default=MAX_ACCURACY_DROP, help="Allowed held-out accuracy drop")
+    args = parser.parse_args()
+    compress(args.source, args.output, args.p99_ms, args.max_drop)
@@ -0,0 +1,88 @@
+"""Process-pool entry points for the ASGI mode (asgi.py).
+
+The pool is started with the spawn method, so workers import only this
+module and the numeric pipeline, never app.py: no ledger, log, registry
+threads or Flask app are duplicated into them. Each worker loads the voice
+model once through its own ModelRegistry and catches up when the parent
+has pinned a newer version.
+"""
+
+from audio_io import decode_audio
+from detection import MAX_AUDIO_SECONDS, detect_voice, encode_flac
+from fingerprint import FingerprintIndex, fingerprint
+from metrics import capture_stages, stage
+from model_registry import ModelRegistry
+from vad import voice_activity
+
+_registries = {}
+_indexes = {}
+
+
+def _voice_version(model_path, version_id):
+    registry = _registries.get(model_path)
+    if registry is None:
+        registry = _registries[model_path] = ModelRegistry('voice_detector', model_path)
+    version = registry.current()
+    if version is None or version.version_id != version_id:
+        # The parent already serves a newer artifact; load it before scoring
+        registry.reload()
+        version = registry.current()
+    return version
+
+
+def analyze_upload(filepath, filename, model_path, version_id, fingerprint_db=None,
+                   frame_scoring=True, speaker_segmentation=True):
+    """Decode, fingerprint-match and score one upload.
+
+    Returns a dict with the voice model version used and 'match', a
+    reusable fingerprint track or None. Without a match it also holds the
+    detect_voice results, the speech as FLAC bytes to transcribe (None when
+    there is no speech) and the fingerprint (hashes, offsets) to index.
+    'stages' lists the (stage, seconds) timings for the parent to record.
+    Raises AudioDecodeError for undecodable files.
+    """
+    with capture_stages() as timings:
+        result = _analyze(filepath, model_path, version_id, fingerprint_db, frame_scoring, speaker_segmentation)
+    result['stages'] = timings
+    return result
+
+
+def _analyze(filepath, model_path, version_id, fingerprint_db, frame_scoring, speaker_segmentation):
+    version = _voice_version(model_path, version_id)
+    with stage('decode'):
+        y, sr_rate = decode_audio(filepath, duration=MAX_AUDIO_SECONDS)
+    result = {'model_version': version.version_id, 'match': None, 'fingerprint': None}
+
+    # Re-encoded or trimmed copies of known audio match on fingerprints of their speech
+    activity = None
+    if fingerprint_db is not None:
+        index = _indexes.get(fingerprint_db)
+        if index is None:
+            index = _indexes[fingerprint_db] = FingerprintIndex(fingerprint_db)
+        with stage('vad'):
+            activity = voice_activity(y, sr_rate)
+        with stage('fingerprint'):
+            hashes, offsets = fingerprint(y, sr_rate, activity[0])
+            result['match'] = index.match(hashes, offsets, version.version_id)
+        if result['match'] is not None:
+            return result
+        result['fingerprint'] = (hashes, offsets)
+
+    detected = detect_voice(y, sr_rate, version.model, frame_scoring, speaker_segmentation, activity)
+    speech = detected.pop('speech')
+    result.update(detected)
+    with stage('encode_flac'):
+        result['flac'] = encode_flac(speech, sr_rate) if speech.size else None
+    result['sample_rate'] = sr_rate
+    return result
+
+
+def synthesize(text, rate, volume, voice):
+    """tts_service.synthesize_cached in a worker; pyttsx3 is only imported where it runs.
+
+    Returns (filename, filepath, cache_hit, stage timings).
+    """
+    from tts_service import synthesize_cached
+    with capture_stages() as timings:
+        filename, filepath, cache_hit = synthesize_cached(text, rate=rate, volume=volume, voice=voice)
+    return filename, filepath, cache_hit, timings
@@ -1,21 +1,13 @@
 import sqlite3
 
+from blockchain import create_tables
+
 def create_blockchain_db():
     # Connect to SQLite database (it will create if doesn't exist)
     conn = sqlite3.connect('blockchain.db')
-    c = conn.cursor()
 
-    # Create table if not exists
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS blocks (
-            block_index INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp REAL,
-            predicted_label TEXT,
-            confidence REAL,
-            prev_hash TEXT,
-            hash TEXT
-        )
-    ''')
+    # Create tables if not exists (blocks with 32-byte BLOB hashes, model version lookup)
+    create_tables(conn)
 
     # Commit and close
     conn.commit()
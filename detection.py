@@ -0,0 +1,79 @@
+"""CPU-bound part of the upload pipeline, shared by the Flask and ASGI paths.
+
+detect_voice does everything that is pure computation on decoded audio:
+VAD, the file-level verdict, the sliding-window timeline and speaker
+turns. It touches no network, log or ledger, so the ASGI mode can run it
+in worker processes and await the I/O stages separately.
+"""
+
+import io
+import time
+
+import soundfile as sf
+
+from diarization import segment_speakers
+from features import compute_features, frame_features, score_timeline
+from metrics import stage
+from vad import trim_silence, voice_activity
+
+# Features use the first FEATURE_SECONDS of speech; transcription gets up to MAX_AUDIO_SECONDS
+FEATURE_SECONDS = 10
+MAX_AUDIO_SECONDS = 300
+
+
+def detect_voice(y, sr_rate, model, frame_scoring=True, speaker_segmentation=True, activity=None):
+    """Verdict, timeline and speakers for decoded audio.
+
+    activity may pass vad.voice_activity(y, sr_rate) when it was already
+    computed, e.g. by the fingerprint step; VAD runs once per upload.
+
+    Returns a dict with label, pred (0 = Real, 1 = Fake), the feature
+    vector and predict latency (for shadow scoring), the speech-only
+    samples to transcribe (empty when VAD found none), speakers and
+    timeline.
+    """
+    # Drop silence / hold gaps; all-silent files keep the raw audio for the verdict
+    with stage('vad'):
+        if activity is None:
+            activity = voice_activity(y, sr_rate)
+        speech_segments, active, hop = activity
+        speech, _ = trim_silence(y, sr_rate, speech_segments)
+    has_speech = speech.size > 0
+    with stage('features'):
+        features = compute_features((speech if has_speech else y)[:FEATURE_SECONDS * sr_rate], sr_rate)
+    predict_start = time.perf_counter()
+    with stage('predict'):
+        pred = model.predict(features)[0]
+    predict_ms = (time.perf_counter() - predict_start) * 1000.0
+
+    # Both use one per-frame feature matrix of the whole recording
+    speakers = timeline = None
+    if frame_scoring or (speaker_segmentation and has_speech):
+        with stage('frames'):
+            frames = frame_features(y, sr_rate)
+        # Fake probability over time, every window in one predict_proba call
+        if frame_scoring:
+            with stage('timeline'):
+                timeline = score_timeline(frames, sr_rate, model, speech_segments)
+        # Per-speaker verdicts: cluster speech windows into turns, score all turns in one batch
+        if speaker_segmentation and has_speech:
+            with stage('segment'):
+                speakers = segment_speakers(y, sr_rate, speech_segments, model, frames=frames,
+                                            activity=(active, hop))
+
+    return {
+        'label': 'Real' if pred == 0 else 'Fake',
+        'pred': pred,
+        'features': features,
+        'predict_ms': predict_ms,
+        'speech': speech,
+        'speakers': speakers,
+        'timeline': timeline,
+    }
+
+
+def encode_flac(y, sr_rate):
+    """16-bit FLAC bytes of float samples, the format Google's recognizer is sent."""
+    buf = io.BytesIO()
+    sf.write(buf, y, sr_rate, format='FLAC', subtype='PCM_16')
+    return buf.getvalue()
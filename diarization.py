@@ -0,0 +1,180 @@
+"""Speaker segmentation and per-speaker Real/Fake verdicts.
+
+Speech windows (1.5 s, 0.75 s hop) are embedded as the mean and standard
+deviation of their MFCCs over the frames VAD marks as voiced, taken from
+the same frame matrix the detector features come from, and grouped by
+average-linkage agglomerative clustering on Euclidean distance. Pauses
+and the VAD hangover around them never enter an embedding, and windows
+with too little voiced speech take the speaker of their neighbour. Consecutive windows of one cluster form a
+turn; every turn is then scored by the voice detector in a single
+batched call.
+"""
+
+import numpy as np
+from sklearn.cluster import AgglomerativeClustering
+
+from features import HOP_LENGTH, fake_probabilities, frame_features, range_means, samples_to_frame
+from vad import speech_frames
+
+WINDOW_S = 1.5
+HOP_S = 0.75
+MAX_SPEAKERS = 4
+# Embedding distance (MFCC units) at which clusters stop merging. Embeddings are
+# not standardized per file, so one steady voice stays one cluster.
+CLUSTER_DISTANCE = 25.0
+# Turns shorter than this are folded into the preceding speaker
+MIN_TURN_S = 1.0
+FAKE_THRESHOLD = 0.5
+# Windows with less voiced (non-hangover) speech than this are not clustered
+# and join the neighbouring speaker instead
+MIN_VOICED_S = 0.5
+
+
+def speech_windows(n_samples, sr, segments):
+    """(start, end) sample ranges of analysis windows centred in speech."""
+    window, hop = int(WINDOW_S * sr), int(HOP_S * sr)
+    windows = []
+    for seg_start, seg_end in segments:
+        if seg_end - seg_start <= window:
+            windows.append((seg_start, seg_end))
+            continue
+        starts = np.arange(seg_start, seg_end - window + 1, hop)
+        windows.extend((int(s), int(s) + window) for s in starts)
+        if windows[-1][1] < seg_end:
+            windows.append((seg_end - window, seg_end))
+    return windows
+
+
+def voiced_frames(active, hop, n_frames):
+    """VAD decision (1.0 / 0.0) for each feature frame, without the segments' hangover padding.
+
+    active and hop are vad.speech_frames output.
+    """
+    index = np.minimum(np.arange(n_frames) * HOP_LENGTH // hop, len(active) - 1)
+    return active[index].astype(np.float64)[:, None]
+
+
+def window_embeddings(frames, windows, voiced):
+    """Mean and std of MFCC 1-11 (c0 is loudness, not identity) over each window's voiced frames.
+
+    Returns (embeddings, voiced frame count per window).
+    """
+    starts = samples_to_frame([start for start, _ in windows])
+    ends = samples_to_frame([end for _, end in windows])
+    mfcc = frames[:, 1:12]
+    # Means over voiced frames only: sum(x * v) / sum(v), from plain range means
+    share = range_means(voiced, starts, ends)
+    cumsum = np.concatenate(([0.0], np.cumsum(voiced[:, 0])))
+    first = np.clip(starts, 0, len(frames) - 1)
+    counts = cumsum[np.clip(ends, first + 1, len(frames))] - cumsum[first]
+    share = np.maximum(share, 1e-9)
+    mean = range_means(mfcc * voiced, starts, ends) / share
+    var = np.maximum(range_means(mfcc ** 2 * voiced, starts, ends) / share - mean ** 2, 0.0)
+    return np.hstack([mean, np.sqrt(var)]), counts
+
+
+def cluster_speakers(embeddings):
+    """Cluster label per embedding (at most MAX_SPEAKERS distinct labels)."""
+    if len(embeddings) < 2:
+        return np.zeros(len(embeddings), dtype=int)
+    labels = AgglomerativeClustering(n_clusters=None, linkage='average',
+                                     distance_threshold=CLUSTER_DISTANCE).fit_predict(embeddings)
+    if labels.max() + 1 > MAX_SPEAKERS:
+        labels = AgglomerativeClustering(n_clusters=MAX_SPEAKERS, linkage='average').fit_predict(embeddings)
+    return labels
+
+
+def assign_labels(embeddings, usable):
+    """Cluster the usable windows; every other window joins the nearest usable one before it (or after)."""
+    labels = np.zeros(len(embeddings), dtype=int)
+    kept = np.flatnonzero(usable)
+    if not len(kept):
+        return labels
+    labels[kept] = cluster_speakers(embeddings[kept])
+    # Index of the usable window each window inherits its label from
+    source = np.searchsorted(kept, np.arange(len(embeddings)), side='right') - 1
+    labels = labels[kept[np.maximum(source, 0)]]
+    return labels
+
+
+def speaker_turns(windows, labels, sr):
+    """Merge consecutive same-speaker windows into [(speaker, start, end)]."""
+    turns = []
+    for (start, end), label in zip(windows, labels):
+        if turns and turns[-1][0] == label and start <= turns[-1][2]:
+            turns[-1][2] = max(turns[-1][2], end)
+        elif turns and start < turns[-1][2]:
+            # Overlapping windows of different speakers: split the overlap
+            boundary = (start + turns[-1][2]) // 2
+            turns[-1][2] = boundary
+            turns.append([label, boundary, end])
+        else:
+            turns.append([label, start, end])
+
+    min_len = int(MIN_TURN_S * sr)
+    merged = []
+    for turn in turns:
+        if merged and (turn[2] - turn[1] < min_len or turn[0] == merged[-1][0]) and turn[1] <= merged[-1][2]:
+            merged[-1][2] = turn[2]
+        else:
+            merged.append(turn)
+    return [(int(label), start, end) for label, start, end in merged]
+
+
+def segment_speakers(y, sr, segments, model, frames=None, activity=None):
+    """Per-segment and per-speaker verdicts for the speech regions of y.
+
+    segments are VAD speech ranges in samples; frames may pass a
+    precomputed frame_features(y, sr) matrix and activity the
+    (decisions, hop) of vad.speech_frames(y, sr). Times are in seconds.
+    """
+    windows = speech_windows(len(y), sr, segments)
+    if not windows:
+        return {'speakers': [], 'segments': []}
+    if frames is None:
+        frames = frame_features(y, sr)
+
+    if activity is None:
+        activity = speech_frames(y, sr)
+
+    embeddings, counts = window_embeddings(frames, windows, voiced_frames(*activity, len(frames)))
+    labels = assign_labels(embeddings, counts >= MIN_VOICED_S * sr / HOP_LENGTH)
+    turns = speaker_turns(windows, labels, sr)
+
+    # One batched predict for every turn
+    X = range_means(frames, samples_to_frame([t[1] for t in turns]), samples_to_frame([t[2] for t in turns]))
+    probs = fake_probabilities(model, X)
+
+    # Name speakers S1, S2, ... in order of first appearance
+    names = {}
+    for label, _, _ in turns:
+        names.setdefault(label, f'S{len(names) + 1}')
+
+    result_segments = []
+    per_speaker = {}
+    for (label, start, end), prob in zip(turns, probs):
+        speaker = names[label]
+        duration = (end - start) / sr
+        result_segments.append({
+            'speaker': speaker,
+            'start': round(start / sr, 2),
+            'end': round(end / sr, 2),
+            'fake_probability': round(float(prob), 4),
+            'verdict': 'Fake' if prob >= FAKE_THRESHOLD else 'Real',
+        })
+        stats = per_speaker.setdefault(speaker, [0.0, 0.0, []])
+        stats[0] += duration
+        stats[1] += duration * float(prob)
+        stats[2].append([round(start / sr, 2), round(end / sr, 2)])
+
+    speakers = []
+    for speaker, (seconds, weighted, ranges) in per_speaker.items():
+        prob = weighted / seconds if seconds else 0.0
+        speakers.append({
+            'speaker': speaker,
+            'verdict': 'Fake' if prob >= FAKE_THRESHOLD else 'Real',
+            'fake_probability': round(prob, 4),
+            'speech_seconds': round(seconds, 2),
+            'ranges': ranges,
+        })
+    return {'speakers': speakers, 'segments': result_segments}
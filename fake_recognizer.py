@@ -0,0 +1,36 @@
+import asyncio
+import os
+import random
+import time
+
+import speech_recognition as sr
+
+FAKE_TRANSCRIPT = "hello this is a test call from the bank please confirm your account details"
+
+
+class FakeRecognizer(sr.Recognizer):
+    """Local stand-in for Google speech recognition, for load tests.
+
+    Audio takes the production path (decoded once by audio_io, VAD-trimmed,
+    handed over as sr.AudioData or, in the ASGI mode, FLAC bytes); only the
+    network call is replaced by a sleep of configurable latency (with
+    jitter) and a fixed transcript.
+    """
+
+    def __init__(self, latency_ms=None, jitter_ms=None, transcript=None):
+        super().__init__()
+        self.latency_ms = float(latency_ms if latency_ms is not None else os.environ.get('FAKE_TRANSCRIBE_LATENCY_MS', 300))
+        self.jitter_ms = float(jitter_ms if jitter_ms is not None else os.environ.get('FAKE_TRANSCRIBE_JITTER_MS', 50))
+        self.transcript = transcript or os.environ.get('FAKE_TRANSCRIPT', FAKE_TRANSCRIPT)
+
+    def _delay_s(self):
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+    def recognize_google(self, audio_data, *args, **kwargs):
+        time.sleep(self._delay_s())
+        return self.transcript
+
+    async def recognize_google_async(self, flac_data, sample_rate):
+        """Awaitable variant used by the ASGI mode; holds no thread while waiting."""
+        await asyncio.sleep(self._delay_s())
+        return self.transcript
@@ -0,0 +1,97 @@
+"""Voice-detector features at file, segment and window level.
+
+All of them share one frame matrix: per-frame 12 MFCCs + spectral centroid,
+rolloff (both /1000) and zero-crossing rate, with librosa's default
+framing (n_fft 2048, hop 512, centered). Averaging the whole matrix gives
+exactly the (1, 15) vector the model was trained on; averaging row ranges
+gives the same vector for any slice of the file without re-running the
+STFT, via a cumulative sum. score_timeline uses that to score every
+sliding window of a file in one batched predict_proba call.
+"""
+
+import librosa
+import numpy as np
+
+N_FFT = 2048
+HOP_LENGTH = 512
+N_FEATURES = 15
+# Sliding windows for the fake-probability timeline
+TIMELINE_WINDOW_S = 2.0
+TIMELINE_HOP_S = 0.5
+
+
+def frame_features(y, sr):
+    """Per-frame feature matrix, shape (n_frames, 15).
+
+    One magnitude STFT feeds the MFCCs (via its power mel spectrogram), the
+    centroid and the rolloff; the values equal librosa's per-feature calls.
+    """
+    S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    mel = librosa.feature.melspectrogram(S=S ** 2, sr=sr)
+    mfcc = librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=13)[:12]
+    spectral_centroid = librosa.feature.spectral_centroid(S=S, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH) / 1000
+    spectral_rolloff = librosa.feature.spectral_rolloff(S=S, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH) / 1000
+    zero_crossing_rate = librosa.feature.zero_crossing_rate(y)
+    return np.vstack([mfcc, spectral_centroid, spectral_rolloff, zero_crossing_rate]).T
+
+
+def compute_features(y, sr):
+    """12 MFCCs + 3 spectral features from decoded audio, shape (1,15)."""
+    return frame_features(y, sr).mean(axis=0).reshape(1, -1)
+
+
+def range_means(frames, starts, ends):
+    """Mean of frames[s:e] for every (s, e) pair at once, shape (len(starts), 15)."""
+    n = len(frames)
+    starts = np.clip(np.asarray(starts, dtype=np.int64), 0, n - 1)
+    ends = np.clip(np.asarray(ends, dtype=np.int64), starts + 1, n)
+    cumsum = np.vstack([np.zeros((1, frames.shape[1])), np.cumsum(frames, axis=0, dtype=np.float64)])
+    return (cumsum[ends] - cumsum[starts]) / (ends - starts)[:, None]
+
+
+def samples_to_frame(samples):
+    """Index of the centered frame nearest to a sample offset."""
+    return (np.asarray(samples) + HOP_LENGTH // 2) // HOP_LENGTH
+
+
+def fake_probabilities(model, X):
+    """P(fake) per row in one batched call (label 1 = Fake)."""
+    if hasattr(model, 'predict_proba'):
+        classes = list(model.classes_)
+        if 1 in classes:
+            return model.predict_proba(X)[:, classes.index(1)]
+    return (np.asarray(model.predict(X)) == 1).astype(float)
+
+
+def window_bounds(n_frames, sr, window_s=TIMELINE_WINDOW_S, hop_s=TIMELINE_HOP_S):
+    """Frame (starts, ends) of sliding windows covering the whole matrix."""
+    window = max(1, int(round(window_s * sr / HOP_LENGTH)))
+    hop = max(1, int(round(hop_s * sr / HOP_LENGTH)))
+    starts = np.arange(0, max(n_frames - window, 0) + 1, hop)
+    if starts[-1] + window < n_frames:
+        starts = np.append(starts, n_frames - window)
+    return starts, np.minimum(starts + window, n_frames)
+
+
+def score_timeline(frames, sr, model, speech_segments=None,
+                   window_s=TIMELINE_WINDOW_S, hop_s=TIMELINE_HOP_S):
+    """Fake probability for every sliding window, scored in one batch.
+
+    With VAD speech_segments (sample ranges), each window is also flagged
+    as speech when at least half of its frames fall inside speech.
+    """
+    starts, ends = window_bounds(len(frames), sr, window_s, hop_s)
+    probs = fake_probabilities(model, range_means(frames, starts, ends))
+    timeline = {
+        'window_s': window_s,
+        'hop_s': hop_s,
+        'start': np.round(starts * HOP_LENGTH / sr, 2).tolist(),
+        'end': np.round(ends * HOP_LENGTH / sr, 2).tolist(),
+        'fake_probability': np.round(probs, 3).tolist(),
+    }
+    if speech_segments is not None:
+        mask = np.zeros((len(frames), 1))
+        for seg_start, seg_end in speech_segments:
+            mask[samples_to_frame(seg_start):samples_to_frame(seg_end)] = 1.0
+        timeline['speech'] = (range_means(mask, starts, ends)[:, 0] >= 0.5).tolist()
+    return timeline
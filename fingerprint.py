@@ -0,0 +1,242 @@
+"""Acoustic fingerprints for recognising re-uploaded audio.
+
+Fingerprints are constellation hashes: prominent spectrogram peaks are
+paired with a few later peaks and each pair is packed into one integer
+(anchor bin, target bin, frame gap). Re-encoding, resampling and
+trimming keep most peaks, so copies of one recording share many hashes at
+a constant time offset. Only peaks inside VAD speech regions are hashed,
+so silence and background noise shared by unrelated recordings cannot
+make them match.
+
+The index is an SQLite inverted index (hash -> track, offset) with a
+B-tree on the hash column, so a lookup touches only the rows of the
+query's hashes instead of scanning known audio. A track stores the
+verdict and transcript of the upload that created it, which /upload
+reuses for later matches.
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import librosa
+import numpy as np
+from scipy.ndimage import maximum_filter
+
+FINGERPRINT_DB = 'data/fingerprints.db'
+
+N_FFT = 2048
+HOP_LENGTH = 512
+MAX_BIN = 512            # ~5.5 kHz at 22.05 kHz; 9 bits
+PEAK_NEIGHBORHOOD = (21, 21)  # (freq bins, frames)
+PEAK_MIN_DB = -50.0      # relative to the loudest bin
+# Only the strongest peaks per second are kept, so noise adds few spurious ones
+PEAKS_PER_SECOND = 20
+FAN_OUT = 5
+MAX_DT = 63              # frames; 6 bits
+# A match needs this many hashes at one consistent offset...
+MIN_ALIGNED_HASHES = 20
+# ...covering at least this fraction of the query's hashes...
+MIN_MATCH_RATIO = 0.05
+# ...and of the stored track's, so a short clip does not inherit the verdict
+# of a long recording it was cut from
+MIN_TRACK_RATIO = 0.1
+QUERY_CHUNK = 500        # bound on SQLite host parameters per query
+
+
+def spectral_peaks(y, sr):
+    """(frame, bin) coordinates of local spectrogram maxima, in time order."""
+    spec = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))[:MAX_BIN]
+    db = librosa.amplitude_to_db(spec, ref=np.max)
+    local_max = (db == maximum_filter(db, size=PEAK_NEIGHBORHOOD)) & (db > PEAK_MIN_DB)
+    bins, frames = np.nonzero(local_max)
+
+    # Rank peaks by strength within each one-second block and keep the top ones
+    block = frames // max(1, int(sr / HOP_LENGTH))
+    order = np.lexsort((-db[bins, frames], block))
+    block = block[order]
+    first_in_block = np.searchsorted(block, block, side='left')
+    keep = order[np.arange(len(order)) - first_in_block < PEAKS_PER_SECOND]
+
+    bins, frames = bins[keep], frames[keep]
+    order = np.lexsort((bins, frames))
+    return frames[order], bins[order]
+
+
+def fingerprint(y, sr, segments=None):
+    """Constellation hashes as parallel (hashes, anchor_frames) int64 arrays.
+
+    segments are VAD speech ranges in samples (vad.speech_segments); peaks
+    outside them are ignored. Offsets stay relative to the start of y.
+    """
+    frames, bins = spectral_peaks(y, sr)
+    if segments is not None:
+        in_speech = np.zeros(len(frames), dtype=bool)
+        for start, end in segments:
+            in_speech |= (frames >= start // HOP_LENGTH) & (frames < -(-end // HOP_LENGTH))
+        frames, bins = frames[in_speech], bins[in_speech]
+    hashes, offsets = [], []
+    n = len(frames)
+    for shift in range(1, FAN_OUT + 1):
+        if shift >= n:
+            break
+        anchor_t, target_t = frames[:-shift], frames[shift:]
+        dt = target_t - anchor_t
+        keep = (dt > 0) & (dt <= MAX_DT)
+        hashes.append((bins[:-shift][keep] << 15) | (bins[shift:][keep] << 6) | dt[keep])
+        offsets.append(anchor_t[keep])
+    if not hashes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(hashes).astype(np.int64), np.concatenate(offsets).astype(np.int64)
+
+
+class FingerprintIndex:
+    """SQLite-backed inverted index of fingerprint hashes."""
+
+    def __init__(self, db_path=FINGERPRINT_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS tracks (
+                    track_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    file_hash TEXT,
+                    filename TEXT,
+                    prediction TEXT,
+                    transcription TEXT,
+                    scam_label TEXT,
+                    scam_comment TEXT,
+                    model_version TEXT,
+                    scam_model_version TEXT,
+                    n_hashes INTEGER,
+                    created_at REAL
+                )
+            ''')
+            conn.execute('CREATE TABLE IF NOT EXISTS hashes (hash INTEGER, track_id INTEGER, offset INTEGER)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_hashes_hash ON hashes (hash)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tracks_file_hash ON tracks (file_hash)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _track(row):
+        keys = ('track_id', 'file_hash', 'filename', 'prediction', 'transcription', 'scam_label',
+                'scam_comment', 'model_version', 'scam_model_version')
+        return dict(zip(keys, row))
+
+    def find_exact(self, file_hash, model_version):
+        """Track for a byte-identical earlier upload scored by the same model."""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT track_id, file_hash, filename, prediction, transcription, scam_label, scam_comment, '
+                'model_version, scam_model_version FROM tracks WHERE file_hash = ? AND model_version = ? '
+                'ORDER BY track_id DESC LIMIT 1', (file_hash, model_version)).fetchone()
+        return self._track(row) if row else None
+
+    def match(self, hashes, offsets, model_version):
+        """Best track whose hashes line up with the query at one offset, or None."""
+        if len(hashes) == 0:
+            return None
+        # A shifted STFT grid (trimmed copies) can move a peak by one frame, so
+        # each query hash also looks up its neighbours with frame gap +-1
+        query_offsets = {}
+        for h, t in zip(hashes.tolist(), offsets.tolist()):
+            dt = h & MAX_DT
+            for delta in (0, -1, 1):
+                if 0 < dt + delta <= MAX_DT:
+                    query_offsets.setdefault(h + delta, []).append(t)
+        unique = list(query_offsets)
+
+        # Histogram of (track, track_offset - query_offset) over every shared hash
+        votes = {}
+        track_hashes = {}
+        with self._connect() as conn:
+            for i in range(0, len(unique), QUERY_CHUNK):
+                chunk = unique[i:i + QUERY_CHUNK]
+                rows = conn.execute(
+                    'SELECT h.hash, h.track_id, h.offset, t.n_hashes FROM hashes h '
+                    'JOIN tracks t ON t.track_id = h.track_id '
+                    f'WHERE h.hash IN ({",".join("?" * len(chunk))}) AND t.model_version = ?',
+                    chunk + [model_version])
+                for h, track_id, offset, n_hashes in rows:
+                    track_hashes[track_id] = n_hashes
+                    for t in query_offsets[h]:
+                        key = (track_id, offset - t)
+                        votes[key] = votes.get(key, 0) + 1
+            if not votes:
+                return None
+            # Count votes within one frame of each offset for the same reason;
+            # the best track is the one with most aligned hashes that covers
+            # enough of both the query and its own hashes
+            best = None
+            for key, count in votes.items():
+                aligned = count + votes.get((key[0], key[1] - 1), 0) + votes.get((key[0], key[1] + 1), 0)
+                if (aligned < MIN_ALIGNED_HASHES or aligned < MIN_MATCH_RATIO * len(hashes)
+                        or aligned < MIN_TRACK_RATIO * (track_hashes[key[0]] or 0)):
+                    continue
+                if best is None or aligned > best[1]:
+                    best = (key[0], aligned)
+            if best is None:
+                return None
+            track_id, aligned = best
+            row = conn.execute(
+                'SELECT track_id, file_hash, filename, prediction, transcription, scam_label, scam_comment, '
+                'model_version, scam_model_version FROM tracks WHERE track_id = ?', (track_id,)).fetchone()
+        track = self._track(row)
+        track['aligned_hashes'] = aligned
+        track['match_ratio'] = round(min(1.0, aligned / len(hashes), aligned / max(1, track_hashes[track_id])), 3)
+        return track
+
+    def add(self, hashes, offsets, file_hash, filename, prediction, transcription=None,
+            scam_label=None, scam_comment=None, model_version=None, scam_model_version=None):
+        """Index a processed upload; returns its track_id (None when there are no hashes to index)."""
+        if len(hashes) == 0:
+            return None
+        with self._connect() as conn:
+            cur = conn.execute(
+                'INSERT INTO tracks (file_hash, filename, prediction, transcription, scam_label, scam_comment, '
+                'model_version, scam_model_version, n_hashes, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (file_hash, filename, prediction, transcription, scam_label, scam_comment, model_version,
+                 scam_model_version, len(hashes), time.time()))
+            track_id = cur.lastrowid
+            conn.executemany('INSERT INTO hashes (hash, track_id, offset) VALUES (?, ?, ?)',
+                             zip(hashes.tolist(), [track_id] * len(hashes), offsets.tolist()))
+        return track_id
+
+    def prune(self, max_age_days=None, max_tracks=None):
+        """Drop tracks older than max_age_days and the oldest beyond max_tracks, then VACUUM.
+
+        Track ids grow with insertion time, so both limits remove a prefix
+        of ids and the hashes go in one range delete. Returns the count removed.
+        """
+        with self._connect() as conn:
+            last_id = 0
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                last_id = conn.execute('SELECT MAX(track_id) FROM tracks WHERE created_at < ?',
+                                       (cutoff,)).fetchone()[0] or 0
+            if max_tracks is not None:
+                row = conn.execute('SELECT track_id FROM tracks ORDER BY track_id DESC LIMIT 1 OFFSET ?',
+                                   (max_tracks,)).fetchone()
+                if row:
+                    last_id = max(last_id, row[0])
+            if not last_id:
+                return 0
+            conn.execute('DELETE FROM hashes WHERE track_id <= ?', (last_id,))
+            removed = conn.execute('DELETE FROM tracks WHERE track_id <= ?', (last_id,)).rowcount
+        # Return the freed pages to the filesystem; VACUUM cannot run inside a transaction
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+        return removed
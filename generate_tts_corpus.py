@@ -0,0 +1,167 @@
+import argparse
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, List, Optional
+
+from tts_service import DEFAULT_RATE, DEFAULT_VOLUME, list_voices, synthesize_to_wav, tts_cache_key
+
+
+DATA_PATH = "BETTER30.csv"
+OUTPUT_DIR = os.path.join("audio_data", "fake")  # fake-class input for train_voice_detector.py
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_FIELDS = ["filename", "text", "voice", "rate", "volume", "status", "error"]
+DEFAULT_RATES = (150, DEFAULT_RATE, 210)
+
+# Strip BETTER30 step markers such as "[Step: 1]" and template slots like "[Your Name]".
+BRACKET_PATTERN = re.compile(r"\[[^\]]*\]")
+
+
+def load_texts(path: str = DATA_PATH, column: str = "TEXT") -> List[str]:
+    """Read phrases from a CSV column or, for non-CSV files, one phrase per line."""
+    texts: List[str] = []
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(f)
+            if column not in (reader.fieldnames or []):
+                raise ValueError(f"Required column '{column}' not found in {path}")
+            raw = (row.get(column) or "" for row in reader)
+        else:
+            raw = f
+        for line in raw:
+            cleaned = " ".join(BRACKET_PATTERN.sub(" ", line).split())
+            if cleaned:
+                texts.append(cleaned)
+
+    # Keep the first occurrence of each phrase
+    return list(dict.fromkeys(texts))
+
+
+def corpus_filename(text: str, voice: Optional[str], rate: int, volume: float) -> str:
+    """Deterministic name, so re-running the generator skips finished clips."""
+    return f"tts_{tts_cache_key(text, rate, volume, voice)[:20]}.wav"
+
+
+def _synthesize_job(job: dict) -> dict:
+    """Worker entry point; each process lazily builds its own pooled engine.
+
+    Clips are rendered under a temporary name and renamed into place, so an
+    interrupted run never leaves a truncated WAV that the next run would
+    count as finished.
+    """
+    result = dict(job, status="ok", error="")
+    path = os.path.join(job["output_dir"], job["filename"])
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        result["status"] = "exists"
+        return result
+    tmp_name = f".{job['filename']}.{os.getpid()}.tmp.wav"
+    try:
+        _, tmp_path = synthesize_to_wav(
+            job["text"],
+            job["output_dir"],
+            rate=job["rate"],
+            volume=job["volume"],
+            voice=job["voice"],
+            filename=tmp_name,
+        )
+        os.replace(tmp_path, path)
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    finally:
+        tmp_path = os.path.join(job["output_dir"], tmp_name)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return result
+
+
+def discover_voices() -> List[str]:
+    """Installed voice ids, enumerated in a throwaway process.
+
+    The parent never starts a TTS engine itself, so the synthesis workers
+    are not forked from a process holding driver state.
+    """
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(list_voices).result()
+
+
+def build_jobs(texts: Iterable[str], voices: Iterable[Optional[str]], rates: Iterable[int],
+               volume: float = DEFAULT_VOLUME, output_dir: str = OUTPUT_DIR) -> List[dict]:
+    """Cross every phrase with every voice and rate."""
+    jobs = []
+    for text in texts:
+        for voice in voices:
+            for rate in rates:
+                jobs.append({
+                    "filename": corpus_filename(text, voice, rate, volume),
+                    "text": text,
+                    "voice": voice or "",
+                    "rate": int(rate),
+                    "volume": volume,
+                    "output_dir": output_dir,
+                })
+    return jobs
+
+
+def generate_corpus(texts: List[str], voices: List[Optional[str]], rates: List[int],
+                    volume: float = DEFAULT_VOLUME, output_dir: str = OUTPUT_DIR,
+                    workers: Optional[int] = None) -> str:
+    """Synthesize all (text, voice, rate) combinations in parallel and write a manifest.
+
+    Returns the manifest path.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = build_jobs(texts, voices, rates, volume, output_dir)
+    print(f"Generating {len(jobs)} clips ({len(texts)} texts x {len(voices)} voices x {len(rates)} rates)")
+
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    counts = {"ok": 0, "exists": 0, "error": 0}
+    with open(manifest_path, "w", newline="", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(manifest, fieldnames=MANIFEST_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        futures = [pool.submit(_synthesize_job, job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            counts[result["status"]] += 1
+            writer.writerow(result)
+            if result["status"] == "error":
+                print(f"[WARN] {result['filename']}: {result['error']}")
+            if done % 100 == 0 or done == len(jobs):
+                print(f"  {done}/{len(jobs)} done")
+
+    print(f"Finished: {counts['ok']} new, {counts['exists']} already present, {counts['error']} failed")
+    print(f"Manifest written to: {manifest_path}")
+    return manifest_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Batch-generate synthetic (fake-class) voice clips with pyttsx3.")
+    parser.add_argument("--input", default=DATA_PATH, help="CSV with a TEXT column, or a text file with one phrase per line")
+    parser.add_argument("--column", default="TEXT", help="CSV column holding the phrases")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--voices", default="all", help="Comma-separated voice ids, 'all' or 'default'")
+    parser.add_argument("--rates", default=",".join(str(r) for r in DEFAULT_RATES), help="Comma-separated speech rates")
+    parser.add_argument("--volume", type=float, default=DEFAULT_VOLUME)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N phrases")
+    args = parser.parse_args()
+
+    texts = load_texts(args.input, args.column)
+    if args.limit:
+        texts = texts[:args.limit]
+
+    if args.voices == "all":
+        voices = discover_voices() or [None]
+    elif args.voices == "default":
+        voices = [None]
+    else:
+        voices = [v.strip() for v in args.voices.split(",") if v.strip()]
+    rates = [int(r) for r in args.rates.split(",") if r.strip()]
+
+    generate_corpus(texts, voices, rates, args.volume, args.output_dir, args.workers)
+
+
+if __name__ == "__main__":
+    main()
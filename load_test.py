@@ -0,0 +1,339 @@
+"""Concurrent load test for /upload with a local transcription stand-in.
+
+Starts the app in a scratch directory (fresh ledger and alert log) with
+TRANSCRIBE_BACKEND=fake, drives concurrent uploads from many client
+threads, reports throughput, latency percentiles and errors, and then
+checks the integrity of data/sample_alerts.jsonl and the blocks table.
+
+    python3 load_test.py --clients 32 --requests 500 --latency-ms 300
+    python3 load_test.py --processes 4 --clients 64      # multi-process server
+    python3 load_test.py --asgi --clients 500            # ASGI mode (asgi.py)
+    python3 load_test.py --url http://host:5000 --workdir /srv/app   # existing server
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmark_pipeline import synth_wav_bytes
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def multipart_body(field, filename, data, extra=None):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for key, value in (extra or {}).items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: audio/wav\r\n\r\n'.encode() + data + b'\r\n'
+    )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def upload_once(url, filename, data, timeout=120):
+    """POST one file; returns (latency_s, status_code or None, error message, Retry-After or None)."""
+    body, content_type = multipart_body('file', filename, data)
+    req = urllib.request.Request(url + '/upload', data=body, headers={'Content-Type': content_type}, method='POST')
+    start = time.perf_counter()
+    retry_after = None
+    try:
+        with _opener.open(req, timeout=timeout) as resp:
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+        retry_after = e.headers.get('Retry-After')
+    except Exception as e:
+        return time.perf_counter() - start, None, str(e), None
+    elapsed = time.perf_counter() - start
+    # Success is the redirect back to the index page
+    if status in (200, 302, 303):
+        return elapsed, status, None, None
+    return elapsed, status, f'HTTP {status}', retry_after
+
+
+# —— Server ——————————————————————————————————————————
+def prepare_workdir():
+    workdir = tempfile.mkdtemp(prefix='voice_load_')
+    for name in ('model', 'models'):
+        src = os.path.join(REPO_DIR, name)
+        if os.path.isdir(src):
+            os.symlink(src, os.path.join(workdir, name))
+    return workdir
+
+
+def serve(workdir, port, processes, asgi=False):
+    """Entry point of the server subprocess."""
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    if asgi:
+        import uvicorn
+        uvicorn.run('asgi:application', host='127.0.0.1', port=port, workers=max(1, processes), log_level='warning')
+        return
+    from werkzeug.serving import make_server
+    from app import app
+
+    threaded = processes <= 1
+    server = make_server('127.0.0.1', port, app, threaded=threaded, processes=max(1, processes))
+    server.serve_forever()
+
+
+def start_server(workdir, port, processes, latency_ms, jitter_ms, clients, asgi=False):
+    # The payloads repeat, so fingerprint dedupe would answer most uploads from its cache
+    env = dict(os.environ, TRANSCRIBE_BACKEND='fake', SHADOW_MODEL_PATH='off', MAINTENANCE_INTERVAL_S='0',
+               FINGERPRINT_DEDUPE='off',
+               FAKE_TRANSCRIBE_LATENCY_MS=str(latency_ms), FAKE_TRANSCRIBE_JITTER_MS=str(jitter_ms))
+    # Admit every client; the default limits (sized to the CPU count) would answer most with 429
+    for name in ('UPLOAD_MAX_CONCURRENT', 'UPLOAD_MAX_QUEUE', 'ASGI_UPLOAD_MAX_CONCURRENT',
+                 'ASGI_UPLOAD_MAX_QUEUE', 'CPU_MAX_QUEUE'):
+        env.setdefault(name, str(clients))
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', '--workdir', workdir,
+                             '--port', str(port), '--processes', str(processes)] + (['--asgi'] if asgi else []),
+                            env=env)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('Server exited during startup')
+        try:
+            with urllib.request.urlopen(url + '/', timeout=2):
+                return proc, url
+        except Exception:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError('Server did not become ready within 60 s')
+
+
+# —— Integrity checks ————————————————————————————————————
+def check_alert_log(path, expected_new, baseline_count=0):
+    result = {'path': path, 'ok': True, 'problems': []}
+    logs, corrupt = [], 0
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    logs.append(json.loads(line))
+                except json.JSONDecodeError:
+                    corrupt += 1
+    except OSError as e:
+        return {'path': path, 'ok': False, 'problems': [f'unreadable log: {e}']}
+    if corrupt:
+        result['problems'].append(f'{corrupt} lines are not valid JSON (interleaved or torn writes)')
+    result['entries'] = len(logs)
+    missing = sum(1 for e in logs if not {'filename', 'prediction', 'timestamp'} <= set(e))
+    if missing:
+        result['problems'].append(f'{missing} entries missing required keys')
+    lost = baseline_count + expected_new - len(logs)
+    if lost:
+        result['problems'].append(f'{lost} successful uploads missing from the log' if lost > 0
+                                  else f'{-lost} more entries than successful uploads')
+    result['ok'] = not result['problems']
+    return result
+
+
+def check_ledger(db_path, expected_new, baseline_count=0):
+    sys.path.insert(0, REPO_DIR)
+    from blockchain import Blockchain
+
+    result = {'path': db_path, 'ok': True, 'problems': []}
+    blocks = Blockchain(db_path).load_chain_from_db()
+    result['blocks'] = len(blocks)
+
+    lost = baseline_count + expected_new - len(blocks)
+    if lost:
+        result['problems'].append(f'{lost} successful uploads have no block' if lost > 0
+                                  else f'{-lost} more blocks than successful uploads')
+
+    prev_hashes = {}
+    broken_links = 0
+    for prev, block in zip(blocks, blocks[1:]):
+        if block.prev_hash != prev.hash:
+            broken_links += 1
+    for block in blocks:
+        prev_hashes[block.prev_hash] = prev_hashes.get(block.prev_hash, 0) + 1
+    forks = sum(n - 1 for n in prev_hashes.values() if n > 1)
+    if broken_links:
+        result['problems'].append(f'{broken_links} blocks do not link to the previous block hash')
+    if forks:
+        result['problems'].append(f'{forks} blocks share a parent (forked chain)')
+
+    bad_hashes = sum(1 for b in blocks if b.compute_hash() != b.hash)
+    if bad_hashes:
+        result['problems'].append(f'{bad_hashes} blocks whose stored hash does not match their contents')
+    result['ok'] = not result['problems']
+    return result
+
+
+def count_existing(workdir):
+    logs = blocks = 0
+    log_path = os.path.join(workdir, 'data', 'sample_alerts.jsonl')
+    if os.path.exists(log_path):
+        with open(log_path) as f:
+            logs = sum(1 for line in f if line.strip())
+    db_path = os.path.join(workdir, 'blockchain.db')
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            blocks = conn.execute('SELECT COUNT(*) FROM blocks').fetchone()[0]
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+    return logs, blocks
+
+
+# —— Driver ————————————————————————————————————————
+def run_load(url, clients, total_requests, durations, sample_rate):
+    payloads = [(f'load_{d}s.wav', synth_wav_bytes(d, sample_rate, seed=i)) for i, d in enumerate(durations)]
+    latencies, errors, statuses, retry_afters = [], {}, {}, []
+    lock = threading.Lock()
+
+    def worker(i):
+        name, data = payloads[i % len(payloads)]
+        # Unique names so concurrent requests never share an upload path
+        filename = f'{i}_{name}'
+        elapsed, status, error, retry_after = upload_once(url, filename, data)
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 429:
+                # Admission control shedding load is reported apart from failures
+                if retry_after is not None:
+                    retry_afters.append(float(retry_after))
+            elif error:
+                errors[error] = errors.get(error, 0) + 1
+            else:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(worker, range(total_requests)))
+    wall = time.perf_counter() - start
+
+    lat_ms = np.array(latencies) * 1000.0 if latencies else np.array([0.0])
+    rejected = statuses.get(429, 0)
+    return {
+        'clients': clients,
+        'requests': total_requests,
+        'succeeded': len(latencies),
+        'rejected': rejected,
+        'failed': total_requests - len(latencies) - rejected,
+        'errors': errors,
+        'retry_after_s': {
+            'min': min(retry_afters),
+            'mean': sum(retry_afters) / len(retry_afters),
+            'max': max(retry_afters),
+        } if retry_afters else None,
+        'status_codes': {str(k): v for k, v in statuses.items()},
+        'wall_s': wall,
+        'throughput_rps': len(latencies) / wall if wall else None,
+        'latency_ms': {
+            'mean': float(lat_ms.mean()),
+            'p50': float(np.percentile(lat_ms, 50)),
+            'p90': float(np.percentile(lat_ms, 90)),
+            'p99': float(np.percentile(lat_ms, 99)),
+            'max': float(lat_ms.max()),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test /upload with a fake transcription backend.')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client threads')
+    parser.add_argument('--requests', type=int, default=200, help='Total uploads to send')
+    parser.add_argument('--durations', default='2,5,10', help='Comma-separated clip lengths in seconds')
+    parser.add_argument('--sample-rate', type=int, default=16000)
+    parser.add_argument('--latency-ms', type=float, default=300, help='Fake recognizer latency')
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--processes', type=int, default=1, help='Server worker processes (1 = threaded)')
+    parser.add_argument('--asgi', action='store_true', help='Serve the ASGI app (asgi.py) under uvicorn')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--url', default=None, help='Test an already running server instead of starting one')
+    parser.add_argument('--workdir', default=None, help="Server working directory (for integrity checks with --url)")
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch directory for inspection')
+    parser.add_argument('--output', default=None, help='Write the JSON report here')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.workdir, args.port, args.processes, args.asgi)
+        return
+
+    proc = None
+    workdir = args.workdir
+    owns_workdir = False
+    if args.url:
+        url = args.url.rstrip('/')
+    else:
+        workdir = prepare_workdir()
+        owns_workdir = True
+        proc, url = start_server(workdir, args.port, args.processes, args.latency_ms, args.jitter_ms,
+                                 args.clients, args.asgi)
+
+    try:
+        logs_before, blocks_before = count_existing(workdir) if workdir else (0, 0)
+        durations = [float(d) for d in args.durations.split(',') if d.strip()]
+        print(f'Load testing {url}: {args.requests} uploads from {args.clients} clients ...')
+        report = {'load': run_load(url, args.clients, args.requests, durations, args.sample_rate)}
+        # Let in-flight writes settle before inspecting shared state
+        time.sleep(1.0)
+        if workdir:
+            ok = report['load']['succeeded']
+            report['integrity'] = {
+                'alert_log': check_alert_log(os.path.join(workdir, 'data', 'sample_alerts.jsonl'), ok, logs_before),
+                'ledger': check_ledger(os.path.join(workdir, 'blockchain.db'), ok, blocks_before),
+            }
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if owns_workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    load = report['load']
+    print(f"\nSucceeded {load['succeeded']}/{load['requests']} in {load['wall_s']:.1f} s "
+          f"-> {load['throughput_rps']:.2f} req/s")
+    print('Latency ms: ' + ', '.join(f'{k}={v:.1f}' for k, v in load['latency_ms'].items()))
+    if load['rejected']:
+        retry = load['retry_after_s']
+        print(f"Rejected with 429: {load['rejected']}"
+              + (f" (Retry-After {retry['min']:.0f}-{retry['max']:.0f} s, mean {retry['mean']:.1f} s)" if retry else ''))
+    if load['errors']:
+        print('Errors:', load['errors'])
+    for name, check in report.get('integrity', {}).items():
+        status = 'OK' if check['ok'] else 'FAILED'
+        print(f'Integrity [{name}]: {status}' + ''.join(f'\n  - {p}' for p in check['problems']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nReport written to: {args.output}')
+
+    integrity_ok = all(c['ok'] for c in report.get('integrity', {}).values())
+    sys.exit(0 if integrity_ok and not load['failed'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Background retention for the files and records the app accumulates.
+
+A daemon thread runs one maintenance pass every MAINTENANCE_INTERVAL_S:
+
+- certificate QR PNGs and cached certificate JPEGs under static/certs are
+  evicted least recently used first (every cache hit touches the file),
+  both past an age limit and beyond a file count;
+- files left in uploads/ by failed requests or older TTS flows are
+  removed once they are clearly abandoned, and the TTS cache is trimmed
+  to its size budget;
+- detection log entries older than LOG_RETENTION_DAYS are rolled into
+  gzipped monthly archives (user_actions.archive_logs), which /logs and
+  the certificate routes still read;
+- fingerprint tracks (with their transcripts and hashes) older than
+  FINGERPRINT_MAX_AGE_DAYS or beyond FINGERPRINT_MAX_TRACKS are deleted
+  from data/fingerprints.db, which is then vacuumed.
+
+Every step is idempotent. With several workers, a non-blocking file lock
+lets one of them do each pass while the others skip it.
+"""
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: passes are not coordinated across processes
+    fcntl = None
+
+from certificates import CERT_CACHE_DIR, CERT_CACHE_MAX_FILES, CERT_DIR
+from fingerprint import FINGERPRINT_DB, FingerprintIndex
+from metrics import Counter
+from tts_service import TTS_CACHE_DIR, evict_tts_cache
+from user_actions import archive_logs
+
+UPLOAD_DIR = 'uploads'
+MAINTENANCE_LOCK = os.path.join('data', 'maintenance.lock')
+
+# Retention settings; all can be overridden from the environment
+CERT_MAX_AGE_DAYS = float(os.environ.get('CERT_MAX_AGE_DAYS', '30'))
+CERT_QR_MAX_FILES = int(os.environ.get('CERT_QR_MAX_FILES', '500'))
+# Uploads are deleted at the end of their request; anything this old was orphaned
+UPLOAD_ORPHAN_MAX_AGE_S = int(os.environ.get('UPLOAD_ORPHAN_MAX_AGE_S', '3600'))
+LOG_RETENTION_DAYS = float(os.environ.get('LOG_RETENTION_DAYS', '90'))
+FINGERPRINT_MAX_AGE_DAYS = float(os.environ.get('FINGERPRINT_MAX_AGE_DAYS', '90'))
+FINGERPRINT_MAX_TRACKS = int(os.environ.get('FINGERPRINT_MAX_TRACKS', '20000'))
+
+MAINTENANCE_REMOVED = Counter(
+    'voice_maintenance_removed_total',
+    'Files deleted or log records archived by background maintenance.',
+    labelnames=('target',),
+)
+
+
+def _evict(paths, max_age_s=None, max_files=None):
+    """Delete files idle longer than max_age_s, then the least recently used beyond max_files."""
+    entries = []
+    for path in paths:
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            continue
+    entries.sort()
+    cutoff = time.time() - max_age_s if max_age_s is not None else None
+    excess = len(entries) - max_files if max_files is not None else 0
+    removed = 0
+    for i, (mtime, path) in enumerate(entries):
+        if not (i < excess or (cutoff is not None and mtime < cutoff)):
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _files(directory, predicate):
+    if not os.path.isdir(directory):
+        return []
+    paths = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if predicate(name) and os.path.isfile(path):
+            paths.append(path)
+    return paths
+
+
+def evict_certificates(cert_dir=CERT_DIR, cache_dir=CERT_CACHE_DIR, max_age_days=CERT_MAX_AGE_DAYS,
+                       max_qr_files=CERT_QR_MAX_FILES, max_cache_files=CERT_CACHE_MAX_FILES):
+    """LRU/age eviction of QR PNGs and rendered JPEGs; both are regenerated on demand."""
+    max_age_s = max_age_days * 86400
+    removed = _evict(_files(cert_dir, lambda name: name.startswith('cert')), max_age_s, max_qr_files)
+    removed += _evict(_files(cache_dir, lambda name: name.endswith('.jpg')), max_age_s, max_cache_files)
+    # Temp files of renders that died before their rename
+    removed += _evict(_files(cache_dir, lambda name: name.endswith('.tmp')), UPLOAD_ORPHAN_MAX_AGE_S)
+    return removed
+
+
+def sweep_uploads(upload_dir=UPLOAD_DIR, max_age_s=UPLOAD_ORPHAN_MAX_AGE_S, tts_cache_dir=TTS_CACHE_DIR):
+    """Remove abandoned files from uploads/ and trim the TTS cache to its size budget."""
+    removed = _evict(_files(upload_dir, lambda name: not name.startswith('.')), max_age_s)
+    removed += _evict(_files(tts_cache_dir, lambda name: name.endswith('.tmp.wav')), max_age_s)
+    removed += evict_tts_cache(tts_cache_dir)
+    return removed
+
+
+def prune_fingerprints(db_path=FINGERPRINT_DB, max_age_days=FINGERPRINT_MAX_AGE_DAYS,
+                       max_tracks=FINGERPRINT_MAX_TRACKS):
+    """Age/count retention for the fingerprint index; nothing to do when dedupe never created it."""
+    if not os.path.exists(db_path):
+        return 0
+    return FingerprintIndex(db_path).prune(max_age_days, max_tracks)
+
+
+def run_maintenance():
+    """One maintenance pass; returns counts per target, or None if another worker holds the lock."""
+    os.makedirs(os.path.dirname(MAINTENANCE_LOCK), exist_ok=True)
+    with open(MAINTENANCE_LOCK, 'a') as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+        try:
+            report = {}
+            for target, step in (('certificates', evict_certificates),
+                                 ('uploads', sweep_uploads),
+                                 ('logs', lambda: archive_logs(LOG_RETENTION_DAYS)),
+                                 ('fingerprints', prune_fingerprints)):
+                try:
+                    report[target] = step()
+                except Exception as e:
+                    print(f"[MAINTENANCE] {target} failed: {e}")
+                    report[target] = f'error: {e}'
+                    continue
+                MAINTENANCE_REMOVED.inc(target, amount=report[target])
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    if any(isinstance(n, str) or n for n in report.values()):
+        print(f"[MAINTENANCE] {report}")
+    return report
+
+
+_thread = None
+
+
+def start_maintenance(interval_s):
+    """Run run_maintenance now and then every interval_s seconds in a daemon thread."""
+    global _thread
+    if _thread is not None or interval_s <= 0:
+        return _thread
+
+    def loop():
+        while True:
+            try:
+                run_maintenance()
+            except Exception as e:
+                print(f"[MAINTENANCE] Pass failed: {e}")
+            time.sleep(interval_s)
+
+    _thread = threading.Thread(target=loop, name='maintenance', daemon=True)
+    _thread.start()
+    return _thread
@@ -0,0 +1,252 @@
+"""In-process metrics with Prometheus text exposition.
+
+Kept dependency-free on purpose: histograms, counters and gauges live in
+this process and are rendered by render_prometheus() for the /metrics
+route. Each worker process exposes its own series.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = []
+_queues = {}
+_captured = threading.local()
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {labels: (list(s[0]), s[1], s[2]) for labels, s in self._series.items()}
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = _format_labels(self.labelnames, labels, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_str} {total!r}')
+            lines.append(f'{self.name}_count{label_str} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Gauge:
+    """A gauge whose value is set directly or read from a callback at render time."""
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                values = {}
+            # A callback returns a number, or {labels_tuple: number} for labelled gauges
+            items = sorted(values.items()) if isinstance(values, dict) else [((), values)]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        for labels, value in items:
+            if value is None:
+                continue
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+def render_prometheus():
+    """All registered metrics in Prometheus text format (version 0.0.4)."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# —— Pipeline metrics ——————————————————————————————
+STAGE_SECONDS = Histogram(
+    'voice_stage_duration_seconds',
+    'Time spent in each stage of the detection pipeline.',
+    labelnames=('stage',),
+)
+REQUEST_SECONDS = Histogram(
+    'voice_request_duration_seconds',
+    'Wall time of HTTP requests by endpoint and status code.',
+    labelnames=('endpoint', 'status'),
+)
+CACHE_REQUESTS = Counter(
+    'voice_cache_requests_total',
+    'Cache lookups by cache and result (hit/miss).',
+    labelnames=('cache', 'result'),
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    'voice_admission_wait_seconds',
+    'Time admitted requests spent queued for a concurrency slot, by route.',
+    labelnames=('route',),
+)
+ADMISSION_REJECTED = Counter(
+    'voice_admission_rejected_total',
+    'Requests rejected with 429 by admission control, by route and reason (queue_full/timeout).',
+    labelnames=('route', 'reason'),
+)
+IN_FLIGHT = Gauge(
+    'voice_requests_in_flight',
+    'Requests currently being handled, by endpoint.',
+    labelnames=('endpoint',),
+)
+
+
+def _cache_hit_ratios():
+    ratios = {}
+    for cache in {labels[0] for labels in list(CACHE_REQUESTS._values)}:
+        hits = CACHE_REQUESTS.value(cache, 'hit')
+        total = hits + CACHE_REQUESTS.value(cache, 'miss')
+        ratios[(cache,)] = hits / total if total else None
+    return ratios
+
+
+CACHE_HIT_RATIO = Gauge(
+    'voice_cache_hit_ratio',
+    'Fraction of cache lookups that were hits since process start.',
+    labelnames=('cache',),
+    callback=_cache_hit_ratios,
+)
+QUEUE_DEPTH = Gauge(
+    'voice_queue_depth',
+    'Jobs waiting or running in background queues.',
+    labelnames=('queue',),
+    callback=lambda: {(name,): fn() for name, fn in list(_queues.items())},
+)
+
+
+def register_queue(name, depth_fn):
+    """Expose a queue's current depth (a zero-argument callable) as voice_queue_depth."""
+    _queues[name] = depth_fn
+
+
+@contextmanager
+def stage(name):
+    """Context manager timing one pipeline stage, e.g. ``with stage('predict'):``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        timings = getattr(_captured, 'stages', None)
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+@contextmanager
+def capture_stages():
+    """Also collect the (stage, seconds) pairs timed in this thread into the yielded list.
+
+    Worker processes return the list so the parent, whose /metrics is
+    scraped, can record_stages() it.
+    """
+    previous = getattr(_captured, 'stages', None)
+    timings = _captured.stages = []
+    try:
+        yield timings
+    finally:
+        _captured.stages = previous
+
+
+def record_stages(timings):
+    """Observe stage timings measured in another process (see capture_stages)."""
+    for name, seconds in timings:
+        STAGE_SECONDS.observe(seconds, name)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache, 'hit' if hit else 'miss')
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+# How often (seconds) a registry stats its artifact to notice a new model.
+RELOAD_CHECK_INTERVAL = 5.0
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def metadata_path(model_path):
+    """Sidecar JSON written next to a model artifact by the training scripts."""
+    return model_path + '.meta.json'
+
+
+def write_model_metadata(model_path, metrics=None, sha256=None, **extra):
+    """Record hash, training date and metrics for a freshly saved artifact."""
+    meta = {
+        'sha256': sha256 or file_sha256(model_path),
+        'trained_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'metrics': metrics or {},
+    }
+    meta.update(extra)
+    tmp_path = metadata_path(model_path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=4)
+    os.replace(tmp_path, metadata_path(model_path))
+    return meta
+
+
+def save_model(model, model_path, metrics=None, compress=0, **extra):
+    """Atomically publish a model artifact plus its metadata sidecar.
+
+    The artifact is written to a temporary file and renamed into place, so a
+    running app's registry never loads a half-written pickle.
+    """
+    os.makedirs(os.path.dirname(model_path) or '.', exist_ok=True)
+    tmp_path = f"{model_path}.{os.getpid()}.tmp"
+    joblib.dump(model, tmp_path, compress=compress)
+    # Sidecar first: a registry that sees the new artifact must also see its metadata
+    meta = write_model_metadata(model_path, metrics, sha256=file_sha256(tmp_path), **extra)
+    os.replace(tmp_path, model_path)
+    return meta
+
+
+class ModelVersion:
+    """A loaded model together with the metadata identifying it."""
+
+    def __init__(self, name, path, model, sha256, trained_at, metrics, stat_key):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.sha256 = sha256
+        self.trained_at = trained_at
+        self.metrics = metrics
+        self.stat_key = stat_key
+        self.loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    @property
+    def version_id(self):
+        return f"{self.name}@{self.sha256[:12]}"
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'version': self.version_id,
+            'path': self.path,
+            'sha256': self.sha256,
+            'trained_at': self.trained_at,
+            'loaded_at': self.loaded_at,
+            'metrics': self.metrics,
+        }
+
+
+class ModelRegistry:
+    """Serves the current version of one model artifact and hot-swaps it on change.
+
+    Callers take a ModelVersion from current() and use it for the whole
+    request, so a swap never mixes two models within one prediction. When
+    the artifact file is replaced (deploy with an atomic rename), the next
+    check loads it in the calling thread while other threads keep serving
+    the previous version, then the reference is swapped in one assignment.
+    """
+
+    def __init__(self, name, path, lazy=False, check_interval=RELOAD_CHECK_INTERVAL):
+        self.name = name
+        self.path = path
+        self.check_interval = check_interval
+        self._current = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.last_error = None
+        if not lazy:
+            self.reload(force=True)
+
+    def _stat_key(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _load(self, stat_key):
+        sha256 = file_sha256(self.path)
+        meta = {}
+        if os.path.exists(metadata_path(self.path)):
+            try:
+                with open(metadata_path(self.path), 'r') as f:
+                    meta = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                meta = {}
+        if meta.get('sha256') not in (None, sha256):
+            # Sidecar describes a different artifact; keep only what we can verify
+            meta = {}
+        trained_at = meta.get('trained_at') or datetime.fromtimestamp(
+            os.path.getmtime(self.path)).strftime('%Y-%m-%d %H:%M:%S')
+        model = joblib.load(self.path)
+        return ModelVersion(self.name, self.path, model, sha256, trained_at, meta.get('metrics', {}), stat_key)
+
+    def reload(self, force=False):
+        """Load the artifact if it changed since the loaded version. Returns True on swap."""
+        with self._reload_lock:
+            self._last_check = time.monotonic()
+            try:
+                stat_key = self._stat_key()
+            except FileNotFoundError as e:
+                if self._current is None:
+                    self.last_error = str(e)
+                    if force:
+                        raise
+                return False
+            if not force and self._current is not None and self._current.stat_key == stat_key:
+                return False
+            try:
+                new_version = self._load(stat_key)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[MODEL_REGISTRY] Failed to load {self.path}: {e}")
+                if force and self._current is None:
+                    raise
+                return False
+            previous = self._current
+            self._current = new_version
+            self.last_error = None
+        if previous is not None and previous.sha256 != new_version.sha256:
+            print(f"[MODEL_REGISTRY] Swapped {previous.version_id} -> {new_version.version_id}")
+        return True
+
+    def current(self):
+        """The version to use for this request, or None if the model is unavailable."""
+        if time.monotonic() - self._last_check >= self.check_interval and not self._reload_lock.locked():
+            try:
+                self.reload(force=self._current is None)
+            except Exception:
+                pass
+        return self._current
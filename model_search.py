@@ -0,0 +1,143 @@
+"""Cross-validated hyperparameter search that weighs accuracy against cost.
+
+Shared by train_voice_detector.py and train_better30_scam_classifier.py.
+Every candidate is scored on each CV fold for accuracy, p50/p99 latency
+of single-row predict calls (how the app scores an upload) and pickled
+model size, so models can be picked on the accuracy/latency trade-off
+rather than accuracy alone.
+"""
+
+import pickle
+import time
+from typing import Optional
+
+import numpy as np
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import GridSearchCV, KFold, RandomizedSearchCV, StratifiedKFold
+
+
+def accuracy_scorer(estimator, X, y) -> float:
+    return accuracy_score(y, estimator.predict(X))
+
+
+# Single-row predict calls timed per validation fold
+LATENCY_SAMPLE_ROWS = 100
+
+# (estimator, X, timings) of the last fold, so the p50 and p99 scorers share one timing run
+_last_timings = None
+
+
+def single_row_latencies(estimator, X) -> np.ndarray:
+    """Milliseconds of predict() on single rows spread over X, one call per row as in app.py."""
+    global _last_timings
+    if _last_timings is not None and _last_timings[0] is estimator and _last_timings[1] is X:
+        return _last_timings[2]
+    n = len(X)
+    timings = []
+    for i in np.unique(np.linspace(0, n - 1, min(n, LATENCY_SAMPLE_ROWS)).astype(int)):
+        row = X.iloc[i:i + 1] if hasattr(X, "iloc") else X[i:i + 1]
+        start = time.perf_counter()
+        estimator.predict(row)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    _last_timings = (estimator, X, np.array(timings))
+    return _last_timings[2]
+
+
+def latency_p50_scorer(estimator, X, y) -> float:
+    return float(np.percentile(single_row_latencies(estimator, X), 50))
+
+
+def latency_p99_scorer(estimator, X, y) -> float:
+    return float(np.percentile(single_row_latencies(estimator, X), 99))
+
+
+def size_scorer(estimator, X, y) -> float:
+    """Size in KB of the pickled fitted estimator."""
+    return len(pickle.dumps(estimator, protocol=pickle.HIGHEST_PROTOCOL)) / 1024.0
+
+
+SCORING = {
+    "accuracy": accuracy_scorer,
+    "latency_p50_ms": latency_p50_scorer,
+    "latency_p99_ms": latency_p99_scorer,
+    "size_kb": size_scorer,
+}
+
+
+def make_cv(y, n_splits: int = 5, random_state: int = 42):
+    """Stratified folds when every class can fill each fold, plain K-fold otherwise."""
+    _, counts = np.unique(np.asarray(y), return_counts=True)
+    smallest = int(counts.min()) if len(counts) else 0
+    if smallest >= 2:
+        return StratifiedKFold(n_splits=min(n_splits, smallest), shuffle=True, random_state=random_state)
+    print("Warning: some labels have < 2 samples; using unstratified K-fold.")
+    return KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+
+
+def run_search(estimator, param_grid, X, y, cv=None, groups=None, n_iter: Optional[int] = None,
+               n_jobs: int = -1, random_state: int = 42):
+    """Grid search (or randomized search when n_iter is set) over a process pool.
+
+    The best estimator is refit on all data by accuracy. Returns the fitted
+    search object; see print_search_report for the per-candidate summary.
+    """
+    cv = cv if cv is not None else make_cv(y, random_state=random_state)
+    common = dict(
+        scoring=SCORING,
+        refit="accuracy",
+        cv=cv,
+        n_jobs=n_jobs,
+        error_score=np.nan,
+        verbose=1,
+    )
+    if n_iter:
+        search = RandomizedSearchCV(estimator, param_grid, n_iter=n_iter, random_state=random_state, **common)
+    else:
+        search = GridSearchCV(estimator, param_grid, **common)
+    search.fit(X, y, groups=groups)
+    return search
+
+
+def search_results(search) -> list:
+    """One dict per candidate: params and mean/std of accuracy, mean p50/p99 latency and size."""
+    res = search.cv_results_
+    rows = []
+    for i, params in enumerate(res["params"]):
+        rows.append({
+            "params": params,
+            "accuracy": float(res["mean_test_accuracy"][i]),
+            "accuracy_std": float(res["std_test_accuracy"][i]),
+            "latency_p50_ms": float(res["mean_test_latency_p50_ms"][i]),
+            "latency_p99_ms": float(res["mean_test_latency_p99_ms"][i]),
+            "size_kb": float(res["mean_test_size_kb"][i]),
+            "fit_s": float(res["mean_fit_time"][i]),
+        })
+    return rows
+
+
+def pareto_front(rows: list) -> list:
+    """Candidates not beaten on both accuracy and p99 latency by any other candidate."""
+    front = []
+    for row in rows:
+        dominated = any(
+            other["accuracy"] >= row["accuracy"] and other["latency_p99_ms"] <= row["latency_p99_ms"]
+            and (other["accuracy"] > row["accuracy"] or other["latency_p99_ms"] < row["latency_p99_ms"])
+            for other in rows
+        )
+        if not dominated:
+            front.append(row)
+    return front
+
+
+def print_search_report(search, top: int = 15) -> None:
+    rows = sorted(search_results(search), key=lambda r: r["accuracy"], reverse=True)
+    front = {id(r) for r in pareto_front(rows)}
+    print(f"\n{'accuracy':>15} {'p50 ms':>9} {'p99 ms':>9} {'size KB':>10} {'fit s':>8}  params")
+    for row in rows[:top]:
+        marker = "*" if id(row) in front else " "
+        print(
+            f"{row['accuracy']:.4f} ± {row['accuracy_std']:.4f} {row['latency_p50_ms']:>9.3f} "
+            f"{row['latency_p99_ms']:>9.3f} {row['size_kb']:>10.1f} {row['fit_s']:>8.2f} {marker} {row['params']}"
+        )
+    print("(latency: single-row predict calls; * = on the accuracy/p99 latency Pareto front)")
+    print(f"\nBest by accuracy: {search.best_params_} ({search.best_score_:.4f})")
@@ -0,0 +1,158 @@
+"""Opt-in per-request cProfile and tracemalloc capture for Flask routes.
+
+With PROFILING_MODE 'off' (the default) nothing is installed: no hooks, no
+wrapped views, so there is no overhead at all. In 'header' mode a request
+is profiled when it carries ``X-Profile: <PROFILING_TOKEN>``; in 'always'
+mode every request to a profiled route is captured. Captures are stored
+under PROFILE_DIR and listed at /profiles.
+"""
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import shutil
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from flask import abort, jsonify, make_response, request, send_file
+
+PROFILE_DIR = os.path.join('data', 'profiles')
+PROFILE_MAX_KEEP = 50
+PROFILE_HEADER = 'X-Profile'
+TRACEMALLOC_FRAMES = 10
+DEFAULT_ENDPOINTS = ('handle_upload', 'logs', 'download_certificate')
+
+# Only one request is captured at a time: tracemalloc is process-wide and
+# overlapping captures would attribute each other's allocations.
+_capture_lock = threading.Lock()
+
+
+def _prune(profile_dir, keep):
+    if not os.path.isdir(profile_dir):
+        return
+    captures = sorted(
+        (d for d in os.listdir(profile_dir) if os.path.isdir(os.path.join(profile_dir, d))),
+        reverse=True,
+    )
+    for old in captures[keep:]:
+        shutil.rmtree(os.path.join(profile_dir, old), ignore_errors=True)
+
+
+def _save_capture(profile_dir, endpoint, profiler, snapshot, elapsed_s, status):
+    capture_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{endpoint}_{uuid.uuid4().hex[:6]}"
+    capture_dir = os.path.join(profile_dir, capture_id)
+    os.makedirs(capture_dir, exist_ok=True)
+
+    profiler.dump_stats(os.path.join(capture_dir, 'cpu.prof'))
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(40)
+    with open(os.path.join(capture_dir, 'cpu.txt'), 'w') as f:
+        f.write(text.getvalue())
+
+    snapshot.dump(os.path.join(capture_dir, 'memory.snapshot'))
+    top = snapshot.statistics('lineno')[:40]
+    with open(os.path.join(capture_dir, 'memory.txt'), 'w') as f:
+        f.write(f"Top {len(top)} allocation sites still live at the end of the request\n\n")
+        for stat in top:
+            f.write(f"{stat}\n")
+
+    with open(os.path.join(capture_dir, 'meta.json'), 'w') as f:
+        json.dump({
+            'id': capture_id,
+            'endpoint': endpoint,
+            'path': request.full_path,
+            'method': request.method,
+            'status': status,
+            'elapsed_ms': round(elapsed_s * 1000.0, 3),
+            'captured_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }, f, indent=4)
+    _prune(profile_dir, PROFILE_MAX_KEEP)
+    return capture_id
+
+
+def _wrap_view(view, endpoint, mode, token, profile_dir):
+    @functools.wraps(view)
+    def profiled_view(*args, **kwargs):
+        if mode == 'header' and (not token or request.headers.get(PROFILE_HEADER) != token):
+            return view(*args, **kwargs)
+        if not _capture_lock.acquire(blocking=False):
+            # Another capture is running; serve this request unprofiled
+            return view(*args, **kwargs)
+        try:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                if started_tracing:
+                    tracemalloc.stop()
+            capture_id = _save_capture(profile_dir, endpoint, profiler, snapshot, elapsed,
+                                       response.status_code)
+            response.headers['X-Profile-Id'] = capture_id
+            return response
+        finally:
+            _capture_lock.release()
+
+    return profiled_view
+
+
+def init_profiling(app, mode='off', token=None, endpoints=DEFAULT_ENDPOINTS, profile_dir=PROFILE_DIR):
+    """Install profiling on the given endpoints. Call after all routes are registered."""
+    mode = (mode or 'off').lower()
+    if mode == 'off':
+        return False
+    if mode not in ('header', 'always'):
+        raise ValueError(f"PROFILING_MODE must be 'off', 'header' or 'always', not {mode!r}")
+    if mode == 'header' and not token:
+        print("[PROFILING] header mode needs PROFILING_TOKEN; profiling left disabled.")
+        return False
+
+    for endpoint in endpoints:
+        view = app.view_functions.get(endpoint)
+        if view is not None:
+            app.view_functions[endpoint] = _wrap_view(view, endpoint, mode, token, profile_dir)
+
+    def require_token():
+        if mode == 'header' and request.headers.get(PROFILE_HEADER) != token:
+            abort(404)
+
+    @app.route('/profiles')
+    def list_profiles():
+        """Metadata of stored captures, newest first."""
+        require_token()
+        captures = []
+        if os.path.isdir(profile_dir):
+            for capture_id in sorted(os.listdir(profile_dir), reverse=True):
+                meta_path = os.path.join(profile_dir, capture_id, 'meta.json')
+                if os.path.exists(meta_path):
+                    with open(meta_path) as f:
+                        captures.append(json.load(f))
+        return jsonify(captures)
+
+    @app.route('/profiles/<capture_id>/<artifact>')
+    def download_profile(capture_id, artifact):
+        """Download cpu.prof (pstats/snakeviz), cpu.txt, memory.txt or memory.snapshot."""
+        require_token()
+        if artifact not in ('cpu.prof', 'cpu.txt', 'memory.txt', 'memory.snapshot', 'meta.json'):
+            abort(404)
+        path = os.path.join(profile_dir, os.path.basename(capture_id), artifact)
+        if not os.path.exists(path):
+            abort(404)
+        return send_file(os.path.abspath(path), as_attachment=True,
+                         download_name=f"{capture_id}_{artifact}")
+
+    print(f"[PROFILING] Enabled in '{mode}' mode for: {', '.join(endpoints)}")
+    return True
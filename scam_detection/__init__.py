@@ -1,6 +1,7 @@
 """Scam detection module for call analysis."""
 
 from .classifier import ScamClassifier
+from .matcher import IndicatorMatcher
 from .utils import load_dataset, prepare_dataset_for_training
 
-__all__ = ['ScamClassifier', 'load_dataset', 'prepare_dataset_for_training']
+__all__ = ['ScamClassifier', 'IndicatorMatcher', 'load_dataset', 'prepare_dataset_for_training']
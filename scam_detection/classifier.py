@@ -7,6 +7,8 @@ import joblib
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
 
+from .matcher import IndicatorMatcher
+
 class ScamClassifier:
     """Classify call transcripts into scam categories."""
 
@@ -44,6 +46,7 @@ class ScamClassifier:
                 'description': 'Caller claims you won a prize but need to pay fees.'
             }
         }
+        self.matcher = IndicatorMatcher(self.scam_types)
         self.load_or_train()
 
     def preprocess_text(self, text):
@@ -139,10 +142,12 @@ class ScamClassifier:
                 'indicators': []
             })
             
-            # Find matching indicators
+            # Find matching indicators (whole words, all categories in one pass)
+            indicator_matches = self.matcher.scan(text)
+            found_phrases = indicator_matches.get(scam_type, {}).get('phrases', {})
             indicators_found = [
-                word for word in scam_info['indicators'] 
-                if word in text
+                word for word in scam_info['indicators']
+                if word in found_phrases
             ]
             
             # If no indicators found but classified as scam, use default description
@@ -154,6 +159,9 @@ class ScamClassifier:
                 'confidence': f"{min(confidence * 100, 99):.1f}%",
                 'description': scam_info['description'],
                 'indicators_found': indicators_found[:5],  # Limit to top 5 indicators
+                'indicator_counts': {
+                    category: info['count'] for category, info in indicator_matches.items()
+                },
                 'recommended_action': self.get_recommended_action(scam_type),
                 'context_analysis': self.analyze_context(text, scam_type)
             }
@@ -221,6 +229,7 @@ class ScamClassifier:
             'confidence': 'N/A',
             'description': 'Unable to analyze the call at this time.',
             'indicators_found': [],
+            'indicator_counts': {},
             'recommended_action': 'Proceed with caution and verify the caller\'s identity.',
             'context_analysis': 'Insufficient data for detailed analysis.'
         }
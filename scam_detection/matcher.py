@@ -0,0 +1,114 @@
+"""Multi-pattern indicator matching for call transcripts."""
+
+import re
+from collections import deque
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text):
+    """Yield (token, start, end) for every word in lowercased text."""
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        yield match.group(), match.start(), match.end()
+
+
+class IndicatorMatcher:
+    """Aho-Corasick automaton over word tokens.
+
+    Phrases are matched on whole-word boundaries only, so 'irs' does not
+    fire inside 'first'. All categories are compiled into one automaton and
+    a transcript is scanned in a single pass over its tokens, independent
+    of how many indicator phrases there are.
+    """
+
+    def __init__(self, scam_types):
+        """Build the automaton from a ScamClassifier-style scam_types dict."""
+        # Node 0 is the root. Each node has its own goto table, a failure
+        # link and the list of (category, phrase, n_tokens) it completes.
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._max_tokens = 1
+        self.categories = list(scam_types)
+        for category, info in scam_types.items():
+            for phrase in info.get('indicators', []):
+                self.add_phrase(category, phrase)
+        self._build_failure_links()
+
+    def add_phrase(self, category, phrase):
+        """Insert one indicator phrase; call before the automaton is built."""
+        tokens = [tok for tok, _, _ in tokenize(phrase)]
+        if not tokens:
+            return
+        node = 0
+        for tok in tokens:
+            nxt = self._goto[node].get(tok)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][tok] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = nxt
+        self._max_tokens = max(self._max_tokens, len(tokens))
+        entry = (category, ' '.join(tokens), len(tokens))
+        if entry not in self._output[node]:
+            self._output[node].append(entry)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for tok, child in self._goto[node].items():
+                queue.append(child)
+                state = self._fail[node]
+                while state and tok not in self._goto[state]:
+                    state = self._fail[state]
+                fallback = self._goto[state].get(tok, 0)
+                self._fail[child] = fallback if fallback != child else 0
+                self._output[child].extend(self._output[self._fail[child]])
+
+    def find_matches(self, text):
+        """Return every indicator occurrence in text.
+
+        Each match is a dict with category, phrase and the start/end
+        character offsets of the phrase in text.
+        """
+        matches = []
+        if not text:
+            return matches
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        # Start offsets of the most recent tokens, enough to recover the
+        # start of the longest phrase that can end at the current token.
+        starts = deque(maxlen=self._max_tokens)
+        for tok, start, end in tokenize(text):
+            starts.append(start)
+            while node and tok not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(tok, 0)
+            for category, phrase, n_tokens in output[node]:
+                matches.append({
+                    'category': category,
+                    'phrase': phrase,
+                    'start': starts[-n_tokens],
+                    'end': end,
+                })
+        return matches
+
+    def scan(self, text):
+        """Match text and summarise the hits per category.
+
+        Returns a dict mapping category to
+        {'count': int, 'phrases': {phrase: count}, 'positions': [(start, end), ...]}
+        for every category that had at least one hit.
+        """
+        summary = {}
+        for match in self.find_matches(text):
+            info = summary.setdefault(
+                match['category'], {'count': 0, 'phrases': {}, 'positions': []}
+            )
+            info['count'] += 1
+            info['phrases'][match['phrase']] = info['phrases'].get(match['phrase'], 0) + 1
+            info['positions'].append((match['start'], match['end']))
+        return summary
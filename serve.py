@@ -0,0 +1,27 @@
+"""Production server: the ASGI app (asgi.py) under uvicorn.
+
+    python serve.py
+    HOST=0.0.0.0 PORT=8000 WEB_WORKERS=2 CPU_WORKERS=8 python serve.py
+
+Use this instead of ``python app.py``, which starts Flask's development server.
+In ASGI mode transcription needs GOOGLE_SPEECH_KEY (or TRANSCRIBE_BACKEND=fake).
+This module stays import-light on purpose: the CPU pool's spawned workers
+re-import the main module, and must not load the Flask app.
+"""
+
+import os
+
+HOST = os.environ.get('HOST', '127.0.0.1')
+PORT = int(os.environ.get('PORT', '5000'))
+# One event loop holds thousands of waiting uploads; extra workers add CPU pools and model copies
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', '1'))
+
+
+def main():
+    import uvicorn
+    uvicorn.run('asgi:application', host=HOST, port=PORT, workers=WEB_WORKERS,
+                proxy_headers=True, log_level='info')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from model_registry import ModelRegistry
+
+SHADOW_LOG_FILE = 'data/shadow_results.jsonl'
+# The log is rotated to .1, .2, ... past this size; older rotations are deleted
+SHADOW_LOG_MAX_BYTES = int(os.environ.get('SHADOW_LOG_MAX_BYTES', 10 * 1024 * 1024))
+SHADOW_LOG_BACKUPS = 3
+# Pending shadow jobs beyond this are dropped rather than queued without bound.
+SHADOW_MAX_PENDING = 256
+# Latency samples kept per model for percentiles.
+LATENCY_WINDOW = 2000
+
+
+class LatencyStats:
+    """Running count plus a bounded window of recent latencies."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.count = 0
+        self.total_ms = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.samples.append(ms)
+
+    def to_dict(self):
+        if not self.samples:
+            return {'count': self.count}
+        samples = np.fromiter(self.samples, dtype=float)
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count,
+            'p50_ms': float(np.percentile(samples, 50)),
+            'p95_ms': float(np.percentile(samples, 95)),
+            'p99_ms': float(np.percentile(samples, 99)),
+        }
+
+
+class ShadowEvaluator:
+    """Scores uploads with a candidate model off the request path.
+
+    The request hands over the feature vector it already extracted together
+    with the primary prediction and its latency; a background thread runs
+    the candidate and records agreement and per-model latency. Nothing here
+    ever blocks or fails the request: when the backlog is full the job is
+    dropped and counted.
+    """
+
+    def __init__(self, candidate_path, name='voice_detector_candidate', log_file=SHADOW_LOG_FILE,
+                 max_workers=1, max_pending=SHADOW_MAX_PENDING):
+        self.registry = ModelRegistry(name, candidate_path, lazy=True)
+        self.log_file = log_file
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shadow')
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.compared = 0
+        self.agreed = 0
+        self.latency = {}
+        # (primary_version, candidate_version) -> [compared, agreed]
+        self.pairs = {}
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _latency_for(self, version_id):
+        stats = self.latency.get(version_id)
+        if stats is None:
+            stats = self.latency[version_id] = LatencyStats()
+        return stats
+
+    def submit(self, features, primary_pred, primary_version, primary_latency_ms, filename=None):
+        """Queue a shadow comparison; returns False if it was dropped."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending += 1
+            self.submitted += 1
+            self._latency_for(primary_version).add(primary_latency_ms)
+        self._executor.submit(self._evaluate, np.array(features, copy=True), primary_pred,
+                              primary_version, filename)
+        return True
+
+    def _evaluate(self, features, primary_pred, primary_version, filename):
+        try:
+            candidate = self.registry.current()
+            if candidate is None:
+                raise RuntimeError(self.registry.last_error or 'candidate model unavailable')
+            start = time.perf_counter()
+            candidate_pred = candidate.model.predict(features)[0]
+            latency_ms = (time.perf_counter() - start) * 1000.0
+            agree = bool(candidate_pred == primary_pred)
+            with self._lock:
+                self.compared += 1
+                self.agreed += int(agree)
+                self._latency_for(candidate.version_id).add(latency_ms)
+                pair = self.pairs.setdefault((primary_version, candidate.version_id), [0, 0])
+                pair[0] += 1
+                pair[1] += int(agree)
+            self._append_log({
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'filename': filename,
+                'primary_version': primary_version,
+                'primary_pred': int(primary_pred),
+                'candidate_version': candidate.version_id,
+                'candidate_pred': int(candidate_pred),
+                'candidate_latency_ms': round(latency_ms, 3),
+                'agree': agree,
+            })
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"[SHADOW] Candidate scoring failed: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _append_log(self, record):
+        if not self.log_file:
+            return
+        os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+        with self._log_lock:
+            self._rotate_log()
+            with open(self.log_file, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def _rotate_log(self):
+        """Shift log -> log.1 -> ... -> log.SHADOW_LOG_BACKUPS (dropped) once the log is full."""
+        try:
+            if os.path.getsize(self.log_file) < SHADOW_LOG_MAX_BYTES:
+                return
+        except FileNotFoundError:
+            return
+        for i in range(SHADOW_LOG_BACKUPS, 0, -1):
+            source = f'{self.log_file}.{i - 1}' if i > 1 else self.log_file
+            try:
+                os.replace(source, f'{self.log_file}.{i}')
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'candidate_path': self.registry.path,
+                'submitted': self.submitted,
+                'compared': self.compared,
+                'agreement_rate': (self.agreed / self.compared) if self.compared else None,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'pending': self._pending,
+                'latency': {version: stats.to_dict() for version, stats in self.latency.items()},
+                'pairs': [
+                    {'primary': p, 'candidate': c, 'compared': n, 'agreement_rate': a / n}
+                    for (p, c), (n, a) in self.pairs.items()
+                ],
+            }
@@ -0,0 +1,54 @@
+"""Regression tests for speaker segmentation (run with `python -m pytest tests`)."""
+
+import numpy as np
+
+from diarization import segment_speakers
+from vad import trim_silence
+
+SR = 16000
+
+
+class ConstantModel:
+    """Stand-in voice detector: every window is Real with P(fake) = 0.2."""
+
+    classes_ = [0, 1]
+
+    def predict_proba(self, X):
+        return np.tile([0.8, 0.2], (len(X), 1))
+
+
+def synthetic_voice(seconds, f0=130.0, speak_s=2.0, pause_s=0.8, lead_s=0.0, seed=0):
+    """Harmonic voice with a fixed vocal-tract envelope, syllable rhythm and pauses."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SR)) / SR
+    phase = 2 * np.pi * np.cumsum(f0 * (1 + 0.05 * np.sin(2 * np.pi * 3 * t))) / SR
+    y = np.zeros(len(t))
+    for h in range(1, int(4000 // f0)):
+        amp = (np.exp(-((h * f0 - 600) / 200) ** 2) + 0.5 * np.exp(-((h * f0 - 1700) / 250) ** 2) + 0.2 / h)
+        y += amp * np.sin(h * phase)
+    y *= 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t) ** 2
+    y[(t % (speak_s + pause_s)) >= speak_s] = 0
+    y = np.concatenate([np.zeros(int(lead_s * SR)), 0.3 * y / np.abs(y).max()])
+    return (y + 1e-4 * rng.standard_normal(len(y))).astype(np.float32)
+
+
+def speakers_of(y):
+    _, segments = trim_silence(y, SR)
+    return segment_speakers(y, SR, segments, ConstantModel())['speakers']
+
+
+def test_single_voice_with_pauses_is_one_speaker():
+    assert len(speakers_of(synthetic_voice(20))) == 1
+
+
+def test_single_voice_after_leading_silence_is_one_speaker():
+    assert len(speakers_of(synthetic_voice(15, lead_s=2.0))) == 1
+
+
+def test_two_distinct_voices_are_two_speakers():
+    y = np.concatenate([synthetic_voice(8, f0=110), synthetic_voice(8, f0=240, seed=1)])
+    speakers = speakers_of(y)
+    assert len(speakers) == 2
+    # The first voice owns the first half, the second voice the rest
+    assert speakers[0]['ranges'][-1][1] <= 8.5
+    assert speakers[1]['ranges'][0][0] >= 7.5
@@ -1,19 +1,48 @@
+import argparse
+import hashlib
 import os
-from typing import Tuple
+import shutil
+import tempfile
+from typing import Dict, Iterator, Optional, Tuple
 
-import joblib
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import GroupKFold, GroupShuffleSplit, train_test_split
 from sklearn.pipeline import Pipeline
 
+from model_registry import save_model
+from model_search import print_search_report, run_search
+
 
 DATA_PATH = "BETTER30.csv"
 MODEL_DIR = "models"
 MODEL_PATH = os.path.join(MODEL_DIR, "better30_scam_text_model.pkl")
 
+GROUP_COL = "CONVERSATION_ID"  # steps of one conversation never straddle train/test
+STREAM_CHUNKSIZE = 50_000
+STREAM_EPOCHS = 3
+HASHING_FEATURES = 2 ** 20
+
+# Candidate grid for --search. Candidates that share the tfidf__* values reuse
+# the same fitted vectorizer per fold through the pipeline memory cache.
+SEARCH_PARAM_GRID = {
+    "tfidf__max_features": [5000, 10000, 20000],
+    "tfidf__ngram_range": [(1, 1), (1, 2)],
+    "tfidf__min_df": [1, 2],
+    "clf__C": [0.1, 1.0, 10.0],
+}
+
+
+def build_combined_text(df: pd.DataFrame) -> pd.Series:
+    """TEXT enriched with CONTEXT (when present) for one frame or chunk."""
+    text = df["TEXT"].fillna("").astype(str)
+    if "CONTEXT" in df.columns:
+        return text + " " + df["CONTEXT"].fillna("").astype(str)
+    return text
+
 
 def load_better30_dataset(csv_path: str = DATA_PATH) -> pd.DataFrame:
     """Load BETTER30.csv and build a combined text field for classification."""
@@ -26,13 +55,7 @@ def load_better30_dataset(csv_path: str = DATA_PATH) -> pd.DataFrame:
             raise ValueError(f"Required column '{col}' not found in {csv_path}")
 
     # Use CONTEXT if available to enrich the text
-    if "CONTEXT" in df.columns:
-        df["CONTEXT"] = df["CONTEXT"].fillna("")
-        df["combined_text"] = (
-            df["TEXT"].astype(str).fillna("") + " " + df["CONTEXT"].astype(str)
-        )
-    else:
-        df["combined_text"] = df["TEXT"].astype(str).fillna("")
+    df["combined_text"] = build_combined_text(df)
 
     # Clean labels
     df["LABEL"] = df["LABEL"].astype(str).str.strip()
@@ -40,16 +63,33 @@ def load_better30_dataset(csv_path: str = DATA_PATH) -> pd.DataFrame:
     # Drop rows with empty text or labels
     df = df[(df["combined_text"].str.len() > 0) & (df["LABEL"].str.len() > 0)]
 
-    return df[["combined_text", "LABEL"]]
+    columns = ["combined_text", "LABEL"]
+    if GROUP_COL in df.columns:
+        columns.append(GROUP_COL)
+    return df[columns]
 
 
 def train_test_split_better30(
     df: pd.DataFrame, test_size: float = 0.2, random_state: int = 42
 ) -> Tuple[pd.Series, pd.Series, pd.Series, pd.Series]:
-    """Split the dataset into train and test sets, handling rare labels safely."""
+    """Split the dataset into train and test sets, handling rare labels safely.
+
+    When CONVERSATION_ID is available the split is grouped, so every step of
+    a conversation lands on the same side.
+    """
     X = df["combined_text"]
     y = df["LABEL"]
 
+    if GROUP_COL in df.columns:
+        groups = df[GROUP_COL].fillna(-1)
+        splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+        train_idx, test_idx = next(splitter.split(X, y, groups=groups))
+        print(
+            f"Grouped split: {groups.iloc[train_idx].nunique()} train / "
+            f"{groups.iloc[test_idx].nunique()} test conversations"
+        )
+        return X.iloc[train_idx], X.iloc[test_idx], y.iloc[train_idx], y.iloc[test_idx]
+
     # Stratify only if all labels have at least 2 samples
     label_counts = y.value_counts()
     rare_labels = label_counts[label_counts < 2].index.tolist()
@@ -72,9 +112,13 @@ def train_test_split_better30(
     return X_train, X_test, y_train, y_test
 
 
-def build_training_pipeline() -> Pipeline:
-    """Create a TF-IDF + Logistic Regression pipeline for multi-class classification."""
+def build_training_pipeline(memory: Optional[str] = None, clf_n_jobs: int = -1) -> Pipeline:
+    """Create a TF-IDF + Logistic Regression pipeline for multi-class classification.
+
+    memory, if given, is a directory where fitted transformers are cached.
+    """
     pipeline = Pipeline(
+        memory=memory,
         steps=[
             (
                 "tfidf",
@@ -90,7 +134,7 @@ def build_training_pipeline() -> Pipeline:
                 LogisticRegression(
                     max_iter=1000,
                     class_weight="balanced",
-                    n_jobs=-1,
+                    n_jobs=clf_n_jobs,
                     multi_class="auto",
                     solver="lbfgs",
                 ),
@@ -144,10 +188,175 @@ def train_and_evaluate() -> None:
         print(cm)
 
     # Save the trained pipeline
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    joblib.dump(pipeline, MODEL_PATH)
+    save_model(pipeline, MODEL_PATH, metrics={"accuracy": float(acc)}, n_samples=int(len(df)))
+    print(f"\nSaved trained model to: {MODEL_PATH}")
+
+
+def search_hyperparameters(n_iter: Optional[int] = None, n_jobs: int = -1) -> None:
+    """Cross-validated search over SEARCH_PARAM_GRID, reporting accuracy, latency and size."""
+    print("Loading dataset from:", DATA_PATH)
+    df = load_better30_dataset(DATA_PATH)
+    print(f"Total samples: {len(df)}")
+
+    cache_dir = tempfile.mkdtemp(prefix="tfidf_cache_")
+    try:
+        pipeline = build_training_pipeline(memory=cache_dir, clf_n_jobs=1)
+        cv = groups = None
+        if GROUP_COL in df.columns:
+            groups = df[GROUP_COL].fillna(-1)
+            cv = GroupKFold(n_splits=min(5, groups.nunique()))
+        search = run_search(pipeline, SEARCH_PARAM_GRID, df["combined_text"], df["LABEL"],
+                            cv=cv, groups=groups, n_iter=n_iter, n_jobs=n_jobs)
+        print_search_report(search)
+
+        best = search.best_estimator_
+        # Drop the reference to the temporary cache before saving
+        best.set_params(memory=None)
+        save_model(best, MODEL_PATH, metrics={"cv_accuracy": float(search.best_score_)},
+                   params={k: str(v) for k, v in search.best_params_.items()}, n_samples=int(len(df)))
+        print(f"\nSaved best model to: {MODEL_PATH}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def conversation_in_test(group_key: str, test_size: float = 0.2, salt: str = "42") -> bool:
+    """Stable hash-based assignment of a whole conversation to the test side.
+
+    Needs no global view of the data, so chunks can be split as they stream.
+    """
+    digest = hashlib.md5(f"{salt}:{group_key}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 2 ** 32 < test_size
+
+
+def iter_better30_chunks(csv_path: str = DATA_PATH, chunksize: int = STREAM_CHUNKSIZE,
+                         test_size: float = 0.2) -> Iterator[pd.DataFrame]:
+    """Stream the CSV as cleaned chunks with combined_text, LABEL and an is_test flag.
+
+    Conversation IDs are read as strings, so an ID parses the same in every
+    chunk (dtype inference would turn 6 into 6.0 in chunks with a missing
+    ID); rows without an ID are dropped.
+    """
+    dropped = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype={GROUP_COL: str}):
+        for col in ("TEXT", "LABEL"):
+            if col not in chunk.columns:
+                raise ValueError(f"Required column '{col}' not found in {csv_path}")
+        if GROUP_COL in chunk.columns:
+            keys = chunk[GROUP_COL].str.strip()
+            has_group = keys.notna() & (keys != "")
+            dropped += int((~has_group).sum())
+            chunk, keys = chunk[has_group], keys[has_group]
+        out = pd.DataFrame({
+            "combined_text": build_combined_text(chunk),
+            "LABEL": chunk["LABEL"].astype(str).str.strip(),
+        })
+        if GROUP_COL not in chunk.columns:
+            # Without conversation IDs each row is its own group
+            keys = out["combined_text"]
+        out["is_test"] = [conversation_in_test(k, test_size) for k in keys]
+        out = out[(out["combined_text"].str.len() > 0) & (out["LABEL"].str.len() > 0)
+                  & (out["LABEL"] != "nan")]
+        if len(out):
+            yield out
+    if dropped:
+        print(f"Dropped {dropped} rows without a {GROUP_COL}")
+
+
+def build_streaming_pipeline() -> Pipeline:
+    """Stateless hashing features + a linear model that supports partial_fit."""
+    return Pipeline(
+        steps=[
+            (
+                "hashing",
+                HashingVectorizer(
+                    n_features=HASHING_FEATURES,
+                    ngram_range=(1, 2),
+                    stop_words="english",
+                    alternate_sign=False,
+                    norm="l2",
+                ),
+            ),
+            (
+                "clf",
+                SGDClassifier(loss="log_loss", alpha=1e-5, random_state=42),
+            ),
+        ]
+    )
+
+
+def train_streaming(csv_path: str = DATA_PATH, chunksize: int = STREAM_CHUNKSIZE,
+                    epochs: int = STREAM_EPOCHS, test_size: float = 0.2) -> None:
+    """Out-of-core training: grouped hash split, chunked reads and partial_fit.
+
+    Memory use is bounded by the chunk size rather than the dataset size;
+    only the test labels and predictions are kept for the final report.
+    """
+    print("Streaming dataset from:", csv_path)
+
+    # Pass 1: label counts on the training side, for classes and balanced weights
+    counts: Dict[str, int] = {}
+    for chunk in iter_better30_chunks(csv_path, chunksize, test_size):
+        for label, n in chunk.loc[~chunk["is_test"], "LABEL"].value_counts().items():
+            counts[label] = counts.get(label, 0) + int(n)
+    if not counts:
+        raise RuntimeError(f"No training rows found in {csv_path}")
+    classes = np.array(sorted(counts))
+    total = sum(counts.values())
+    class_weight = {label: total / (len(classes) * n) for label, n in counts.items()}
+    print(f"Training rows: {total}, labels: {list(classes)}")
+
+    pipeline = build_streaming_pipeline()
+    vectorizer = pipeline.named_steps["hashing"]
+    clf = pipeline.named_steps["clf"]
+
+    for epoch in range(1, epochs + 1):
+        seen = 0
+        for chunk in iter_better30_chunks(csv_path, chunksize, test_size):
+            train = chunk[~chunk["is_test"]]
+            if train.empty:
+                continue
+            X = vectorizer.transform(train["combined_text"])
+            weights = train["LABEL"].map(class_weight).to_numpy()
+            clf.partial_fit(X, train["LABEL"].to_numpy(), classes=classes, sample_weight=weights)
+            seen += len(train)
+        print(f"Epoch {epoch}/{epochs}: {seen} rows")
+
+    print("\nEvaluating on held-out conversations...")
+    y_true, y_pred = [], []
+    for chunk in iter_better30_chunks(csv_path, chunksize, test_size):
+        test = chunk[chunk["is_test"]]
+        if test.empty:
+            continue
+        y_true.extend(test["LABEL"])
+        y_pred.extend(pipeline.predict(test["combined_text"]))
+
+    metrics = {}
+    if y_true:
+        metrics["accuracy"] = float(accuracy_score(y_true, y_pred))
+        print(f"\nAccuracy: {metrics['accuracy']:.4f}")
+        print("\nClassification report:")
+        print(classification_report(y_true, y_pred, zero_division=0))
+    else:
+        print("No held-out rows; skipping evaluation.")
+
+    save_model(pipeline, MODEL_PATH, metrics=metrics, n_samples=total, mode="streaming")
     print(f"\nSaved trained model to: {MODEL_PATH}")
 
 
 if __name__ == "__main__":
-    train_and_evaluate()
+    parser = argparse.ArgumentParser(description="Train the BETTER30 scam/behavior text model.")
+    parser.add_argument("--search", action="store_true", help="Run a cross-validated hyperparameter search")
+    parser.add_argument("--n-iter", type=int, default=None, help="Randomized search with N candidates instead of the full grid")
+    parser.add_argument("--jobs", type=int, default=-1, help="Worker processes for the search")
+    parser.add_argument("--stream", action="store_true",
+                        help="Out-of-core training with chunked reads, HashingVectorizer and partial_fit")
+    parser.add_argument("--chunksize", type=int, default=STREAM_CHUNKSIZE)
+    parser.add_argument("--epochs", type=int, default=STREAM_EPOCHS)
+    args = parser.parse_args()
+
+    if args.stream:
+        train_streaming(DATA_PATH, args.chunksize, args.epochs)
+    elif args.search:
+        search_hyperparameters(args.n_iter, args.jobs)
+    else:
+        train_and_evaluate()
@@ -1,75 +1,198 @@
+import argparse
+import hashlib
+import json
 import os
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
 
-import joblib
-import librosa
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 from sklearn.model_selection import train_test_split
 
+from audio_io import decode_audio
+from detection import FEATURE_SECONDS, MAX_AUDIO_SECONDS
+from features import N_FEATURES, compute_features
+from model_registry import save_model
+from vad import trim_silence
+from model_search import print_search_report, run_search
+
 
 DATA_DIR = "audio_data"  # expected subfolders: audio_data/real, audio_data/fake
 MODEL_DIR = "model"
 MODEL_PATH = os.path.join(MODEL_DIR, "voice_detector_temp.pkl")
 ALLOWED_EXTENSIONS = (".wav", ".wave")
 
+# On-disk cache of extracted features, reused across training runs.
+FEATURE_STORE_NAME = ".feature_store"
+FEATURE_STORE_DIR = os.path.join(DATA_DIR, FEATURE_STORE_NAME)
+# Bump whenever extract_features changes so stale rows are not reused.
+FEATURE_VERSION = "mfcc12-spec3-vad1"
+
+# Candidate grid for --search
+SEARCH_PARAM_GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [None, 8, 16],
+    "min_samples_leaf": [1, 2, 4],
+    "max_features": ["sqrt", 0.5],
+}
+
 
 def extract_features(file_path: str) -> np.ndarray:
-    """Extract 12 MFCC + 3 spectral features, matching app.py expectations."""
-    y, sr = librosa.load(file_path, sr=22050, duration=10)
+    """12 MFCC + 3 spectral features, decoded and computed exactly as the app does."""
+    y, sr = decode_audio(file_path, duration=MAX_AUDIO_SECONDS)
+    # Drop silence the way the app does before extracting features
+    speech, _ = trim_silence(y, sr)
+    return compute_features((speech if speech.size else y)[:FEATURE_SECONDS * sr], sr)[0]
 
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-    mfcc_mean = np.mean(mfcc.T, axis=0)[:12]
 
-    spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
-    spectral_rolloff = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr))
-    zero_crossing_rate = np.mean(librosa.feature.zero_crossing_rate(y))
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
 
-    features = np.concatenate([
-        mfcc_mean,
-        [spectral_centroid / 1000.0],
-        [spectral_rolloff / 1000.0],
-        [zero_crossing_rate],
-    ])
-    return features
 
+class FeatureStore:
+    """Feature rows cached on disk, one row per audio file.
 
-def load_dataset(data_dir: str = DATA_DIR) -> Tuple[np.ndarray, np.ndarray]:
-    """Load WAV files from data_dir/real and data_dir/fake into X (features) and y (labels)."""
-    X: list[np.ndarray] = []
-    y: list[int] = []
+    Rows live in a single ``features.npy`` that is memory-mapped on load;
+    ``index.json`` maps each file path to its row plus the mtime, size and
+    SHA-256 it was extracted from. A file is re-extracted only when its
+    content hash changes (mtime/size are checked first so unchanged files are
+    not even re-hashed), and the whole store is discarded when
+    FEATURE_VERSION changes.
+    """
+
+    def __init__(self, store_dir: str = FEATURE_STORE_DIR, version: str = FEATURE_VERSION):
+        self.store_dir = store_dir
+        self.version = version
+        self.index_path = os.path.join(store_dir, "index.json")
+        self.features_path = os.path.join(store_dir, "features.npy")
+        self.entries: Dict[str, dict] = {}
+        self.matrix = np.empty((0, N_FEATURES), dtype=np.float64)
+        self._load()
+
+    def _load(self) -> None:
+        if not (os.path.exists(self.index_path) and os.path.exists(self.features_path)):
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                meta = json.load(f)
+            if meta.get("version") != self.version:
+                print(f"[FEATURE_STORE] Version changed ({meta.get('version')} -> {self.version}); re-extracting.")
+                return
+            matrix = np.load(self.features_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"[FEATURE_STORE] Ignoring unreadable store: {e}")
+            return
+        self.entries = meta.get("files", {})
+        self.matrix = matrix
+
+    def lookup(self, path: str) -> Tuple[int, dict]:
+        """Return (row, entry) for an up-to-date cached file, or (-1, new_entry)."""
+        st = os.stat(path)
+        entry = self.entries.get(path)
+        if entry and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+            return entry["row"], entry
+        digest = file_sha256(path)
+        fresh = {"mtime": st.st_mtime, "size": st.st_size, "sha256": digest}
+        if entry and entry["sha256"] == digest:
+            # Touched but unchanged: keep the row, remember the new mtime
+            fresh["row"] = entry["row"]
+            return entry["row"], fresh
+        return -1, fresh
+
+    def save(self, paths: List[str], entries: List[dict], X: np.ndarray) -> None:
+        """Persist exactly these rows, dropping files that no longer exist."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        files = {}
+        for row, (path, entry) in enumerate(zip(paths, entries)):
+            files[path] = dict(entry, row=row)
+        tmp_features = self.features_path + ".tmp.npy"
+        np.save(tmp_features, np.ascontiguousarray(X, dtype=np.float64))
+        tmp_index = self.index_path + ".tmp"
+        with open(tmp_index, "w") as f:
+            json.dump({"version": self.version, "n_features": N_FEATURES, "files": files}, f)
+        # Replace the matrix before the index so the index never points past it
+        os.replace(tmp_features, self.features_path)
+        os.replace(tmp_index, self.index_path)
+        self.entries = files
 
-    real_dir = os.path.join(data_dir, "real")
-    fake_dir = os.path.join(data_dir, "fake")
+
+def list_audio_files(data_dir: str = DATA_DIR) -> List[Tuple[str, int]]:
+    """Return (path, label) pairs from data_dir/real (0) and data_dir/fake (1)."""
+    files: List[Tuple[str, int]] = []
 
     def add_dir(directory: str, label: int) -> None:
         if not os.path.isdir(directory):
             return
-        for root, _, files in os.walk(directory):
-            for name in files:
-                if not name.lower().endswith(ALLOWED_EXTENSIONS):
-                    continue
-                path = os.path.join(root, name)
-                try:
-                    feats = extract_features(path)
-                    X.append(feats)
-                    y.append(label)
-                except Exception as e:
-                    print(f"[WARN] Skipping {path}: {e}")
+        for root, _, names in os.walk(directory):
+            for name in sorted(names):
+                if name.lower().endswith(ALLOWED_EXTENSIONS):
+                    files.append((os.path.join(root, name), label))
 
     # 0 = Real, 1 = Fake (matches app.py logic)
-    add_dir(real_dir, 0)
-    add_dir(fake_dir, 1)
+    add_dir(os.path.join(data_dir, "real"), 0)
+    add_dir(os.path.join(data_dir, "fake"), 1)
+    return files
+
+
+def load_dataset(data_dir: str = DATA_DIR, use_feature_store: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Load WAV files from data_dir/real and data_dir/fake into X (features) and y (labels).
 
-    if not X:
+    With use_feature_store, only new or changed files are decoded; the rest
+    come from the memory-mapped feature store.
+    """
+    files = list_audio_files(data_dir)
+    store = FeatureStore(os.path.join(data_dir, FEATURE_STORE_NAME)) if use_feature_store else None
+
+    X_rows: List[np.ndarray] = []
+    y: List[int] = []
+    kept_paths: List[str] = []
+    kept_entries: List[dict] = []
+    reused = extracted = 0
+    dirty = False
+
+    for path, label in files:
+        row, entry = (-1, {})
+        if store is not None:
+            try:
+                row, entry = store.lookup(path)
+            except OSError as e:
+                print(f"[WARN] Skipping {path}: {e}")
+                continue
+        if row >= 0:
+            feats = store.matrix[row]
+            reused += 1
+            dirty = dirty or entry is not store.entries.get(path)
+        else:
+            try:
+                feats = extract_features(path)
+            except Exception as e:
+                print(f"[WARN] Skipping {path}: {e}")
+                continue
+            extracted += 1
+        X_rows.append(feats)
+        y.append(label)
+        kept_paths.append(path)
+        kept_entries.append(entry)
+
+    real_dir = os.path.join(data_dir, "real")
+    fake_dir = os.path.join(data_dir, "fake")
+    if not X_rows:
         raise RuntimeError(
             f"No audio files found under '{real_dir}' or '{fake_dir}'. "
             "Populate these folders with .wav files before training."
         )
 
-    X_arr = np.vstack(X)
+    X_arr = np.vstack(X_rows)
     y_arr = np.array(y, dtype=int)
+
+    if store is not None:
+        print(f"[FEATURE_STORE] Reused {reused} cached rows, extracted {extracted} new/changed files.")
+        if dirty or extracted or len(kept_paths) != len(store.entries):
+            store.save(kept_paths, kept_entries, X_arr)
     return X_arr, y_arr
 
 
@@ -111,10 +234,34 @@ def train_and_evaluate() -> None:
     print("Confusion matrix (rows=true, cols=pred):")
     print(confusion_matrix(y_test, y_pred))
 
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    joblib.dump(clf, MODEL_PATH)
+    save_model(clf, MODEL_PATH, metrics={"accuracy": float(acc)}, n_samples=int(len(y)))
     print(f"\nSaved trained model to: {MODEL_PATH}")
 
 
+def search_hyperparameters(n_iter: Optional[int] = None, n_jobs: int = -1) -> None:
+    """Cross-validated search over SEARCH_PARAM_GRID, reporting accuracy, latency and size."""
+    print(f"Loading dataset from: {DATA_DIR}")
+    X, y = load_dataset(DATA_DIR)
+    print(f"Total samples: {len(y)}")
+
+    # Parallelism comes from the search pool; keep each forest single-threaded
+    base = RandomForestClassifier(random_state=42, n_jobs=1, class_weight="balanced")
+    search = run_search(base, SEARCH_PARAM_GRID, X, y, n_iter=n_iter, n_jobs=n_jobs)
+    print_search_report(search)
+
+    save_model(search.best_estimator_, MODEL_PATH, metrics={"cv_accuracy": float(search.best_score_)},
+               params=search.best_params_, n_samples=int(len(y)))
+    print(f"\nSaved best model to: {MODEL_PATH}")
+
+
 if __name__ == "__main__":
-    train_and_evaluate()
+    parser = argparse.ArgumentParser(description="Train the voice deepfake detector.")
+    parser.add_argument("--search", action="store_true", help="Run a cross-validated hyperparameter search")
+    parser.add_argument("--n-iter", type=int, default=None, help="Randomized search with N candidates instead of the full grid")
+    parser.add_argument("--jobs", type=int, default=-1, help="Worker processes for the search")
+    args = parser.parse_args()
+
+    if args.search:
+        search_hyperparameters(args.n_iter, args.jobs)
+    else:
+        train_and_evaluate()
@@ -1,10 +1,112 @@
+import hashlib
 import os
+import queue
+import threading
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
 
 import pyttsx3
 
+from metrics import record_cache, stage
 
-def synthesize_to_wav(text: str, output_dir: str = "uploads") -> tuple[str, str]:
+DEFAULT_RATE = 180
+DEFAULT_VOLUME = 1.0
+
+# Content-addressed cache of synthesized audio, bounded by total size.
+TTS_CACHE_DIR = os.path.join("uploads", "tts_cache")
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+
+class EnginePool:
+    """Reusable pyttsx3 engines handed out to one caller at a time.
+
+    pyttsx3 engines are not thread-safe and ``pyttsx3.init`` returns the same
+    engine for a given driver, so the default pool holds a single engine that
+    is created lazily and then reused for every request.
+    """
+
+    def __init__(self, size: int = 1, driver_name=None):
+        self.size = size
+        self.driver_name = driver_name
+        self._idle = queue.Queue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        # Voice the driver starts with; renders without an explicit voice
+        # restore it, since an engine keeps whatever the last request set.
+        self.default_voice = None
+
+    def _new_engine(self):
+        engine = pyttsx3.init(self.driver_name) if self.driver_name else pyttsx3.init()
+        if self.default_voice is None:
+            self.default_voice = engine.getProperty("voice")
+        return engine
+
+    @contextmanager
+    def engine(self, timeout=None):
+        """Check out an engine, creating one if the pool is not yet full."""
+        engine = None
+        with self._lock:
+            if self._idle.empty() and self._created < self.size:
+                engine = self._new_engine()
+                self._created += 1
+        if engine is None:
+            engine = self._idle.get(timeout=timeout)
+        broken = False
+        try:
+            yield engine
+        except Exception:
+            broken = True
+            raise
+        finally:
+            if broken:
+                # Drop an engine that failed mid-synthesis; a fresh one is
+                # created on the next checkout.
+                try:
+                    engine.stop()
+                except Exception:
+                    pass
+                with self._lock:
+                    self._created -= 1
+            else:
+                self._idle.put(engine)
+
+
+engine_pool = EnginePool()
+
+
+def list_voices() -> list[str]:
+    """Return the ids of the voices installed for the pyttsx3 driver."""
+    with engine_pool.engine() as engine:
+        return [voice.id for voice in engine.getProperty("voices") or []]
+
+
+def unique_tts_filename(prefix: str = "tts") -> str:
+    """Return a collision-free output name, e.g. tts_20250101120000_1a2b3c4d.wav."""
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    return f"{prefix}_{timestamp}_{uuid.uuid4().hex[:8]}.wav"
+
+
+def tts_cache_key(text: str, rate: int = DEFAULT_RATE, volume: float = DEFAULT_VOLUME, voice=None) -> str:
+    """SHA-256 of the text plus every voice parameter that changes the audio."""
+    payload = "\x1f".join([text, str(int(rate)), f"{float(volume):.3f}", voice or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _render(text: str, filepath: str, rate: int, volume: float, voice) -> None:
+    """Render with every property set, so no state leaks from the previous request."""
+    with engine_pool.engine() as engine:
+        engine.setProperty("rate", rate)
+        engine.setProperty("volume", volume)
+        voice = voice or engine_pool.default_voice
+        if voice:
+            engine.setProperty("voice", voice)
+        engine.save_to_file(text, filepath)
+        engine.runAndWait()
+
+
+def synthesize_to_wav(text: str, output_dir: str = "uploads", rate: int = DEFAULT_RATE,
+                      volume: float = DEFAULT_VOLUME, voice=None, filename=None) -> tuple[str, str]:
     """Generate a speech WAV file from the given text using pyttsx3.
 
     Returns (filename, full_path).
@@ -15,17 +117,97 @@ def synthesize_to_wav(text: str, output_dir: str = "uploads") -> tuple[str, str]
     if not cleaned:
         raise ValueError("Text for TTS is empty.")
 
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = f"tts_{timestamp}.wav"
+    filename = filename or unique_tts_filename()
     filepath = os.path.join(output_dir, filename)
+    _render(cleaned, filepath, rate, volume, voice)
+    return filename, filepath
+
+
+def evict_tts_cache(cache_dir: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES) -> int:
+    """Delete least recently used cache entries until the cache fits in max_bytes.
+
+    Returns the number of files removed.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if name.startswith(".") or not name.endswith(".wav"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
 
-    engine = pyttsx3.init()
+
+# Striped locks so concurrent requests for the same text synthesize it once.
+_cache_locks = [threading.Lock() for _ in range(32)]
+
+
+def _lock_for(key: str) -> threading.Lock:
+    return _cache_locks[int(key[:8], 16) % len(_cache_locks)]
+
+
+def _touch(path: str) -> bool:
+    """Mark a cache entry as recently used; False if it does not exist (or was just evicted)."""
     try:
-        engine.setProperty("rate", 180)
-        engine.setProperty("volume", 1.0)
-        engine.save_to_file(cleaned, filepath)
-        engine.runAndWait()
-    finally:
-        engine.stop()
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
 
-    return filename, filepath
+
+def synthesize_cached(text: str, rate: int = DEFAULT_RATE, volume: float = DEFAULT_VOLUME, voice=None,
+                      cache_dir: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES) -> tuple[str, str, bool]:
+    """Return synthesized audio for text, reusing a cached WAV when available.
+
+    Returns (filename, full_path, cache_hit). Cache hits are touched so that
+    eviction drops the least recently served entries first.
+    """
+    cleaned = (text or "").strip()
+    if not cleaned:
+        raise ValueError("Text for TTS is empty.")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    key = tts_cache_key(cleaned, rate, volume, voice)
+    filename = f"{key}.wav"
+    filepath = os.path.join(cache_dir, filename)
+
+    if _touch(filepath):
+        record_cache('tts', True)
+        return filename, filepath, True
+
+    with _lock_for(key):
+        # Another request may have produced the same entry while we waited.
+        if _touch(filepath):
+            record_cache('tts', True)
+            return filename, filepath, True
+        record_cache('tts', False)
+        tmp_name = f".{uuid.uuid4().hex}.tmp.wav"
+        tmp_path = os.path.join(cache_dir, tmp_name)
+        try:
+            with stage('tts_synthesize'):
+                _render(cleaned, tmp_path, rate, volume, voice)
+            os.replace(tmp_path, filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        evict_tts_cache(cache_dir, max_bytes)
+
+    return filename, filepath, False
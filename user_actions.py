@@ -1,19 +1,265 @@
+import glob
+import gzip
 import json
 import os
-from datetime import datetime
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
-LOG_FILE = 'data/sample_alerts.json'
+try:
+    import fcntl
+except ImportError:  # Windows: only threads within one process are serialized
+    fcntl = None
+
+# One JSON record per line, so an upload appends a line instead of rewriting the log
+LOG_FILE = 'data/sample_alerts.jsonl'
+# Pre-JSONL log (a single JSON array), converted into LOG_FILE on first import
+LEGACY_LOG_FILE = 'data/sample_alerts.json'
+# Records rolled out of LOG_FILE, one gzipped JSON Lines file per month
+ARCHIVE_DIR = os.path.join('data', 'log_archive')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Full sliding-window timelines, one JSON file per detection; the log keeps a summary
+TIMELINE_DIR = os.path.join('data', 'timelines')
+# Speech windows at or above this fake probability form the flagged spans of the summary
+TIMELINE_FLAG_THRESHOLD = 0.5
+_TIMELINE_ID = re.compile(r'^[0-9a-f]{32}$')
 os.makedirs('data', exist_ok=True)
 
-def log_action(filename, label, transcription=None, scam_label=None, scam_comment=None, file_hash=None):
+_log_lock = threading.Lock()
+
+
+@contextmanager
+def locked_log():
+    """Exclusive access to LOG_FILE across threads and worker processes."""
+    with _log_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(LOG_FILE + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_logs(logs):
+    """Replace LOG_FILE atomically so readers never see a half-written file."""
+    tmp_path = f"{LOG_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        for entry in logs:
+            f.write(json.dumps(entry) + '\n')
+    os.replace(tmp_path, LOG_FILE)
+
+
+def append_log(entry):
+    """Append one record to LOG_FILE with a single write."""
+    line = (json.dumps(entry) + '\n').encode('utf-8')
+    with locked_log():
+        fd = os.open(LOG_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def read_logs():
+    """Current (unarchived) log entries, oldest first; unreadable lines are skipped."""
+    entries = []
+    try:
+        with open(LOG_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A write cut short by a crash; the records around it are intact
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def prepare_log():
+    """Convert LEGACY_LOG_FILE into LOG_FILE and terminate a line left unfinished by a crash."""
+    with locked_log():
+        if os.path.exists(LEGACY_LOG_FILE):
+            try:
+                with open(LEGACY_LOG_FILE, 'r') as f:
+                    legacy = json.load(f)
+            except json.JSONDecodeError:
+                legacy = []
+            write_logs(legacy + read_logs())
+            os.replace(LEGACY_LOG_FILE, LEGACY_LOG_FILE + '.migrated')
+            print(f"[LOGS] Converted {len(legacy)} entries from {LEGACY_LOG_FILE} to {LOG_FILE}")
+        if os.path.exists(LOG_FILE) and os.path.getsize(LOG_FILE):
+            with open(LOG_FILE, 'rb+') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+
+
+def summarize_timeline(timeline, threshold=TIMELINE_FLAG_THRESHOLD):
+    """Peak and mean fake probability over speech windows, and the flagged [start, end] spans."""
+    probs = timeline['fake_probability']
+    speech = timeline.get('speech') or [True] * len(probs)
+    scored = [p for p, is_speech in zip(probs, speech) if is_speech] or probs
+    flagged = []
+    for start, end, p, is_speech in zip(timeline['start'], timeline['end'], probs, speech):
+        if not is_speech or p < threshold:
+            continue
+        if flagged and start <= flagged[-1][1]:
+            flagged[-1][1] = end
+        else:
+            flagged.append([start, end])
+    return {
+        'peak': max(scored) if scored else 0.0,
+        'mean': round(sum(scored) / len(scored), 3) if scored else 0.0,
+        'flagged': flagged,
+        'duration': timeline['end'][-1] if timeline['end'] else 0.0,
+    }
+
+
+def save_timeline(timeline):
+    """Write a full timeline to TIMELINE_DIR and return its id."""
+    os.makedirs(TIMELINE_DIR, exist_ok=True)
+    timeline_id = uuid.uuid4().hex
+    path = os.path.join(TIMELINE_DIR, f'{timeline_id}.json')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(timeline, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return timeline_id
+
+
+def load_timeline(timeline_id):
+    """The full timeline stored under timeline_id, or None if unknown or removed."""
+    if not _TIMELINE_ID.match(timeline_id or ''):
+        return None
+    try:
+        with open(os.path.join(TIMELINE_DIR, f'{timeline_id}.json'), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _remove_timeline(entry):
+    timeline_id = (entry.get('timeline') or {}).get('id')
+    if timeline_id and _TIMELINE_ID.match(timeline_id):
+        try:
+            os.remove(os.path.join(TIMELINE_DIR, f'{timeline_id}.json'))
+        except FileNotFoundError:
+            pass
+
+
+def _archive_path(month):
+    return os.path.join(ARCHIVE_DIR, f'alerts-{month}.jsonl.gz')
+
+
+def archive_logs(max_age_days):
+    """Move entries older than max_age_days from LOG_FILE into the monthly archives.
+
+    Each run appends a new gzip member to the month's file. Archives are
+    written before LOG_FILE is shortened, so a crash in between can only
+    duplicate records, which read_archived_logs drops. Archived records keep
+    their timeline summary; the full timeline files are removed. Returns
+    the count moved.
+    """
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime(TIMESTAMP_FORMAT)
+    with locked_log():
+        logs = read_logs()
+        by_month = {}
+        kept = []
+        for entry in logs:
+            ts = entry.get('timestamp') or ''
+            if ts and ts < cutoff:
+                by_month.setdefault(ts[:7], []).append(entry)
+            else:
+                kept.append(entry)
+        if not by_month:
+            return 0
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        for month, entries in by_month.items():
+            with gzip.open(_archive_path(month), 'at', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, sort_keys=True) + '\n')
+        write_logs(kept)
+    for entries in by_month.values():
+        for entry in entries:
+            _remove_timeline(entry)
+    return len(logs) - len(kept)
+
+
+def _read_archive(path):
+    entries = []
+    seen = set()
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line in seen or not line.strip():
+                    continue
+                seen.add(line)
+                entries.append(json.loads(line))
+    except (EOFError, OSError, json.JSONDecodeError) as e:
+        # A write cut short leaves a truncated last member; keep what was readable
+        print(f"[LOGS] Archive {path} is truncated: {e}")
+    return entries
+
+
+def read_archived_logs(start=None, end=None):
+    """Archived entries with start <= timestamp <= end (either bound optional), oldest first.
+
+    Only the monthly files overlapping the range are decompressed.
+    """
+    if end and len(end) == 10:
+        # Date-only upper bound covers the whole day
+        end = end + ' 23:59:59'
+    entries = []
+    for path in sorted(glob.glob(_archive_path('*'))):
+        month = os.path.basename(path)[len('alerts-'):-len('.jsonl.gz')]
+        if (start and month < start[:7]) or (end and month > end[:7]):
+            continue
+        for entry in _read_archive(path):
+            ts = entry.get('timestamp') or ''
+            if (start and ts < start) or (end and ts > end):
+                continue
+            entries.append(entry)
+    entries.sort(key=lambda entry: entry.get('timestamp') or '')
+    return entries
+
+
+def find_archived_log(timestamp):
+    """The archived entry with this timestamp, or None."""
+    path = _archive_path(timestamp[:7])
+    if not os.path.exists(path):
+        return None
+    for entry in _read_archive(path):
+        if entry.get('timestamp') == timestamp:
+            return entry
+    return None
+
+
+def log_action(filename, label, transcription=None, scam_label=None, scam_comment=None, file_hash=None,
+               model_version=None, scam_model_version=None, speakers=None,
+               timeline=None):
     """
-    Logs a file prediction result with timestamp and transcription into a JSON file.
+    Logs a file prediction result with timestamp and transcription into the JSON Lines log.
     
     Args:
         filename (str): Name of the audio file
         label (str): Prediction label ('Real' or 'Fake')
         transcription (str, optional): Transcribed text from the audio
+        model_version (str, optional): Version of the voice model that made the prediction
+        scam_model_version (str, optional): Version of the scam text model, if it ran
+        speakers (dict, optional): Per-speaker and per-segment verdicts from diarization
+        timeline (dict, optional): Sliding-window fake probabilities (features.score_timeline);
+            saved to TIMELINE_DIR, the log entry keeps its id and summary
     """
+    if timeline:
+        timeline = dict(summarize_timeline(timeline), id=save_timeline(timeline))
     entry = {
         'filename': filename,
         'prediction': label,
@@ -21,22 +267,14 @@ def log_action(filename, label, transcription=None, scam_label=None, scam_commen
         'scam_label': scam_label,
         'scam_comment': scam_comment,
         'file_hash': file_hash,
+        'model_version': model_version,
+        'scam_model_version': scam_model_version,
+        'speakers': speakers,
+        'timeline': timeline,
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     }
 
-    # Load existing logs safely
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, 'r') as f:
-            try:
-                logs = json.load(f)
-            except json.JSONDecodeError:
-                logs = []
-    else:
-        logs = []
+    append_log(entry)
 
-    # Add new log entry
-    logs.append(entry)
 
-    # Save updated logs
-    with open(LOG_FILE, 'w') as f:
-        json.dump(logs, f, indent=4)
+prepare_log()
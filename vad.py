@@ -0,0 +1,97 @@
+"""Energy/spectral voice activity detection.
+
+A frame counts as speech when it is loud relative to the file's own noise
+floor, has most of its energy in the speech band and is not noise-like
+(low spectral flatness). Detected regions are padded with a short
+hangover so word edges survive, and regions shorter than a syllable are
+dropped. Pure numpy; a few milliseconds per second of audio.
+"""
+
+import numpy as np
+
+FRAME_MS = 25
+HOP_MS = 10
+SPEECH_BAND_HZ = (100, 4000)
+# Speech must be this many dB above the quietest 10% of frames (or within
+# PEAK_RANGE_DB of the loudest frame, for files with no pauses at all)...
+MARGIN_DB = 12.0
+PEAK_RANGE_DB = 20.0
+# ...and above this absolute level (dBFS), so near-digital-silence never passes
+ABS_FLOOR_DB = -50.0
+MIN_BAND_RATIO = 0.5
+MAX_FLATNESS = 0.5
+HANGOVER_MS = 200
+MIN_SPEECH_MS = 250
+
+
+def _frames(y, frame_len, hop):
+    if len(y) < frame_len:
+        y = np.pad(y, (0, frame_len - len(y)))
+    n = 1 + (len(y) - frame_len) // hop
+    return np.lib.stride_tricks.as_strided(
+        y, shape=(n, frame_len), strides=(y.strides[0] * hop, y.strides[0]), writeable=False)
+
+
+def speech_frames(y, sr):
+    """Boolean speech decision per hop, plus the hop length in samples."""
+    frame_len = int(sr * FRAME_MS / 1000)
+    hop = int(sr * HOP_MS / 1000)
+    frames = _frames(np.ascontiguousarray(y, dtype=np.float32), frame_len, hop)
+
+    energy_db = 10 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-12)
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = min(noise_floor + MARGIN_DB, energy_db.max() - PEAK_RANGE_DB)
+    loud = energy_db > max(ABS_FLOOR_DB, threshold)
+    if not loud.any():
+        return loud, hop
+
+    power = np.abs(np.fft.rfft(frames * np.hanning(frame_len), axis=1)) ** 2 + 1e-12
+    freqs = np.fft.rfftfreq(frame_len, 1.0 / sr)
+    band = (freqs >= SPEECH_BAND_HZ[0]) & (freqs <= SPEECH_BAND_HZ[1])
+    band_ratio = power[:, band].sum(axis=1) / power.sum(axis=1)
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+    return loud & (band_ratio >= MIN_BAND_RATIO) & (flatness <= MAX_FLATNESS), hop
+
+
+def frames_to_segments(active, hop, n_samples):
+    """Speech regions as [(start_sample, end_sample)] from speech_frames decisions, padded and merged."""
+    if not active.any():
+        return []
+    hangover = max(1, HANGOVER_MS // HOP_MS)
+    # Dilate the decisions by the hangover so nearby regions merge
+    padded = np.convolve(active.astype(np.int32), np.ones(2 * hangover + 1, dtype=np.int32), mode='same') > 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], padded.astype(np.int8), [0]))))
+    min_frames = MIN_SPEECH_MS // HOP_MS
+    segments = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if active[start:end].sum() < min_frames:
+            continue
+        segments.append((int(start * hop), int(min(n_samples, end * hop + hop))))
+    return segments
+
+
+def voice_activity(y, sr):
+    """(segments, per-hop decisions, hop) from one VAD pass, for callers that need both."""
+    active, hop = speech_frames(y, sr)
+    return frames_to_segments(active, hop, len(y)), active, hop
+
+
+def speech_segments(y, sr):
+    """Speech regions as [(start_sample, end_sample)], padded and merged."""
+    return voice_activity(y, sr)[0]
+
+
+def trim_silence(y, sr, segments=None):
+    """(speech-only samples, segments); empty samples when nothing is speech.
+
+    segments may pass speech_segments(y, sr) when the caller already has them.
+    """
+    if segments is None:
+        segments = speech_segments(y, sr)
+    if not segments:
+        return y[:0], segments
+    if len(segments) == 1:
+        start, end = segments[0]
+        return y[start:end], segments
+    return np.concatenate([y[start:end] for start, end in segments]), segments